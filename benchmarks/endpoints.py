@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""
+    benchmarks.endpoints
+    ====================
+
+    End to end benchmark of the accounts endpoints on a large population
+
+    python -m benchmarks.endpoints --users 100000 --requests 500
+    python -m benchmarks.endpoints --save benchmarks/baseline.json
+    python -m benchmarks.endpoints --compare benchmarks/baseline.json --tolerance 20
+
+    Creates the test databases of the settings (tests.settings by default,
+    see --settings), fills them with the generate_users command then runs
+    every scenario through the test client, one request at a time, and
+    reports the p50 / p99 latency and the throughput. Each request uses a
+    different user so throttling and caches don't skew the results.
+
+    --compare exits with 1 when a p50 or p99 is more than --tolerance
+    percent slower than in the saved baseline. Compare runs made on the same
+    machine, with the same settings and population only.
+
+"""
+import argparse
+import json
+import os
+import sys
+from timeit import default_timer
+
+PASSWORD = 'password12'
+PREFIX = 'bench'
+
+
+def get_username(n):
+    return '%s%d' % (PREFIX, n)
+
+
+class Scenario(object):
+    """
+    One endpoint call, subclasses define request(n) making the call for the
+    user number n. prepare() runs before the timed requests, with the
+    numbers of the users request() will be called with.
+    """
+    name = None
+    status_code = 200
+
+    def __init__(self, client_class):
+        self.client_class = client_class
+        self.client = client_class()
+
+    def prepare(self, numbers):
+        pass
+
+    def reverse(self, url_name):
+        # Django is only set up in main()
+        from django.core.urlresolvers import reverse
+        return reverse(url_name)
+
+
+class AuthenticatedScenario(Scenario):
+
+    def prepare(self, numbers):
+        # Logging in is not part of the timed request
+        self.clients = {}
+        for n in numbers:
+            client = self.client_class()
+            client.login(username=get_username(n), password=PASSWORD)
+            self.clients[n] = client
+
+
+class Login(Scenario):
+    name = 'login'
+
+    def request(self, n):
+        return self.client.post(self.reverse('accounts:rest_login'),
+                                {'username': get_username(n), 'password': PASSWORD}, format='json')
+
+
+class LoginFailure(Scenario):
+    name = 'login_failure'
+    status_code = 400
+
+    def request(self, n):
+        return self.client.post(self.reverse('accounts:rest_login'),
+                                {'username': get_username(n), 'password': 'wrong'}, format='json')
+
+
+class Register(Scenario):
+    name = 'register'
+    status_code = 201
+
+    def request(self, n):
+        username = 'new%s' % get_username(n)
+        return self.client.post(self.reverse('accounts:rest_register'), {
+            'username': username,
+            'email': '%s@example.com' % username,
+            'password1': PASSWORD,
+            'password2': PASSWORD,
+        }, format='json')
+
+
+class UserDetails(AuthenticatedScenario):
+    name = 'user_details'
+
+    def request(self, n):
+        return self.clients[n].get(self.reverse('accounts:rest_user_details'))
+
+
+class UserDetailsUpdate(AuthenticatedScenario):
+    name = 'user_details_update'
+
+    def request(self, n):
+        return self.clients[n].patch(self.reverse('accounts:rest_user_details'), {'first_name': 'John'}, format='json')
+
+
+class PasswordChange(AuthenticatedScenario):
+    name = 'password_change'
+
+    def request(self, n):
+        return self.clients[n].post(self.reverse('accounts:rest_password_change'),
+                                    {'password1': 'password34', 'password2': 'password34'}, format='json')
+
+
+class PasswordReset(Scenario):
+    name = 'password_reset'
+
+    def request(self, n):
+        return self.client.post(self.reverse('accounts:rest_password_reset'),
+                                {'email': '%s@example.com' % get_username(n)}, format='json')
+
+
+class PasswordResetConfirm(Scenario):
+    name = 'password_reset_confirm'
+
+    def prepare(self, numbers):
+        from django.contrib.auth import get_user_model
+        from django_accounts.tokens import get_token_generator
+        users = get_user_model().objects.filter(username__in=[get_username(n) for n in numbers])
+        users = dict((user.username, user) for user in users)
+        self.tokens = {}
+        for n in numbers:
+            user = users[get_username(n)]
+            self.tokens[n] = (user.pk, get_token_generator().make_token(user))
+
+    def request(self, n):
+        uid, token = self.tokens[n]
+        return self.client.post(self.reverse('accounts:rest_password_reset_confirm'), {
+            'uid': uid, 'token': token, 'password1': 'password34', 'password2': 'password34',
+        }, format='json')
+
+
+class VerifyEmail(Scenario):
+    name = 'verify_email'
+
+    def prepare(self, numbers):
+        from allauth.account.models import EmailAddress, EmailConfirmationHMAC
+        email_addresses = EmailAddress.objects.filter(user__username__in=[get_username(n) for n in numbers])
+        email_addresses.update(verified=False)
+        keys = dict((email_address.email, EmailConfirmationHMAC(email_address).key)
+                    for email_address in email_addresses)
+        self.keys = dict((n, keys['%s@example.com' % get_username(n)]) for n in numbers)
+
+    def request(self, n):
+        return self.client.post(self.reverse('accounts:rest_verify_email'), {'key': self.keys[n]}, format='json')
+
+
+SCENARIOS = (Login, LoginFailure, Register, UserDetails, UserDetailsUpdate,
+             PasswordChange, PasswordReset, PasswordResetConfirm, VerifyEmail)
+
+
+def percentile(values, fraction):
+    """ Nearest rank percentile of sorted values """
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def run_scenario(scenario, numbers, warmup):
+    from django.core import mail
+    scenario.prepare(numbers)
+    latencies = []
+    for i, n in enumerate(numbers):
+        start = default_timer()
+        response = scenario.request(n)
+        elapsed = default_timer() - start
+        if response.status_code != scenario.status_code:
+            raise AssertionError("%s returned %s: %s" % (scenario.name, response.status_code, response.content))
+        if i >= warmup:
+            latencies.append(elapsed)
+        mail.outbox = []
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'throughput': len(latencies) / sum(latencies),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions: (scenario, statistic, baseline, now)
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for statistic in ('p50', 'p99'):
+            if result[statistic] > previous[statistic] * (1 + tolerance / 100.0):
+                regressions.append((name, statistic, previous[statistic], result[statistic]))
+    return regressions
+
+
+def report(results, baseline=None, out=sys.stdout):
+    out.write('%-24s %8s %10s %10s %10s' % ('scenario', 'requests', 'p50 ms', 'p99 ms', 'req/s'))
+    out.write('  %10s %10s\n' % ('p50 diff', 'p99 diff') if baseline else '\n')
+    for scenario in SCENARIOS:
+        result = results.get(scenario.name)
+        if result is None:
+            continue
+        out.write('%-24s %8d %10.2f %10.2f %10.1f' % (
+            scenario.name, result['requests'], result['p50'] * 1000, result['p99'] * 1000, result['throughput']))
+        previous = (baseline or {}).get('scenarios', {}).get(scenario.name)
+        if previous:
+            out.write('  %+9.1f%% %+9.1f%%' % (
+                (result['p50'] / previous['p50'] - 1) * 100, (result['p99'] / previous['p99'] - 1) * 100))
+        out.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the accounts endpoints.")
+    parser.add_argument('--settings', default='tests.settings', help='Django settings module (default tests.settings).')
+    parser.add_argument('--users', type=int, default=100000, help='Size of the population (default 100000).')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario (default 200).')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario (default 10).')
+    parser.add_argument('--scenario', action='append', choices=[s.name for s in SCENARIOS],
+                        help='Only run this scenario (repeatable).')
+    parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline.')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline.')
+    parser.add_argument('--tolerance', type=float, default=20, help='Allowed slowdown in percent (default 20).')
+    options = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS if not options.scenario or s.name in options.scenario]
+    per_scenario = options.requests + options.warmup
+    if options.users < per_scenario * len(scenarios):
+        parser.error("--users must be at least %d for these scenarios" % (per_scenario * len(scenarios)))
+
+    # Configured like conftest.py does for the test suite
+    import importlib
+    import django
+    from django.conf import settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', options.settings)
+    settings.configure(default_settings=importlib.import_module(options.settings))
+    django.setup()
+    from django.core.management import call_command
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.test import APIClient
+
+    setup_test_environment()
+    settings.DEBUG = False
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        # Mails are sent inline so their cost is part of the request
+        with override_settings(ACCOUNTS_MAIL_QUEUE_ENABLED=False):
+            call_command('generate_users', str(options.users), prefix=PREFIX, password=PASSWORD)
+            results = {}
+            for i, scenario_class in enumerate(scenarios):
+                numbers = range(i * per_scenario, (i + 1) * per_scenario)
+                results[scenario_class.name] = run_scenario(scenario_class(APIClient), numbers, options.warmup)
+    finally:
+        runner.teardown_databases(old_config)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    report(results, baseline)
+    if options.save:
+        with open(options.save, 'w') as baseline_file:
+            json.dump({'users': options.users, 'scenarios': results}, baseline_file,
+                      indent=2, sort_keys=True, separators=(',', ': '))
+            baseline_file.write('\n')
+    if baseline:
+        regressions = compare(results, baseline, options.tolerance)
+        for name, statistic, previous, now in regressions:
+            sys.stdout.write("REGRESSION %s %s: %.2fms -> %.2fms\n" % (name, statistic, previous * 1000, now * 1000))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
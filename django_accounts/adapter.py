@@ -27,11 +27,12 @@ from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
 from django.core.mail import EmailMultiAlternatives, EmailMessage
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.template.loader import render_to_string
 from django.template import TemplateDoesNotExist
-from django.utils import timezone
+from django.utils import six, timezone
 from django.utils.translation import ugettext_lazy as _
 
 try:
@@ -44,12 +45,20 @@ from allauth.utils import (build_absolute_uri, get_current_site, generate_unique
 
 from allauth.account import app_settings
 
+from django_accounts import mail
+from django_accounts import partitions
+from django_accounts.instrumentation import InstrumentedType
+from django_accounts.mail import mail_queue
+from django_accounts.offload import pool
 from django_accounts.utils import email_address_exists
 
 logger = logging.getLogger(__name__)
 
 
-class DefaultAccountAdapter(object):
+class DefaultAccountAdapter(six.with_metaclass(InstrumentedType, object)):
+
+    # Public methods (including those of subclasses) are timed when
+    # ACCOUNTS_ADAPTER_TIMING is on, see django_accounts.instrumentation
 
     # Don't bother turning this into a setting, as changing this also
     # requires changing the accompanying form error message. So if you
@@ -160,13 +169,11 @@ class DefaultAccountAdapter(object):
             msg.content_subtype = 'html'  # Main content is now text/html
         return msg
 
-    def send_mail(self, template_prefix, email, context):
-        logger.debug(
-            "Send mail: template_prefix: %s, email: %s, context: %s",
-            template_prefix,
-            email,
-            context
-        )
+    def build_mail(self, template_prefix, email, context):
+        """
+        Renders the e-mail for the configured backend (mandrill
+        template or django templates) without sending it.
+        """
         if 'djrill' in settings.INSTALLED_APPS:
             if settings.EMAIL_BACKEND != "djrill.mail.backends.djrill.DjrillBackend" or settings.MANDRILL_API_KEY is None:
                 raise ImproperlyConfigured(
@@ -181,7 +188,38 @@ class DefaultAccountAdapter(object):
                 raise Exception("I dont recognise the template_prefix: %s" % template_prefix)
         else:
             msg = self.render_mail(template_prefix, email, context)
-        msg.send()
+        return msg
+
+    def send_mail(self, template_prefix, email, context):
+        logger.debug(
+            "Send mail: template_prefix: %s, email: %s, context: %s",
+            template_prefix,
+            email,
+            context
+        )
+        msg = self.build_mail(template_prefix, email, context)
+        mail.send(msg)
+
+    def queue_mail(self, template_prefix, email, context):
+        """
+        Same as send_mail but delivery happens in the background,
+        see django_accounts.mail
+        """
+        logger.debug(
+            "Queue mail: template_prefix: %s, email: %s",
+            template_prefix,
+            email
+        )
+        msg = self.build_mail(template_prefix, email, context)
+        mail_queue.put(msg)
+
+    def asend_mail(self, template_prefix, email, context):
+        """
+        Same as send_mail but returns a Future right after rendering, the
+        delivery runs in the offload pool, see django_accounts.offload
+        """
+        msg = self.build_mail(template_prefix, email, context)
+        return pool.submit(mail.send, msg)
 
     def get_login_redirect_url(self, request):
         """
@@ -290,6 +328,24 @@ class DefaultAccountAdapter(object):
             user.save()
         return user
 
+    def asave_user(self, request, user, form, commit=True):
+        """
+        Same as save_user but returns a Future. save_user(commit=False) runs
+        in the offload pool, the user is saved in the thread collecting the
+        result so the write stays inside the request transaction.
+
+        The queries of save_user (populate_username and the
+        generate_unique_username lookups when the form has no username) run
+        on the pool thread's own connection, outside the request
+        transaction: they don't see rows the request wrote and not yet
+        committed. Use save_user when that matters.
+        """
+        def save(user):
+            if commit:
+                user.save()
+            return user
+        return pool.submit(self.save_user, request, user, form, commit=False).then(save)
+
     def clean_username(self, username, shallow=False):
         """
         Validates the username. You can hook into this if you want to
@@ -311,11 +367,16 @@ class DefaultAccountAdapter(object):
             username_field = app_settings.USER_MODEL_USERNAME_FIELD
             assert username_field
             user_model = get_user_model()
-            try:
-                query = {username_field + '__iexact': username}
-                user_model.objects.get(**query)
-            except user_model.DoesNotExist:
-                return username
+            if partitions.is_enabled():
+                # One lookup in the directory rather than one per partition
+                if not partitions.username_exists(username):
+                    return username
+            else:
+                try:
+                    query = {username_field + '__iexact': username}
+                    user_model.objects.get(**query)
+                except user_model.DoesNotExist:
+                    return username
             error_message = user_model._meta.get_field(
                 username_field).error_messages.get('unique')
             if not error_message:
@@ -418,10 +479,44 @@ class DefaultAccountAdapter(object):
     def confirm_email(self, request, email_address):
         """
         Marks the email address as confirmed on the db
-        """
+
+        Same as allauth's verify + set_as_primary(conditional=True) + save but
+        done in one transaction with a fixed number of statements (however
+        many addresses the user has):
+        - looks up whether the user already has a primary address
+        - one UPDATE marking the address verified (and primary if none)
+        - one UPDATE syncing the user's email if the address became primary
+        """
+        from allauth.account.models import EmailAddress
+        from allauth.account.utils import user_email
+
+        # Routed like the address (see django_accounts.partitions)
+        email_addresses = EmailAddress.objects.db_manager(hints={'instance': email_address})
+        users = get_user_model().objects.db_manager(hints={'instance': email_address})
+        with transaction.atomic(using=email_addresses.db):
+            make_primary = not email_addresses.filter(
+                user_id=email_address.user_id,
+                primary=True
+            ).exists()
+            fields = {'verified': True}
+            if make_primary:
+                fields['primary'] = True
+            email_addresses.filter(pk=email_address.pk).update(**fields)
+            email_field = app_settings.USER_MODEL_EMAIL_FIELD
+            if make_primary and email_field:
+                users.filter(
+                    pk=email_address.user_id
+                ).update(**{email_field: email_address.email})
+
+        # Keep the in memory instances in sync with the db (without loading
+        # the user if it has not been fetched already)
         email_address.verified = True
-        email_address.set_as_primary(conditional=True)
-        email_address.save()
+        if make_primary:
+            email_address.primary = True
+            user_cache_name = email_address._meta.get_field('user').get_cache_name()
+            user = getattr(email_address, user_cache_name, None)
+            if user is not None and app_settings.USER_MODEL_EMAIL_FIELD:
+                user_email(user, email_address.email)
 
     def set_password(self, user, password):
         user.set_password(password)
@@ -452,7 +547,7 @@ class DefaultAccountAdapter(object):
             url)
         return ret
 
-    def send_confirmation_mail(self, request, emailconfirmation, signup):
+    def send_confirmation_mail(self, request, emailconfirmation, signup, queue=False):
         logger.debug(
             "Send confirmation email, emailconfirmation: %s signup:%s",
             emailconfirmation,
@@ -472,9 +567,14 @@ class DefaultAccountAdapter(object):
             email_template = 'account/email/email_confirmation_signup'
         else:
             email_template = 'account/email/email_confirmation'
-        self.send_mail(email_template,
-                       emailconfirmation.email_address.email,
-                       ctx)
+        if queue:
+            self.queue_mail(email_template,
+                            emailconfirmation.email_address.email,
+                            ctx)
+        else:
+            self.send_mail(email_template,
+                           emailconfirmation.email_address.email,
+                           ctx)
 
     def respond_user_inactive(self, request, user):
         return HttpResponseRedirect(
@@ -519,6 +619,16 @@ class DefaultAccountAdapter(object):
             self.authentication_failed(request, **credentials)
         return user
 
+    def aauthenticate(self, request, **credentials):
+        """
+        Same as authenticate but returns a Future. A locked out login is
+        refused right away in the calling thread, then authenticate (the
+        method of this adapter, overrides included) runs in the offload
+        pool, login attempts bookkeeping included.
+        """
+        self.pre_authenticate(request, **credentials)
+        return pool.submit(self.authenticate, request, **credentials)
+
     def authentication_failed(self, request, **credentials):
         cache_key = self._get_login_attempts_cache_key(request, **credentials)
         data = cache.get(cache_key, [])
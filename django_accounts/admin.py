@@ -7,9 +7,56 @@
 
 """
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
 from django.contrib.auth.admin import UserAdmin
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
+from allauth.account import app_settings as account_settings
+from allauth.account import signals
+from allauth.account.adapter import get_adapter
+from allauth.account.models import EmailAddress, EmailConfirmation, EmailConfirmationHMAC
+from rest_framework.authtoken.models import Token
+
+from django_accounts import app_settings
+from django_accounts.mail import mail_queue
 from django_accounts.models import AccountsUser
+from django_accounts.paginator import EstimatedCountPaginator
+from django_accounts.serializers import get_resend_cache_key
+from django_accounts.tokens import stored_token_generator
+
+
+def send_confirmation_mails(user_pks, chunk_size=500):
+    """
+    Sends a confirmation e-mail to every unverified address of the users.
+    Runs in the mail worker (see AccountsUserAdmin.resend_confirmation),
+    addresses mailed in the last ACCOUNTS_EMAIL_CONFIRMATION_RESEND_WINDOW
+    seconds are skipped.
+    """
+    adapter = get_adapter()
+    for start in range(0, len(user_pks), chunk_size):
+        addresses = EmailAddress.objects.filter(
+            user_id__in=user_pks[start:start + chunk_size],
+            verified=False
+        ).select_related('user')
+        for email_address in addresses:
+            if not cache.add(get_resend_cache_key(email_address.email), True,
+                             app_settings.EMAIL_CONFIRMATION_RESEND_WINDOW):
+                continue
+            if account_settings.EMAIL_CONFIRMATION_HMAC:
+                confirmation = EmailConfirmationHMAC(email_address)
+            else:
+                confirmation = EmailConfirmation.objects.create(
+                    email_address=email_address,
+                    key=get_random_string(64).lower(),
+                    sent=timezone.now()
+                )
+            adapter.send_confirmation_mail(None, confirmation, signup=False)
+            signals.email_confirmation_sent.send(sender=confirmation.__class__,
+                                                 request=None,
+                                                 confirmation=confirmation,
+                                                 signup=False)
 
 
 class AccountsUserAdmin(UserAdmin):
@@ -19,8 +66,61 @@ class AccountsUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_staff', 'first_name', 'last_name')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
     search_fields = ('email', 'username')
+    # Prefix matches can use the (upper cased) email / username indexes
+    prefix_search_fields = ('^email', '^username')
+    # A search for a whole e-mail address is an equality lookup on the indexes
+    exact_search_fields = ('=email', '=username')
     ordering = ('email',)
     filter_horizontal = ('groups', 'user_permissions',)
+    paginator = EstimatedCountPaginator
+    # Don't COUNT(*) the whole table next to every search result
+    show_full_result_count = False
+    # Bulk actions run as single UPDATE / DELETE statements (no per object
+    # save, so the post_save receivers are not fired)
+    actions = ['activate_users', 'deactivate_users', 'mark_verified',
+               'resend_confirmation', 'revoke_tokens']
+
+    def get_search_fields(self, request):
+        if not app_settings.ADMIN_PREFIX_SEARCH:
+            return self.search_fields
+        if '@' in request.GET.get(SEARCH_VAR, ''):
+            return self.exact_search_fields
+        return self.prefix_search_fields
+
+    def _user_pks(self, queryset):
+        return queryset.order_by().values('pk')
+
+    def activate_users(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        self.message_user(request, "%d users activated." % updated)
+    activate_users.short_description = "Activate selected users"
+
+    def deactivate_users(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, "%d users deactivated." % updated)
+    deactivate_users.short_description = "Deactivate selected users"
+
+    def mark_verified(self, request, queryset):
+        updated = EmailAddress.objects.filter(
+            user__in=self._user_pks(queryset),
+            verified=False
+        ).update(verified=True)
+        self.message_user(request, "%d e-mail addresses marked as verified." % updated)
+    mark_verified.short_description = "Mark e-mail addresses of selected users as verified"
+
+    def resend_confirmation(self, request, queryset):
+        user_pks = list(queryset.order_by().values_list('pk', flat=True))
+        mail_queue.put_task(send_confirmation_mails, user_pks)
+        self.message_user(request, "Confirmation e-mails queued for %d users." % len(user_pks))
+    resend_confirmation.short_description = "Resend confirmation e-mail to selected users"
+
+    def revoke_tokens(self, request, queryset):
+        user_pks = self._user_pks(queryset)
+        Token.objects.filter(user__in=user_pks).delete()
+        if app_settings.PASSWORD_RESET_TOKEN_STORE:
+            stored_token_generator.revoke_tokens_many(user_pks.values_list('pk', flat=True))
+        self.message_user(request, "Tokens revoked for selected users.")
+    revoke_tokens.short_description = "Revoke auth and password reset tokens of selected users"
 
     # fieldsets = (
     #  (None, {'fields': ('email', 'password')}),
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+    django_accounts.admission
+    =========================
+
+    Admission control for the unauthenticated, expensive endpoints
+
+    Login, registration and password reset hash passwords, validate forms
+    and send mail for anyone. Under a credential stuffing wave they take
+    every worker and the whole site slows down. Each of these views belongs
+    to an admission class with its own budget, checked in dispatch before
+    the request reaches authentication, the database or the hashers:
+
+    - ACCOUNTS_ADMISSION_LIMITS caps the requests of a class in flight in
+      the process (threaded or gevent workers), e.g. {'login': 16}. A
+      request over the cap gets a 429.
+    - ACCOUNTS_ADMISSION_TARGET_LATENCY (seconds) turns on load shedding:
+      once the recent latency of a class (moving average) is above the
+      target, a share of its requests growing with the excess - at most
+      MAX_SHED_RATIO so the average can recover - gets a 503.
+
+    Both come with a Retry-After of ACCOUNTS_ADMISSION_RETRY_AFTER seconds
+    and are counted in accounts_admission_rejected_total{endpoint,reason}.
+
+    It is off unless ACCOUNTS_ADMISSION_CONTROL = True, and no class has a
+    cap unless listed in ACCOUNTS_ADMISSION_LIMITS.
+
+"""
+import random
+import threading
+from timeit import default_timer
+
+from django.http import JsonResponse
+from django.utils.translation import ugettext_lazy as _
+
+from django_accounts import app_settings
+from django_accounts import metrics
+
+REJECTED = 'accounts_admission_rejected_total'
+
+metrics.register(REJECTED, 'counter', 'Requests rejected by the admission control by endpoint and reason.')
+
+# Weight of the last request in the latency moving average
+LATENCY_WEIGHT = 0.2
+# Largest share of the requests shed, the rest keeps the latency average current
+MAX_SHED_RATIO = 0.9
+
+MESSAGES = {
+    'limit': _("Too many requests, try again later."),
+    'shed': _("The service is overloaded, try again later."),
+}
+STATUS_CODES = {'limit': 429, 'shed': 503}
+
+
+class Gate(object):
+    """
+    Requests in flight and recent latency of an admission class
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = 0
+        self.latency = None
+        self.lock = threading.Lock()
+
+    def get_shed_ratio(self):
+        target = app_settings.ADMISSION_TARGET_LATENCY
+        if not target or self.latency is None or self.latency <= target:
+            return 0.0
+        return min(MAX_SHED_RATIO, (self.latency - target) / target)
+
+    def enter(self):
+        """
+        Admits the request, returns None, or returns why it is rejected
+        """
+        limit = app_settings.ADMISSION_LIMITS.get(self.name)
+        shed_ratio = self.get_shed_ratio()
+        with self.lock:
+            if limit is not None and self.in_flight >= limit:
+                return 'limit'
+            if shed_ratio and random.random() < shed_ratio:
+                return 'shed'
+            self.in_flight += 1
+        return None
+
+    def leave(self, duration):
+        with self.lock:
+            self.in_flight -= 1
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency += LATENCY_WEIGHT * (duration - self.latency)
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(name):
+    gate = _gates.get(name)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.setdefault(name, Gate(name))
+    return gate
+
+
+def reset():
+    with _gates_lock:
+        _gates.clear()
+
+
+def get_rejection(reason):
+    response = JsonResponse({'detail': '%s' % MESSAGES[reason]}, status=STATUS_CODES[reason])
+    response['Retry-After'] = '%d' % app_settings.ADMISSION_RETRY_AFTER
+    response.admission_rejected = reason
+    return response
+
+
+class AdmissionMixin(object):
+    """
+    Puts the requests of a view through the gate of `admission_class`, see
+    django_accounts.admission. Place it before the view classes (after
+    MetricsMixin so the rejections are counted).
+    """
+    admission_class = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.admission_class or not app_settings.ADMISSION_CONTROL:
+            return super(AdmissionMixin, self).dispatch(request, *args, **kwargs)
+        gate = get_gate(self.admission_class)
+        reason = gate.enter()
+        if reason is not None:
+            metrics.inc(REJECTED, endpoint=self.admission_class, reason=reason)
+            return get_rejection(reason)
+        start = default_timer()
+        try:
+            return super(AdmissionMixin, self).dispatch(request, *args, **kwargs)
+        finally:
+            gate.leave(default_timer() - start)
@@ -28,6 +28,457 @@ class AppSettings(object):
         """
         return self._setting('REGISTRATION_OPEN', True)  # Defaults to True (if doesnt exist)
 
+    @property
+    def PASSWORD_RESET_TOKEN_STORE(self):
+        """
+        Gets settings PASSWORD_RESET_TOKEN_STORE. It defines whether password
+        reset tokens are tracked server side so they can only be used once.
+        Defaults to False if setting doesnt exist.
+        """
+        return self._setting('PASSWORD_RESET_TOKEN_STORE', False)
+
+    @property
+    def PASSWORD_RESET_TOKEN_TIMEOUT(self):
+        """
+        Gets settings PASSWORD_RESET_TOKEN_TIMEOUT. Number of seconds a stored
+        password reset token is kept for.
+        Defaults to PASSWORD_RESET_TIMEOUT_DAYS (in seconds) if setting doesnt exist.
+        """
+        from django.conf import settings
+        return self._setting('PASSWORD_RESET_TOKEN_TIMEOUT',
+                             settings.PASSWORD_RESET_TIMEOUT_DAYS * 24 * 60 * 60)
+
+    @property
+    def EMAIL_CONFIRMED_CACHE_TIMEOUT(self):
+        """
+        Gets settings EMAIL_CONFIRMED_CACHE_TIMEOUT. Number of seconds an already
+        confirmed key is remembered so repeated verifications skip the db.
+        Defaults to 300 if setting doesnt exist.
+        """
+        return self._setting('EMAIL_CONFIRMED_CACHE_TIMEOUT', 300)
+
+    @property
+    def MAIL_QUEUE_ENABLED(self):
+        """
+        Gets settings MAIL_QUEUE_ENABLED. It defines whether queued e-mails are
+        sent from a background thread (True) or inline (False).
+        Defaults to True if setting doesnt exist.
+        """
+        return self._setting('MAIL_QUEUE_ENABLED', True)
+
+    @property
+    def EMAIL_CONFIRMATION_RESEND_WINDOW(self):
+        """
+        Gets settings EMAIL_CONFIRMATION_RESEND_WINDOW. Number of seconds during
+        which further resend requests for the same address are ignored.
+        Defaults to 180 if setting doesnt exist.
+        """
+        return self._setting('EMAIL_CONFIRMATION_RESEND_WINDOW', 180)
+
+    @property
+    def SOCIAL_HTTP_TIMEOUT(self):
+        """
+        Gets settings SOCIAL_HTTP_TIMEOUT. (connect, read) timeout in seconds for
+        calls to the social login providers.
+        Defaults to (3.05, 10) if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_HTTP_TIMEOUT', (3.05, 10))
+
+    @property
+    def SOCIAL_HTTP_RETRIES(self):
+        """
+        Gets settings SOCIAL_HTTP_RETRIES. Number of retries for failed calls to
+        the social login providers.
+        Defaults to 2 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_HTTP_RETRIES', 2)
+
+    @property
+    def SOCIAL_HTTP_BACKOFF(self):
+        """
+        Gets settings SOCIAL_HTTP_BACKOFF. Base delay in seconds between retries,
+        doubled each attempt and randomised (jitter).
+        Defaults to 0.2 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_HTTP_BACKOFF', 0.2)
+
+    @property
+    def SOCIAL_HTTP_POOL_SIZE(self):
+        """
+        Gets settings SOCIAL_HTTP_POOL_SIZE. Number of keep-alive connections kept
+        per social login provider.
+        Defaults to 10 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_HTTP_POOL_SIZE', 10)
+
+    @property
+    def SOCIAL_JWKS_REFRESH(self):
+        """
+        Gets settings SOCIAL_JWKS_REFRESH. Number of seconds the signing keys used
+        to verify ID tokens are kept before being fetched again.
+        Defaults to 3600 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_JWKS_REFRESH', 3600)
+
+    @property
+    def SOCIAL_JWKS_MIN_REFRESH(self):
+        """
+        Gets settings SOCIAL_JWKS_MIN_REFRESH. Minimum number of seconds between
+        two fetches of the signing keys (when a token has an unknown key id).
+        Defaults to 60 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_JWKS_MIN_REFRESH', 60)
+
+    @property
+    def SOCIAL_ID_TOKEN_ALGORITHMS(self):
+        """
+        Gets settings SOCIAL_ID_TOKEN_ALGORITHMS. Signing algorithms accepted for
+        ID tokens.
+        Defaults to ('RS256', ) if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_ID_TOKEN_ALGORITHMS', ('RS256', ))
+
+    @property
+    def SOCIAL_ID_TOKEN_LEEWAY(self):
+        """
+        Gets settings SOCIAL_ID_TOKEN_LEEWAY. Number of seconds of clock skew
+        allowed when checking the expiry of ID tokens.
+        Defaults to 30 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_ID_TOKEN_LEEWAY', 30)
+
+    @property
+    def SOCIAL_APP_CACHE_TIMEOUT(self):
+        """
+        Gets settings SOCIAL_APP_CACHE_TIMEOUT. Number of seconds the SocialApp
+        credentials are cached for (the cache is also cleared on any change).
+        Defaults to 3600 if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_APP_CACHE_TIMEOUT', 3600)
+
+    @property
+    def SOCIAL_LOGIN_CACHE_TIMEOUT(self):
+        """
+        Gets settings SOCIAL_LOGIN_CACHE_TIMEOUT. Number of seconds the social
+        account resolved for an access token is remembered, so repeated logins
+        with the same token skip the provider. 0 disables it. Capped at 300.
+        Defaults to 60 if setting doesnt exist.
+        """
+        return min(self._setting('SOCIAL_LOGIN_CACHE_TIMEOUT', 60), 300)
+
+    @property
+    def SOCIAL_RELEASE_DB_CONNECTION(self):
+        """
+        Gets settings SOCIAL_RELEASE_DB_CONNECTION. Close the database
+        connection before waiting on a social provider so concurrent logins
+        (e.g. gevent workers) don't each hold a connection while idle.
+        Defaults to False if setting doesnt exist.
+        """
+        return self._setting('SOCIAL_RELEASE_DB_CONNECTION', False)
+
+    @property
+    def ADMIN_PREFIX_SEARCH(self):
+        """
+        Gets settings ADMIN_PREFIX_SEARCH. The user admin matches the start of
+        the e-mail / username (indexed) instead of any substring (full scan),
+        a search containing an @ matches the whole e-mail / username.
+        Defaults to True if setting doesnt exist.
+        """
+        return self._setting('ADMIN_PREFIX_SEARCH', True)
+
+    @property
+    def ADMIN_ESTIMATED_COUNT_THRESHOLD(self):
+        """
+        Gets settings ADMIN_ESTIMATED_COUNT_THRESHOLD. Above this number of
+        rows the user admin shows the estimated instead of the exact count
+        of an unfiltered changelist (PostgreSQL and MySQL only).
+        Defaults to 50000 if setting doesnt exist.
+        """
+        return self._setting('ADMIN_ESTIMATED_COUNT_THRESHOLD', 50000)
+
+    @property
+    def PRIMARY_DATABASE(self):
+        """
+        Gets settings PRIMARY_DATABASE. Database alias written to by
+        django_accounts.routers.ReplicaRouter.
+        Defaults to 'default' if setting doesnt exist.
+        """
+        return self._setting('PRIMARY_DATABASE', 'default')
+
+    @property
+    def REPLICA_DATABASES(self):
+        """
+        Gets settings REPLICA_DATABASES. Database aliases of the read replicas,
+        no replicas means every query goes to the primary.
+        Defaults to () if setting doesnt exist.
+        """
+        return self._setting('REPLICA_DATABASES', ())
+
+    @property
+    def REPLICA_APPS(self):
+        """
+        Gets settings REPLICA_APPS. App labels routed by ReplicaRouter.
+        Defaults to ('django_accounts', 'account', 'socialaccount', 'authtoken')
+        if setting doesnt exist.
+        """
+        return self._setting('REPLICA_APPS', ('django_accounts', 'account', 'socialaccount', 'authtoken'))
+
+    @property
+    def PRIMARY_ONLY_MODELS(self):
+        """
+        Gets settings PRIMARY_ONLY_MODELS. Models ('app_label.model_name')
+        always read from the primary as they are used right after being
+        written by another request (token auth, e-mail confirmation).
+        Defaults to ('authtoken.token', 'account.emailaddress', 'account.emailconfirmation')
+        if setting doesnt exist.
+        """
+        return self._setting('PRIMARY_ONLY_MODELS',
+                             ('authtoken.token', 'account.emailaddress', 'account.emailconfirmation'))
+
+    @property
+    def PRIMARY_PATHS(self):
+        """
+        Gets settings PRIMARY_PATHS. URL path prefixes whose requests always
+        read from the primary.
+        Defaults to ('/admin/',) if setting doesnt exist.
+        """
+        return self._setting('PRIMARY_PATHS', ('/admin/',))
+
+    @property
+    def REPLICA_PIN_SECONDS(self):
+        """
+        Gets settings REPLICA_PIN_SECONDS. Number of seconds a client reads
+        from the primary after one of its requests wrote (replication lag).
+        Defaults to 5 if setting doesnt exist.
+        """
+        return self._setting('REPLICA_PIN_SECONDS', 5)
+
+    @property
+    def REPLICA_PIN_COOKIE(self):
+        """
+        Gets settings REPLICA_PIN_COOKIE. Name of the cookie pinning a client
+        to the primary.
+        Defaults to 'accounts_primary' if setting doesnt exist.
+        """
+        return self._setting('REPLICA_PIN_COOKIE', 'accounts_primary')
+
+    @property
+    def PARTITION_DATABASES(self):
+        """
+        Gets settings PARTITION_DATABASES. Database aliases the users are
+        partitioned across by django_accounts.partitions.PartitionRouter,
+        no partitions means the users are not partitioned.
+        Defaults to () if setting doesnt exist.
+        """
+        return self._setting('PARTITION_DATABASES', ())
+
+    @property
+    def DIRECTORY_DATABASE(self):
+        """
+        Gets settings DIRECTORY_DATABASE. Database alias holding the user
+        directory of a partitioned setup.
+        Defaults to 'default' if setting doesnt exist.
+        """
+        return self._setting('DIRECTORY_DATABASE', 'default')
+
+    @property
+    def METRICS_ENABLED(self):
+        """
+        Gets settings METRICS_ENABLED. It defines whether the accounts
+        endpoints record counters and latencies, see django_accounts.metrics.
+        Defaults to True if setting doesnt exist.
+        """
+        return self._setting('METRICS_ENABLED', True)
+
+    @property
+    def METRICS_FLUSH_INTERVAL(self):
+        """
+        Gets settings METRICS_FLUSH_INTERVAL. Number of seconds between two
+        publications of a process' metrics to the cache.
+        Defaults to 10 if setting doesnt exist.
+        """
+        return self._setting('METRICS_FLUSH_INTERVAL', 10)
+
+    @property
+    def METRICS_TOKEN(self):
+        """
+        Gets settings METRICS_TOKEN. Bearer token allowing a scraper to read
+        the metrics endpoint, staff users can always read it.
+        Defaults to None if setting doesnt exist.
+        """
+        return self._setting('METRICS_TOKEN', None)
+
+    @property
+    def ADAPTER_TIMING(self):
+        """
+        Gets settings ADAPTER_TIMING. It defines whether the account adapter
+        methods are always timed, see django_accounts.instrumentation.
+        Defaults to False if setting doesnt exist.
+        """
+        return self._setting('ADAPTER_TIMING', False)
+
+    @property
+    def ADAPTER_SLOW_THRESHOLD(self):
+        """
+        Gets settings ADAPTER_SLOW_THRESHOLD. Number of seconds above which a
+        timed adapter call is logged as slow.
+        Defaults to 0.5 if setting doesnt exist.
+        """
+        return self._setting('ADAPTER_SLOW_THRESHOLD', 0.5)
+
+    @property
+    def ADAPTER_SLOW_THRESHOLDS(self):
+        """
+        Gets settings ADAPTER_SLOW_THRESHOLDS. Slow call thresholds per adapter
+        method name, e.g. {'send_mail': 2}.
+        Defaults to {} if setting doesnt exist.
+        """
+        return self._setting('ADAPTER_SLOW_THRESHOLDS', {})
+
+    @property
+    def TRAFFIC_CAPTURE_FILE(self):
+        """
+        Gets settings TRAFFIC_CAPTURE_FILE. Path of the JSON lines file the
+        TrafficCaptureMiddleware appends the accounts requests to, no file
+        means nothing is captured.
+        Defaults to None if setting doesnt exist.
+        """
+        return self._setting('TRAFFIC_CAPTURE_FILE', None)
+
+    @property
+    def TRAFFIC_CAPTURE_RATE(self):
+        """
+        Gets settings TRAFFIC_CAPTURE_RATE. Fraction (0 to 1) of the accounts
+        requests captured.
+        Defaults to 1.0 if setting doesnt exist.
+        """
+        return self._setting('TRAFFIC_CAPTURE_RATE', 1.0)
+
+    @property
+    def SQL_COMMENTS(self):
+        """
+        Gets settings SQL_COMMENTS. It defines whether queries are tagged with
+        a comment naming the view and adapter hook issuing them, see
+        django_accounts.sqlcomments.
+        Defaults to False if setting doesnt exist.
+        """
+        return self._setting('SQL_COMMENTS', False)
+
+    @property
+    def PROFILE_DIR(self):
+        """
+        Gets settings PROFILE_DIR. It defines the directory the profiles of
+        the accounts requests are stored in, see django_accounts.profiling.
+        Profiling is off when it's None.
+        Defaults to None if setting doesnt exist.
+        """
+        return self._setting('PROFILE_DIR', None)
+
+    @property
+    def PROFILE_KEEP(self):
+        """
+        Gets settings PROFILE_KEEP. It defines how many profiles are kept in
+        ACCOUNTS_PROFILE_DIR, the oldest are deleted.
+        Defaults to 50 if setting doesnt exist.
+        """
+        return self._setting('PROFILE_KEEP', 50)
+
+    @property
+    def PROFILE_TOKEN_MAX_AGE(self):
+        """
+        Gets settings PROFILE_TOKEN_MAX_AGE. It defines how many seconds a
+        token from the profile_token command allows to profile requests.
+        Defaults to 3600 if setting doesnt exist.
+        """
+        return self._setting('PROFILE_TOKEN_MAX_AGE', 3600)
+
+    @property
+    def OFFLOAD_WORKERS(self):
+        """
+        Gets settings OFFLOAD_WORKERS. It defines the number of threads the
+        asend_mail, aauthenticate and asave_user adapter methods run their
+        blocking part in, see django_accounts.offload. 0 runs it inline.
+        Defaults to 4 if setting doesnt exist.
+        """
+        return self._setting('OFFLOAD_WORKERS', 4)
+
+    @property
+    def ADMISSION_CONTROL(self):
+        """
+        Gets settings ADMISSION_CONTROL. It defines whether the login,
+        registration and password reset requests go through the admission
+        control, see django_accounts.admission.
+        Defaults to False if setting doesnt exist.
+        """
+        return self._setting('ADMISSION_CONTROL', False)
+
+    @property
+    def ADMISSION_LIMITS(self):
+        """
+        Gets settings ADMISSION_LIMITS. It defines the requests in flight
+        allowed in a process per admission class (login, register,
+        password_reset, social_login), the others get a 429, e.g.
+        {'login': 16, 'register': 8, 'password_reset': 8}.
+        Defaults to {} if setting doesnt exist.
+        """
+        return self._setting('ADMISSION_LIMITS', {})
+
+    @property
+    def ADMISSION_TARGET_LATENCY(self):
+        """
+        Gets settings ADMISSION_TARGET_LATENCY. It defines the latency in
+        seconds above which requests of an admission class are shed with a
+        503. None turns load shedding off.
+        Defaults to None if setting doesnt exist.
+        """
+        return self._setting('ADMISSION_TARGET_LATENCY', None)
+
+    @property
+    def ADMISSION_RETRY_AFTER(self):
+        """
+        Gets settings ADMISSION_RETRY_AFTER. It defines the Retry-After (in
+        seconds) of the requests rejected by the admission control.
+        Defaults to 5 if setting doesnt exist.
+        """
+        return self._setting('ADMISSION_RETRY_AFTER', 5)
+
+    @property
+    def BREAKER_WINDOW(self):
+        """
+        Gets settings BREAKER_WINDOW. It defines how many of the last calls
+        through a circuit breaker its failure rate is computed on, see
+        django_accounts.breakers.
+        Defaults to 20 if setting doesnt exist.
+        """
+        return self._setting('BREAKER_WINDOW', 20)
+
+    @property
+    def BREAKER_MIN_CALLS(self):
+        """
+        Gets settings BREAKER_MIN_CALLS. It defines how many calls a circuit
+        breaker needs to have seen before it can open.
+        Defaults to 10 if setting doesnt exist.
+        """
+        return self._setting('BREAKER_MIN_CALLS', 10)
+
+    @property
+    def BREAKER_FAILURE_RATE(self):
+        """
+        Gets settings BREAKER_FAILURE_RATE. It defines the share of failed
+        calls (0 to 1) that opens a circuit breaker.
+        Defaults to 0.5 if setting doesnt exist.
+        """
+        return self._setting('BREAKER_FAILURE_RATE', 0.5)
+
+    @property
+    def BREAKER_RESET_TIMEOUT(self):
+        """
+        Gets settings BREAKER_RESET_TIMEOUT. It defines how many seconds an
+        open circuit breaker refuses calls before letting a probe through.
+        Defaults to 30 if setting doesnt exist.
+        """
+        return self._setting('BREAKER_RESET_TIMEOUT', 30)
+
 
 # Ugly? Guido recommends this himself ...
 # http://mail.python.org/pipermail/python-ideas/2012-May/014969.html
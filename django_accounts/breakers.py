@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+    django_accounts.breakers
+    ========================
+
+    Circuit breakers for the outbound calls (mail backend, social providers)
+
+    A slow or failing dependency otherwise holds every worker for the full
+    timeout. Each dependency has a breaker shared by the threads of the
+    process:
+
+    - closed: calls go through, their outcomes are kept for the last
+      ACCOUNTS_BREAKER_WINDOW calls. Once at least ACCOUNTS_BREAKER_MIN_CALLS
+      were made and ACCOUNTS_BREAKER_FAILURE_RATE of them failed it opens.
+    - open: calls are refused right away (CircuitOpenError) for
+      ACCOUNTS_BREAKER_RESET_TIMEOUT seconds.
+    - half open: a single probe call goes through, the breaker closes if it
+      succeeds and opens again if it fails.
+
+    When the `mail` breaker is open, send_mail queues the message instead
+    (see django_accounts.mail). The queue worker waits for the breaker
+    before delivering. When the breaker of a provider (`provider:<id>`)
+    is open, social login fails fast with "Could not reach the provider".
+
+    The state is exposed in the metrics:
+
+        accounts_breaker_state{breaker,state}    (1 for the current state)
+        accounts_breaker_calls_total{breaker,outcome}
+
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django_accounts import app_settings
+from django_accounts import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+BREAKER_STATE = 'accounts_breaker_state'
+BREAKER_CALLS = 'accounts_breaker_calls_total'
+
+metrics.register(BREAKER_STATE, 'gauge', 'Processes with the breaker in the state.')
+metrics.register(BREAKER_CALLS, 'counter', 'Calls through the breaker by outcome (success, failure, rejected).')
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=app_settings.BREAKER_WINDOW)
+        self.opened_at = None
+        # Start time of the probe call when half open
+        self.probing = None
+        self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        # Called with the lock held (or from __init__)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.outcomes.clear()
+        self.probing = None
+        for name in STATES:
+            metrics.set_gauge(BREAKER_STATE, int(name == state), breaker=self.name, state=name)
+
+    def retry_in(self):
+        """
+        Returns the seconds before the open breaker lets a probe through
+        """
+        if self.state != OPEN:
+            return 0
+        return max(0, self.opened_at + app_settings.BREAKER_RESET_TIMEOUT - time.time())
+
+    def allow(self):
+        """
+        Returns whether a call may go through. The caller must then report
+        its outcome with success() or failure().
+        """
+        with self.lock:
+            if self.state == OPEN and self.retry_in() <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            # A probe that never reported back is given up after the timeout
+            if self.state == HALF_OPEN and (not self.probing or
+                                            time.time() - self.probing >= app_settings.BREAKER_RESET_TIMEOUT):
+                self.probing = time.time()
+                return True
+        metrics.inc(BREAKER_CALLS, breaker=self.name, outcome='rejected')
+        return False
+
+    def success(self):
+        metrics.inc(BREAKER_CALLS, breaker=self.name, outcome='success')
+        with self.lock:
+            if self.state == HALF_OPEN:
+                logger.info("Circuit breaker %s closed", self.name)
+                self._set_state(CLOSED)
+            elif self.state == CLOSED:
+                self.outcomes.append(True)
+
+    def failure(self):
+        metrics.inc(BREAKER_CALLS, breaker=self.name, outcome='failure')
+        with self.lock:
+            if self.state == HALF_OPEN:
+                logger.warning("Circuit breaker %s opened again, the probe failed", self.name)
+                self._set_state(OPEN)
+            elif self.state == CLOSED:
+                self.outcomes.append(False)
+                failures = self.outcomes.count(False)
+                if (len(self.outcomes) >= app_settings.BREAKER_MIN_CALLS and
+                        failures >= app_settings.BREAKER_FAILURE_RATE * len(self.outcomes)):
+                    logger.warning("Circuit breaker %s opened: %d of the last %d calls failed",
+                                   self.name, failures, len(self.outcomes))
+                    self._set_state(OPEN)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func through the breaker, any exception counts as a failure.
+        Raises CircuitOpenError when the breaker refuses the call.
+        """
+        if not self.allow():
+            raise CircuitOpenError("Circuit breaker %s is open" % self.name)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def reset():
+    """
+    Forgets every breaker (tests, or after changing settings)
+    """
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+    django_accounts.instrumentation
+    ===============================
+
+    Timing of the account adapter hooks
+
+    Every public method of DefaultAccountAdapter (and of its subclasses) is
+    wrapped in a span recording its duration and the number and time of the
+    database queries it made in the accounts metrics:
+
+        accounts_adapter_duration_seconds{method}
+        accounts_adapter_queries_total{method}
+        accounts_adapter_query_seconds_total{method}
+
+    A call slower than ACCOUNTS_ADAPTER_SLOW_THRESHOLD seconds (per method
+    with ACCOUNTS_ADAPTER_SLOW_THRESHOLDS) is logged as a warning.
+
+    Timing is off by default. Turn it on with ACCOUNTS_ADAPTER_TIMING = True
+    or, on a running site, with `./manage.py adapter_timing on` which sets a
+    cache flag every process picks up within FLAG_REFRESH seconds.
+
+    With ACCOUNTS_SQL_COMMENTS the queries of each method are also tagged
+    with its name, see django_accounts.sqlcomments.
+
+"""
+import functools
+import logging
+import threading
+import time
+import types
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.core.cache import cache
+from django.db import connections
+
+from django_accounts import app_settings
+from django_accounts import metrics
+from django_accounts import sqlcomments
+
+logger = logging.getLogger(__name__)
+
+ADAPTER_DURATION = 'accounts_adapter_duration_seconds'
+ADAPTER_QUERIES = 'accounts_adapter_queries_total'
+ADAPTER_QUERY_TIME = 'accounts_adapter_query_seconds_total'
+
+metrics.register(ADAPTER_DURATION, 'histogram', 'Duration of the account adapter methods.',
+                 metrics.DURATION_BUCKETS)
+metrics.register(ADAPTER_QUERIES, 'counter', 'Database queries made by the account adapter methods.')
+metrics.register(ADAPTER_QUERY_TIME, 'counter', 'Time spent in database queries by the account adapter methods.')
+
+ENABLED_CACHE_KEY = 'accounts/adapter_timing'
+# Seconds a process keeps the cache flag before reading it again
+FLAG_REFRESH = 5
+
+_flag = {'enabled': False, 'expires': 0}
+_local = threading.local()
+
+
+def is_enabled():
+    if app_settings.ADAPTER_TIMING:
+        return True
+    now = time.time()
+    if now >= _flag['expires']:
+        _flag['enabled'] = bool(cache.get(ENABLED_CACHE_KEY))
+        _flag['expires'] = now + FLAG_REFRESH
+    return _flag['enabled']
+
+
+def enable(timeout=None):
+    """
+    Turns timing on for every process sharing the cache, for timeout
+    seconds or until disable() is called
+    """
+    cache.set(ENABLED_CACHE_KEY, True, timeout)
+    _flag['expires'] = 0
+
+
+def disable():
+    cache.delete(ENABLED_CACHE_KEY)
+    _flag['expires'] = 0
+
+
+def get_slow_threshold(name):
+    return app_settings.ADAPTER_SLOW_THRESHOLDS.get(name, app_settings.ADAPTER_SLOW_THRESHOLD)
+
+
+class Span(object):
+    """
+    Duration and database queries of a block
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = None
+        self.queries = 0
+        self.query_time = 0.0
+        self.captured_queries = []
+
+    def start(self):
+        # Django only logs queries with a debug cursor, which is forced on
+        # for the duration of the span
+        self._connections = []
+        for connection in connections.all():
+            self._connections.append((connection, connection.force_debug_cursor, len(connection.queries_log)))
+            connection.force_debug_cursor = True
+        self._start = default_timer()
+
+    def stop(self):
+        self.duration = default_timer() - self._start
+        for connection, force_debug_cursor, logged in self._connections:
+            connection.force_debug_cursor = force_debug_cursor
+            queries = list(connection.queries_log)[logged:]
+            self.captured_queries.extend(dict(query, using=connection.alias) for query in queries)
+            self.queries += len(queries)
+            self.query_time += sum(float(query['time']) for query in queries)
+
+
+def _active_spans():
+    active = getattr(_local, 'active', None)
+    if active is None:
+        active = _local.active = set()
+    return active
+
+
+@contextmanager
+def span(name):
+    """
+    Times the block and records it as `name` in the adapter metrics
+    """
+    active = _active_spans()
+    current = Span(name)
+    active.add(name)
+    current.start()
+    try:
+        yield current
+    finally:
+        current.stop()
+        active.discard(name)
+        metrics.observe(ADAPTER_DURATION, current.duration, method=name)
+        metrics.inc(ADAPTER_QUERIES, current.queries, method=name)
+        metrics.inc(ADAPTER_QUERY_TIME, current.query_time, method=name)
+        if current.duration >= get_slow_threshold(name):
+            logger.warning("Slow adapter call %s: %.3fs, %d queries (%.3fs)",
+                           name, current.duration, current.queries, current.query_time)
+
+
+def timed(name, func):
+    """
+    Wraps func in a span named name when timing is on. A call made while a
+    span of the same name is open (an override calling super()) is not
+    timed again. Tags the queries of func when ACCOUNTS_SQL_COMMENTS is on.
+    """
+    def call(*args, **kwargs):
+        if name in _active_spans() or not is_enabled():
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if app_settings.SQL_COMMENTS:
+            with sqlcomments.tag(hook=name):
+                return call(*args, **kwargs)
+        return call(*args, **kwargs)
+    return wrapper
+
+
+class InstrumentedType(type):
+    """
+    Times the public methods defined by the class, see timed()
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        for attr, value in list(attrs.items()):
+            if not attr.startswith('_') and isinstance(value, types.FunctionType):
+                attrs[attr] = timed(attr, value)
+        return super(InstrumentedType, mcs).__new__(mcs, name, bases, attrs)
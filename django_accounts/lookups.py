@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+    django_accounts.lookups
+    =======================
+
+    Case insensitive e-mail lookup that can use an index
+
+    `email__iexact` is `LIKE %s` on SQLite, which never uses an index for a
+    bound parameter, and `UPPER(email) = UPPER(%s)` on PostgreSQL. The
+    `ciexact` lookup compares in the way each backend can serve from the
+    indexes of migration 0003:
+
+    - PostgreSQL: UPPER(email::text) = UPPER(%s)  (functional UPPER index)
+    - SQLite:     email = %s COLLATE NOCASE       (NOCASE index)
+    - MySQL:      email = %s                      (case insensitive collation)
+    - others:     UPPER(email) = UPPER(%s)
+
+"""
+from django.db.models import EmailField, Lookup
+
+
+class CaseInsensitiveExact(Lookup):
+    lookup_name = 'ciexact'
+
+    def get_prep_lookup(self):
+        return self.lhs.output_field.get_prep_lookup('exact', self.rhs)
+
+    def get_db_prep_lookup(self, value, connection):
+        return ('%s', self.lhs.output_field.get_db_prep_lookup('exact', value, connection, prepared=True))
+
+    def _sides(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return lhs, rhs, lhs_params + rhs_params
+
+    def as_sql(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return 'UPPER(%s) = UPPER(%s)' % (lhs, rhs), params
+
+    def as_mysql(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return '%s = %s' % (lhs, rhs), params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return 'UPPER(%s::text) = UPPER(%s)' % (lhs, rhs), params
+
+    def as_sqlite(self, compiler, connection):
+        lhs, rhs, params = self._sides(compiler, connection)
+        return '%s = %s COLLATE NOCASE' % (lhs, rhs), params
+
+
+EmailField.register_lookup(CaseInsensitiveExact)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+    django_accounts.mail
+    ====================
+
+    Background e-mail delivery
+
+    Messages are rendered in the request thread (templates, urls and db
+    access stay there) and only the `send()` call - the slow part talking to
+    the mail backend - is handed to a worker thread.
+
+    Bulk jobs (e.g. admin actions mailing thousands of users) can queue a
+    task instead, which renders and sends its messages in the worker.
+
+    Queued messages go through the `mail` circuit breaker: while it is open
+    the worker holds them until it lets a call through (see
+    django_accounts.breakers).
+
+"""
+import logging
+import threading
+import time
+
+from django.db import connections
+from django.utils.six.moves import queue
+
+from django_accounts import app_settings
+from django_accounts import breakers
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue(object):
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='accounts-mail')
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            func, args, kwargs, description = self._queue.get()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                logger.exception("Failed to %s", description)
+            finally:
+                self._queue.task_done()
+                # Tasks may have used the database from this thread
+                connections.close_all()
+
+    def put(self, msg):
+        """
+        Queues an already rendered EmailMessage for delivery.
+        Sends inline if ACCOUNTS_MAIL_QUEUE_ENABLED is False.
+        """
+        if not app_settings.MAIL_QUEUE_ENABLED:
+            breakers.get_breaker('mail').call(msg.send)
+            return
+        self._ensure_worker()
+        self._queue.put((deliver, (msg,), {}, 'send queued mail to: %s' % msg.to))
+
+    def put_task(self, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs) to run in the worker thread.
+        Runs inline if ACCOUNTS_MAIL_QUEUE_ENABLED is False.
+        """
+        if not app_settings.MAIL_QUEUE_ENABLED:
+            func(*args, **kwargs)
+            return
+        self._ensure_worker()
+        self._queue.put((func, args, kwargs, 'run mail task: %s' % func.__name__))
+
+    def join(self):
+        """
+        Blocks until every queued message has been handled.
+        """
+        self._queue.join()
+
+
+def deliver(msg):
+    """
+    Sends msg through the mail breaker, waiting while it is open
+    """
+    breaker = breakers.get_breaker('mail')
+    while True:
+        try:
+            return breaker.call(msg.send)
+        except breakers.CircuitOpenError:
+            time.sleep(max(breaker.retry_in(), 1))
+
+
+mail_queue = MailQueue()
+
+
+def send(msg):
+    """
+    Sends msg through the mail breaker. While it is open the message is
+    queued instead, or CircuitOpenError raised without the queue.
+    """
+    try:
+        return breakers.get_breaker('mail').call(msg.send)
+    except breakers.CircuitOpenError:
+        if not app_settings.MAIL_QUEUE_ENABLED:
+            raise
+        # The mail backend is failing, don't hold the caller for it
+        logger.warning("Mail breaker open, queueing mail to: %s", msg.to)
+        mail_queue.put(msg)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.accounts_metrics
+    ====================================================
+
+    Prints the counters and latencies of the accounts endpoints published
+    by the processes sharing the cache, in the Prometheus text format.
+
+    ./manage.py accounts_metrics
+
+"""
+from django.core.management.base import BaseCommand
+
+from django_accounts import metrics
+
+
+class Command(BaseCommand):
+    help = "Prints the metrics of the accounts endpoints in the Prometheus text format."
+
+    def handle(self, *args, **options):
+        self.stdout.write(metrics.render(metrics.collect()), ending='')
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.adapter_timing
+    ==================================================
+
+    Turns the timing of the account adapter methods on or off for every
+    process sharing the cache, see django_accounts.instrumentation.
+
+    ./manage.py adapter_timing on --timeout 600
+    ./manage.py adapter_timing off
+
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from django_accounts import app_settings
+from django_accounts import instrumentation
+
+
+class Command(BaseCommand):
+    help = "Turns the timing of the account adapter methods on or off at runtime."
+
+    def add_arguments(self, parser):
+        parser.add_argument('state', choices=['on', 'off', 'status'])
+        parser.add_argument(
+            '--timeout', type=int, default=None,
+            help='Seconds after which timing turns itself off (default never).'
+        )
+
+    def handle(self, *args, **options):
+        state = options['state']
+        if state == 'on':
+            if options['timeout'] is not None and options['timeout'] < 1:
+                raise CommandError("--timeout must be at least 1 second.")
+            instrumentation.enable(options['timeout'])
+        elif state == 'off':
+            instrumentation.disable()
+            if app_settings.ADAPTER_TIMING:
+                self.stderr.write("ACCOUNTS_ADAPTER_TIMING is set, timing stays on.")
+        enabled = app_settings.ADAPTER_TIMING or bool(cache.get(instrumentation.ENABLED_CACHE_KEY))
+        self.stdout.write("Adapter timing is %s." % ('on' if enabled else 'off'))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.generate_users
+    ==================================================
+
+    Bulk creates users with their e-mail address and auth token, for
+    benchmarks and load tests on a realistic population.
+
+    ./manage.py generate_users 1000000 --prefix bench --batch-size 5000
+
+    The password is hashed once and shared by all the users, and rows are
+    inserted with bulk_create so no signal fires. Users are named
+    <prefix><n> with e-mail <prefix><n>@example.com, n counting from
+    --start. Not for partitioned setups (the user directory is not filled).
+
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from allauth.account.models import EmailAddress
+from rest_framework.authtoken.models import Token
+
+from django_accounts import app_settings
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Bulk creates users with their e-mail address and auth token."
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Number of users to create.')
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Username prefix (default user).'
+        )
+        parser.add_argument(
+            '--start', type=int, default=0,
+            help='First user number (default 0).'
+        )
+        parser.add_argument(
+            '--password', default='password12',
+            help='Password of every user (default password12).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Users created per transaction (default 5000).'
+        )
+        parser.add_argument(
+            '--unverified', action='store_true', default=False,
+            help='Leave the e-mail addresses unverified.'
+        )
+        parser.add_argument(
+            '--no-tokens', action='store_true', default=False,
+            help='Do not create auth tokens.'
+        )
+
+    def create_batch(self, numbers, prefix, password, verified, tokens):
+        user_model = get_user_model()
+        now = timezone.now()
+        users = []
+        for n in numbers:
+            username = '%s%d' % (prefix, n)
+            users.append(user_model(
+                username=username,
+                email='%s@example.com' % username,
+                password=password,
+                date_joined=now,
+            ))
+        with transaction.atomic():
+            user_model.objects.bulk_create(users)
+            # bulk_create doesn't set the primary keys on every backend. Looked
+            # up in chunks: SQLite allows 999 parameters per query
+            user_ids = []
+            for i in range(0, len(users), LOOKUP_CHUNK_SIZE):
+                user_ids.extend(user_model.objects.filter(
+                    username__in=[user.username for user in users[i:i + LOOKUP_CHUNK_SIZE]]
+                ).values_list('pk', 'email'))
+            EmailAddress.objects.bulk_create([
+                EmailAddress(user_id=user_id, email=email, verified=verified, primary=True)
+                for user_id, email in user_ids
+            ])
+            if tokens:
+                Token.objects.bulk_create([
+                    Token(key=Token().generate_key(), user_id=user_id)
+                    for user_id, email in user_ids
+                ])
+
+    def handle(self, *args, **options):
+        if app_settings.PARTITION_DATABASES:
+            raise CommandError("generate_users doesn't support partitioned users.")
+        count = options['count']
+        batch_size = max(options['batch_size'], 1)
+        # Hash once: hashing is by design the slowest part of creating a user
+        password = make_password(options['password'])
+
+        start = time.time()
+        first = options['start']
+        for batch_start in range(first, first + count, batch_size):
+            numbers = range(batch_start, min(batch_start + batch_size, first + count))
+            self.create_batch(numbers, options['prefix'], password,
+                              not options['unverified'], not options['no_tokens'])
+            if options['verbosity'] > 1:
+                self.stdout.write("Created %d users" % (numbers[-1] - first + 1))
+        elapsed = time.time() - start
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write("Created %d users in %.2fs (%.1f users/s)" % (count, elapsed, rate))
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.profile_token
+    =================================================
+
+    Prints a token allowing to profile accounts requests without a staff
+    session, see django_accounts.profiling.
+
+    curl -H "X-Accounts-Profile: $(./manage.py profile_token)" ...
+
+"""
+from django.core.management.base import BaseCommand
+
+from django_accounts import app_settings
+from django_accounts import profiling
+
+
+class Command(BaseCommand):
+    help = "Prints a token allowing to profile accounts requests (X-Accounts-Profile header)."
+
+    def handle(self, *args, **options):
+        if not app_settings.PROFILE_DIR:
+            self.stderr.write("ACCOUNTS_PROFILE_DIR isn't set, requests won't be profiled.")
+        self.stdout.write(profiling.make_token())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.purge_accounts
+    ==================================================
+
+    Deletes expired e-mail confirmations, orphaned tokens and expired
+    sessions in small primary key range chunks so it can be run while the
+    site is busy without holding long locks.
+
+    ./manage.py purge_accounts --batch-size 500 --sleep 0.5
+
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from allauth.account import app_settings as account_settings
+from allauth.account.models import EmailConfirmation
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired e-mail confirmations, orphaned auth tokens and "
+        "expired sessions in bounded chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Maximum number of rows deleted per statement (default 1000).'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Seconds to sleep between batches (default 0.1).'
+        )
+        parser.add_argument(
+            '--inactive-tokens', action='store_true', default=False,
+            help='Also delete the auth tokens of inactive users.'
+        )
+        parser.add_argument(
+            '--skip-confirmations', action='store_true', default=False,
+            help='Do not purge e-mail confirmations.'
+        )
+        parser.add_argument(
+            '--skip-tokens', action='store_true', default=False,
+            help='Do not purge auth tokens.'
+        )
+        parser.add_argument(
+            '--skip-sessions', action='store_true', default=False,
+            help='Do not purge sessions.'
+        )
+
+    def get_expired_confirmations(self):
+        expired_q = EmailConfirmation.objects.expired_q()
+        # Confirmations that were never sent expire from their creation date
+        threshold = timezone.now() - timedelta(days=account_settings.EMAIL_CONFIRMATION_EXPIRE_DAYS)
+        never_sent_q = Q(sent__isnull=True, created__lt=threshold)
+        return EmailConfirmation.objects.filter(expired_q | never_sent_q)
+
+    def get_orphaned_tokens(self, inactive_tokens=False):
+        users = get_user_model()._default_manager.all()
+        if inactive_tokens:
+            users = users.filter(is_active=True)
+        return Token.objects.exclude(user__in=users.values('pk'))
+
+    def get_expired_sessions(self):
+        if 'django.contrib.sessions' not in settings.INSTALLED_APPS:
+            return None
+        if settings.SESSION_ENGINE not in ('django.contrib.sessions.backends.db',
+                                           'django.contrib.sessions.backends.cached_db'):
+            return None
+        from django.contrib.sessions.models import Session
+        return Session.objects.filter(expire_date__lt=timezone.now())
+
+    def purge(self, queryset, batch_size, sleep):
+        """
+        Deletes the rows of queryset chunk by chunk. Each chunk is a
+        primary key range holding at most batch_size matching rows, the
+        filter is applied again on delete so rows that stopped matching
+        in the meantime are kept.
+        Returns the number of rows deleted.
+        """
+        deleted = 0
+        last_pk = None
+        while True:
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            db = router.db_for_write(queryset.model)
+            rows = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).using(db)
+            # Django 1.8's delete() doesn't return the number of rows, count
+            # what it deletes in the same transaction instead of len(pks)
+            with transaction.atomic(using=db):
+                deleted += rows.count()
+                rows.delete()
+            last_pk = pks[-1]
+            if len(pks) < batch_size:
+                break
+            if sleep:
+                time.sleep(sleep)
+        return deleted
+
+    def report(self, label, deleted, elapsed):
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(
+            "Deleted %d %s in %.2fs (%.1f rows/s)" % (deleted, label, elapsed, rate)
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        sleep = options['sleep']
+        if batch_size < 1:
+            batch_size = 1
+
+        querysets = []
+        if not options['skip_confirmations']:
+            querysets.append(('expired e-mail confirmations', self.get_expired_confirmations()))
+        if not options['skip_tokens']:
+            querysets.append(('orphaned tokens', self.get_orphaned_tokens(options['inactive_tokens'])))
+        if not options['skip_sessions']:
+            sessions = self.get_expired_sessions()
+            if sessions is None:
+                self.stderr.write("Session engine '%s' doesn't store sessions in the database, "
+                                  "skipping sessions." % settings.SESSION_ENGINE)
+            else:
+                querysets.append(('expired sessions', sessions))
+
+        total = 0
+        total_start = time.time()
+        for label, queryset in querysets:
+            start = time.time()
+            deleted = self.purge(queryset, batch_size, sleep)
+            self.report(label, deleted, time.time() - start)
+            total += deleted
+        self.report('rows in total', total, time.time() - total_start)
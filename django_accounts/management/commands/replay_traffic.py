@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+    django_accounts.management.commands.replay_traffic
+    ==================================================
+
+    Replays traffic captured by TrafficCaptureMiddleware against a server,
+    see django_accounts.traffic.
+
+    ./manage.py generate_users 100000 --prefix bench
+    ./manage.py replay_traffic capture.jsonl --base-url http://localhost:8000 \
+        --users 100000 --prefix bench --concurrency 8 --speed 2 --save replay.json
+    ./manage.py replay_traffic capture.jsonl ... --compare replay.json --tolerance 20
+
+    Run it with the settings (database, SECRET_KEY) of the server so the
+    password reset tokens and e-mail confirmation keys are valid (and its
+    cache too with ACCOUNTS_PASSWORD_RESET_TOKEN_STORE). A request
+    answered with another status than the captured one is counted as an
+    error and left out of the latencies. Only compare replays of the same
+    capture made on the same machine.
+
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_accounts import traffic
+
+
+class Command(BaseCommand):
+    help = "Replays captured accounts traffic against a server and reports the latencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='JSON lines file written by TrafficCaptureMiddleware.')
+        parser.add_argument(
+            '--base-url', default='http://localhost:8000',
+            help='Server to replay against (default http://localhost:8000).'
+        )
+        parser.add_argument(
+            '--users', type=int, required=True,
+            help='Number of users created by generate_users.'
+        )
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Username prefix given to generate_users (default user).'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Requests in flight at most (default 4).'
+        )
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Time scaling, 2 replays twice as fast as captured (default 1).'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Replay the first LIMIT requests only.'
+        )
+        parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline.')
+        parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline.')
+        parser.add_argument(
+            '--tolerance', type=float, default=20,
+            help='Allowed slowdown in percent (default 20).'
+        )
+
+    def report(self, results, baseline=None):
+        self.stdout.write('%-28s %8s %8s %10s %10s %10s' % (
+            'endpoint', 'requests', 'errors', 'p50 ms', 'p99 ms', 'req/s'))
+        rows = sorted(results['endpoints'].items()) + [('all', results['all'])]
+        for name, result in rows:
+            errors = sum(results['errors'].values()) if name == 'all' else results['errors'].get(name, 0)
+            line = '%-28s %8d %8d %10.2f %10.2f %10.1f' % (
+                name, result['requests'], errors, result['p50'] * 1000, result['p99'] * 1000,
+                result['throughput'])
+            previous = baseline.get('all') if baseline and name == 'all' else (
+                baseline or {}).get('endpoints', {}).get(name)
+            if previous and previous['p50'] and previous['p99']:
+                line += '  %+7.1f%% %+7.1f%%' % ((result['p50'] / previous['p50'] - 1) * 100,
+                                                  (result['p99'] / previous['p99'] - 1) * 100)
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['concurrency'] < 1 or options['speed'] <= 0:
+            raise CommandError("--users and --concurrency must be at least 1, --speed above 0.")
+        with open(options['capture']) as capture_file:
+            records = traffic.load(capture_file)
+        if options['limit'] is not None:
+            records = records[:options['limit']]
+        if not records:
+            raise CommandError("Nothing to replay in %s." % options['capture'])
+
+        replayer = traffic.Replayer(records, options['base_url'], options['users'], prefix=options['prefix'],
+                                    concurrency=options['concurrency'], speed=options['speed'])
+        replayer.prepare()
+        results = replayer.run()
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+        self.report(results, baseline)
+        if options['save']:
+            with open(options['save'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True, separators=(',', ': '))
+                baseline_file.write('\n')
+        if baseline:
+            regressions = traffic.compare(results, baseline, options['tolerance'])
+            for name, statistic, previous, now in regressions:
+                self.stdout.write("REGRESSION %s %s: %.2fms -> %.2fms" % (name, statistic, previous * 1000, now * 1000))
+            if regressions:
+                raise CommandError("%d latency regressions." % len(regressions))
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+"""
+    django_accounts.metrics
+    =======================
+
+    Counters and latency histograms for the accounts endpoints
+
+    Recording is lock free: every thread counts into its own shard and the
+    shards are only merged when the metrics are read. Every
+    ACCOUNTS_METRICS_FLUSH_INTERVAL seconds a process publishes its totals
+    to the cache so the exposition endpoint (`accounts_metrics` url) and
+    the `accounts_metrics` management command report all the processes
+    sharing the cache (use a shared cache backend in production).
+
+    The text is in the Prometheus exposition format.
+
+"""
+import bisect
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.core.cache import cache
+from django.utils.encoding import force_text
+from django.utils.translation import ugettext as _
+
+from django_accounts import app_settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = 'accounts_requests_total'
+REQUEST_DURATION = 'accounts_request_duration_seconds'
+
+# name: (type, help, histogram buckets)
+_metrics = {}
+
+
+def register(name, kind, help_text, buckets=None):
+    """
+    Describes a metric. Recording a metric that was not registered works
+    but it is exposed without type and help.
+    """
+    _metrics[name] = (kind, help_text, buckets)
+
+
+register(REQUESTS, 'counter', 'Requests to the accounts endpoints by view and outcome.')
+register(REQUEST_DURATION, 'histogram', 'Latency of the accounts endpoints by view and outcome.',
+         DURATION_BUCKETS)
+
+
+class Shard(object):
+    """
+    Metrics recorded by one thread
+    """
+
+    def __init__(self, thread=None):
+        self.thread = weakref.ref(thread) if thread is not None else None
+        self.counters = {}
+        self.histograms = {}
+
+    def is_alive(self):
+        thread = self.thread() if self.thread is not None else None
+        return thread is not None and thread.is_alive()
+
+
+_local = threading.local()
+# Gauges are set for the whole process, not per thread
+_gauges = {}
+_shards = []
+_retired = Shard()
+_shards_lock = threading.Lock()
+_next_flush = [0]
+
+# pid and id of the process the metrics were recorded by
+_process = [None, None]
+INDEX_CACHE_KEY = 'accounts/metrics'
+
+
+def get_process_id():
+    """
+    Returns the id the metrics of this process are published under. Read
+    on each flush, preforking servers load the app before forking workers.
+    """
+    pid = os.getpid()
+    if _process[0] != pid:
+        if _process[0] is not None:
+            # Forked: what was recorded so far belongs to the parent
+            _clear()
+            _next_flush[0] = 0
+        _process[:] = [pid, '%s:%s' % (socket.gethostname(), pid)]
+    return _process[1]
+
+
+def _get_shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(shard)
+        _local.shard = shard
+    return shard
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name, value=1, **labels):
+    """
+    Increments the counter `name` with the given labels
+    """
+    if not app_settings.METRICS_ENABLED:
+        return
+    counters = _get_shard().counters
+    key = _key(name, labels)
+    counters[key] = counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """
+    Records value in the histogram `name` with the given labels
+    """
+    if not app_settings.METRICS_ENABLED:
+        return
+    buckets = _metrics.get(name, (None, None, None))[2] or DURATION_BUCKETS
+    histograms = _get_shard().histograms
+    key = _key(name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        # one count per bucket, the +Inf bucket then the sum
+        entry = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+    entry[bisect.bisect_left(buckets, value)] += 1
+    entry[-1] += value
+    _maybe_flush()
+
+
+def set_gauge(name, value, **labels):
+    """
+    Sets the gauge `name` with the given labels. Gauges are summed over
+    the processes like the counters.
+    """
+    if not app_settings.METRICS_ENABLED:
+        return
+    _gauges[_key(name, labels)] = value
+    _maybe_flush()
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Records the duration of the block in the histogram `name`
+    """
+    start = default_timer()
+    try:
+        yield
+    finally:
+        observe(name, default_timer() - start, **labels)
+
+
+def _merge(target, source):
+    for key, value in source['counters'].items():
+        target['counters'][key] = target['counters'].get(key, 0) + value
+    for key, entry in source['histograms'].items():
+        current = target['histograms'].get(key)
+        if current is None:
+            target['histograms'][key] = list(entry)
+        else:
+            target['histograms'][key] = [a + b for a, b in zip(current, entry)]
+    return target
+
+
+def _shard_snapshot(shard):
+    # dict() copies are atomic under the GIL, the owner may keep recording
+    return {'counters': dict(shard.counters),
+            'histograms': dict((k, list(v)) for k, v in dict(shard.histograms).items())}
+
+
+def snapshot():
+    """
+    Returns the metrics recorded by this process
+    """
+    with _shards_lock:
+        # Fold the shards of finished threads so they don't pile up
+        for shard in [s for s in _shards if not s.is_alive()]:
+            _merge(_retired.__dict__, _shard_snapshot(shard))
+            _shards.remove(shard)
+        shards = list(_shards)
+        result = _merge({'counters': {}, 'histograms': {}}, _shard_snapshot(_retired))
+        _merge(result, {'counters': dict(_gauges), 'histograms': {}})
+    for shard in shards:
+        _merge(result, _shard_snapshot(shard))
+    return result
+
+
+def reset():
+    """
+    Forgets the metrics recorded by this process (tests)
+    """
+    _clear()
+    cache.delete('accounts/metrics@%s' % get_process_id())
+
+
+def _clear():
+    global _retired
+    with _shards_lock:
+        for shard in _shards:
+            shard.counters.clear()
+            shard.histograms.clear()
+        _retired = Shard()
+        _gauges.clear()
+
+
+def flush():
+    """
+    Publishes the metrics of this process to the cache
+    """
+    timeout = app_settings.METRICS_FLUSH_INTERVAL * 10
+    process_id = get_process_id()
+    cache.set('accounts/metrics@%s' % process_id, snapshot(), timeout)
+    index = cache.get(INDEX_CACHE_KEY) or []
+    if process_id not in index:
+        # Not atomic: a process lost to a concurrent update is added back
+        # on its next flush
+        cache.set(INDEX_CACHE_KEY, index + [process_id], None)
+
+
+def _maybe_flush():
+    now = time.time()
+    if now < _next_flush[0]:
+        return
+    _next_flush[0] = now + app_settings.METRICS_FLUSH_INTERVAL
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not publish the accounts metrics")
+
+
+def collect():
+    """
+    Returns the metrics of every process publishing to the cache
+    """
+    flush()
+    index = cache.get(INDEX_CACHE_KEY) or []
+    snapshots = cache.get_many(['accounts/metrics@%s' % process_id for process_id in index])
+    alive = [key.split('@', 1)[1] for key in snapshots]
+    if len(alive) != len(index):
+        cache.set(INDEX_CACHE_KEY, alive, None)
+    result = {'counters': {}, 'histograms': {}}
+    for process_snapshot in snapshots.values():
+        _merge(result, process_snapshot)
+    return result
+
+
+def _escape(value):
+    return force_text(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(metrics):
+    """
+    Renders a snapshot in the Prometheus text exposition format
+    """
+    series = {}
+    for (name, labels), value in metrics['counters'].items():
+        series.setdefault(name, []).append((labels, value))
+    for (name, labels), entry in metrics['histograms'].items():
+        series.setdefault(name, []).append((labels, entry))
+    lines = []
+    for name in sorted(series):
+        kind, help_text, buckets = _metrics.get(name, (None, None, None))
+        if help_text:
+            lines.append('# HELP %s %s' % (name, help_text))
+        if kind:
+            lines.append('# TYPE %s %s' % (name, kind))
+        for labels, value in sorted(series[name]):
+            if not isinstance(value, list):
+                lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets or DURATION_BUCKETS) + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append('%s_bucket%s %s' % (name, _format_labels(labels, [('le', bound)]), cumulative))
+            lines.append('%s_sum%s %s' % (name, _format_labels(labels), _format_value(value[-1])))
+            lines.append('%s_count%s %s' % (name, _format_labels(labels), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+BAD_CREDENTIALS_MESSAGES = ('Unable to log in with provided credentials.', 'User account is disabled.')
+UNVERIFIED_MESSAGES = ('E-mail is not verified.',)
+
+
+def _get_messages(data):
+    if isinstance(data, dict):
+        for value in data.values():
+            for message in _get_messages(value):
+                yield message
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            for message in _get_messages(value):
+                yield message
+    elif data is not None:
+        yield force_text(data)
+
+
+def get_outcome(response):
+    """
+    Classifies a response: success, bad_credentials, unverified,
+    throttled, shed (rejected by the admission control), invalid or error
+    """
+    if getattr(response, 'admission_rejected', None):
+        return 'shed'
+    status_code = response.status_code
+    if status_code < 400:
+        return 'success'
+    if status_code == 429:
+        return 'throttled'
+    if status_code >= 500:
+        return 'error'
+    messages = set(_get_messages(getattr(response, 'data', None)))
+    if messages & set(_(message) for message in BAD_CREDENTIALS_MESSAGES):
+        return 'bad_credentials'
+    if messages & set(_(message) for message in UNVERIFIED_MESSAGES):
+        return 'unverified'
+    return 'invalid'
+
+
+class MetricsMixin(object):
+    """
+    Counts and times the requests of a view, labelled with `metrics_name`
+    and the outcome of the request.
+    """
+    metrics_name = None
+
+    def dispatch(self, request, *args, **kwargs):
+        start = default_timer()
+        outcome = 'error'
+        try:
+            response = super(MetricsMixin, self).dispatch(request, *args, **kwargs)
+            outcome = get_outcome(response)
+            return response
+        finally:
+            view = self.metrics_name or self.__class__.__name__
+            inc(REQUESTS, view=view, outcome=outcome)
+            observe(REQUEST_DURATION, default_timer() - start, view=view, outcome=outcome)
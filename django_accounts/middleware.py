@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+    django_accounts.middleware
+    ==========================
+
+    Middleware for django_accounts
+
+"""
+import logging
+import random
+import time
+from timeit import default_timer
+
+from django_accounts import app_settings
+from django_accounts import profiling
+from django_accounts import routers
+from django_accounts import sqlcomments
+from django_accounts import traffic
+from django_accounts.utils import get_api_url_names
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Decides per request whether reads may go to a replica, see
+    django_accounts.routers. Place it before AuthenticationMiddleware so
+    loading the user is routed too.
+
+    Unsafe requests and ACCOUNTS_PRIMARY_PATHS (the admin) read from the
+    primary. A response to a request that wrote sets a cookie keeping the
+    client on the primary for ACCOUNTS_REPLICA_PIN_SECONDS, so the next
+    request sees the write even if the replicas lag behind.
+    """
+
+    def process_request(self, request):
+        routers.reset()
+        if (request.method not in SAFE_METHODS or
+                app_settings.REPLICA_PIN_COOKIE in request.COOKIES or
+                request.path.startswith(tuple(app_settings.PRIMARY_PATHS))):
+            routers.pin_primary()
+
+    def process_response(self, request, response):
+        if routers.has_written():
+            response.set_cookie(app_settings.REPLICA_PIN_COOKIE, '1',
+                                max_age=app_settings.REPLICA_PIN_SECONDS,
+                                httponly=True)
+        routers.reset()
+        return response
+
+
+class TrafficCaptureMiddleware(object):
+    """
+    Appends the requests to the accounts endpoints to
+    ACCOUNTS_TRAFFIC_CAPTURE_FILE (a sample of ACCOUNTS_TRAFFIC_CAPTURE_RATE
+    of them), see django_accounts.traffic. Place it first so the duration
+    covers the other middleware too.
+    """
+
+    def process_request(self, request):
+        request._accounts_capture_start = (time.time(), default_timer())
+
+    def process_response(self, request, response):
+        started = getattr(request, '_accounts_capture_start', None)
+        if started is None or not app_settings.TRAFFIC_CAPTURE_FILE:
+            return response
+        if random.random() >= app_settings.TRAFFIC_CAPTURE_RATE:
+            return response
+        record = traffic.get_record(request, response, started[0], default_timer() - started[1])
+        if record is not None:
+            try:
+                traffic.capture(record)
+            except (IOError, OSError):
+                logger.exception("Could not capture the request")
+        return response
+
+
+class SQLCommentMiddleware(object):
+    """
+    Tags the queries of a request with the name of its view when
+    ACCOUNTS_SQL_COMMENTS is on, see django_accounts.sqlcomments.
+    """
+
+    def process_request(self, request):
+        sqlcomments.set_tags()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not app_settings.SQL_COMMENTS:
+            return None
+        match = getattr(request, 'resolver_match', None)
+        sqlcomments.set_tags(view=match.view_name if match else view_func.__name__)
+        return None
+
+    def process_response(self, request, response):
+        sqlcomments.set_tags()
+        return response
+
+
+class ProfilingMiddleware(object):
+    """
+    Runs a request to an accounts endpoint under cProfile when a staff user
+    or the holder of a profile token asks for it, and stores the profile in
+    ACCOUNTS_PROFILE_DIR, see django_accounts.profiling. Place it after
+    AuthenticationMiddleware.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not app_settings.PROFILE_DIR or not profiling.is_requested(request):
+            return None
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name not in get_api_url_names():
+            return None
+        if not profiling.is_allowed(request):
+            return None
+        request._accounts_profile = profiling.Profile(request, match.view_name)
+        request._accounts_profile.start()
+        return None
+
+    def process_response(self, request, response):
+        profile = getattr(request, '_accounts_profile', None)
+        if profile is None:
+            return response
+        del request._accounts_profile
+        profile.stop(response)
+        try:
+            profile.save()
+        except (IOError, OSError):
+            logger.exception("Could not save the profile")
+            return response
+        response[profiling.RESPONSE_HEADER] = profile.id
+        return response
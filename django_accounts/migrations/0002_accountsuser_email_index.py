@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, router
+
+# (index name, column expression, vendors or None for all)
+INDEXES = (
+    ('django_accounts_accountsuser_email_idx', '"email"', None),
+    # Case insensitive prefix search (istartswith/iexact) used by the admin
+    ('django_accounts_accountsuser_email_upper_like', 'UPPER("email"::text) text_pattern_ops', ('postgresql',)),
+    ('django_accounts_accountsuser_username_upper_like', 'UPPER("username"::text) text_pattern_ops', ('postgresql',)),
+)
+
+
+def get_indexes(schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, columns, vendors in INDEXES:
+        if vendors is None or vendor in vendors:
+            if vendor == 'mysql':
+                columns = columns.replace('"', '`')
+            yield name, columns
+
+
+def create_indexes(apps, schema_editor):
+    model = apps.get_model('django_accounts', 'AccountsUser')
+    # Only where the routers place the table (not on the partition directory)
+    if not router.allow_migrate_model(schema_editor.connection.alias, model):
+        return
+    table = model._meta.db_table
+    for name, columns in get_indexes(schema_editor):
+        schema_editor.execute(schema_editor.sql_create_index % {
+            'name': schema_editor.quote_name(name),
+            'table': schema_editor.quote_name(table),
+            'columns': columns,
+            'extra': '',
+        })
+
+
+def drop_indexes(apps, schema_editor):
+    model = apps.get_model('django_accounts', 'AccountsUser')
+    # Only where the routers place the table (not on the partition directory)
+    if not router.allow_migrate_model(schema_editor.connection.alias, model):
+        return
+    table = model._meta.db_table
+    for name, columns in get_indexes(schema_editor):
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'name': schema_editor.quote_name(name),
+            'table': schema_editor.quote_name(table),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
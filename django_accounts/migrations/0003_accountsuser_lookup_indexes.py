@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, router
+
+# The e-mail column is indexed by 0002_accountsuser_email_index, its UPPER()
+# index also serves the case insensitive e-mail lookup on PostgreSQL.
+# (model, index name, column expression, partial index condition, vendors or None for all)
+INDEXES = (
+    # Newest signups first (admin, reporting)
+    ('django_accounts.AccountsUser', 'django_accounts_accountsuser_date_joined_idx', '{date_joined}', '', None),
+    # Dormant account jobs: active users that haven't logged in since ...
+    ('django_accounts.AccountsUser', 'django_accounts_accountsuser_last_login_active', '{last_login}',
+     ' WHERE {is_active}', ('postgresql',)),
+    # Inactive users are a small fraction of the table (admin filter, purges)
+    ('django_accounts.AccountsUser', 'django_accounts_accountsuser_inactive', '{date_joined}',
+     ' WHERE NOT {is_active}', ('postgresql',)),
+    # Without (usable) partial indexes the flag leads a composite index instead.
+    # SQLite supports partial indexes but can't match them against bound parameters.
+    ('django_accounts.AccountsUser', 'django_accounts_accountsuser_active_last_login', '{is_active}, {last_login}',
+     '', ('sqlite', 'mysql')),
+    # Case insensitive e-mail lookups (email_address_exists), see django_accounts.lookups
+    ('django_accounts.AccountsUser', 'django_accounts_accountsuser_email_nocase', '{email} COLLATE NOCASE',
+     '', ('sqlite',)),
+    ('account.EmailAddress', 'account_emailaddress_email_upper', 'UPPER({email}::text)', '', ('postgresql',)),
+    ('account.EmailAddress', 'account_emailaddress_email_nocase', '{email} COLLATE NOCASE', '', ('sqlite',)),
+    ('account.EmailAddress', 'account_emailaddress_email_idx', '{email}', '', ('mysql',)),
+)
+
+
+def get_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for label, name, columns, condition, vendors in INDEXES:
+        model = apps.get_model(label)
+        # Only where the routers place the table (not on the partition directory)
+        if not router.allow_migrate_model(schema_editor.connection.alias, model):
+            continue
+        if vendors is None or vendor in vendors:
+            yield model, name, columns, condition
+
+
+def create_indexes(apps, schema_editor):
+    for model, name, columns, condition in get_indexes(apps, schema_editor):
+        quoted = dict((f.column, schema_editor.quote_name(f.column)) for f in model._meta.local_fields)
+        schema_editor.execute(schema_editor.sql_create_index % {
+            'name': schema_editor.quote_name(name),
+            'table': schema_editor.quote_name(model._meta.db_table),
+            'columns': columns.format(**quoted),
+            'extra': condition.format(**quoted),
+        })
+
+
+def drop_indexes(apps, schema_editor):
+    for model, name, columns, condition in get_indexes(apps, schema_editor):
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'name': schema_editor.quote_name(name),
+            'table': schema_editor.quote_name(model._meta.db_table),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_accounts', '0002_accountsuser_email_index'),
+        ('account', '0002_email_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
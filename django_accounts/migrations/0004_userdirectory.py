@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_accounts', '0003_accountsuser_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDirectory',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('partition', models.CharField(max_length=100, verbose_name='partition')),
+                ('username', models.CharField(unique=True, max_length=255, verbose_name='username')),
+                ('email', models.CharField(db_index=True, max_length=254, verbose_name='email address', blank=True)),
+                ('token', models.CharField(max_length=40, unique=True, null=True, verbose_name='token', blank=True)),
+            ],
+            options={
+                'verbose_name': 'user directory entry',
+                'verbose_name_plural': 'user directory',
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def record_email_addresses(apps, schema_editor):
+    """
+    Records the e-mail addresses already on the partitions
+    """
+    from django_accounts import app_settings
+
+    if not app_settings.PARTITION_DATABASES or schema_editor.connection.alias != app_settings.DIRECTORY_DATABASE:
+        return
+    EmailAddress = apps.get_model('account', 'EmailAddress')
+    UserDirectoryEmail = apps.get_model('django_accounts', 'UserDirectoryEmail')
+    directory = app_settings.DIRECTORY_DATABASE
+    for partition in app_settings.PARTITION_DATABASES:
+        addresses = EmailAddress.objects.using(partition).values_list('pk', 'user_id', 'email')
+        UserDirectoryEmail.objects.using(directory).bulk_create([
+            UserDirectoryEmail(entry_id=user_id, address_id=pk, email=(email or '').strip().lower())
+            for pk, user_id, email in addresses.iterator()
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_email_max_length'),
+        ('django_accounts', '0004_userdirectory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDirectoryEmail',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('address_id', models.IntegerField(verbose_name='e-mail address id')),
+                ('email', models.CharField(max_length=254, verbose_name='email address', db_index=True)),
+                ('entry', models.ForeignKey(related_name='emails', to='django_accounts.UserDirectory')),
+            ],
+            options={
+                'verbose_name': 'user directory e-mail address',
+                'verbose_name_plural': 'user directory e-mail addresses',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='userdirectoryemail',
+            unique_together=set([('entry', 'address_id')]),
+        ),
+        migrations.RunPython(record_email_addresses, migrations.RunPython.noop),
+    ]
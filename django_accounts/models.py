@@ -58,6 +58,43 @@ class AccountsUser(AbstractUser):
     #     super(AccountsUser, self).save(*args, **kwargs)
 
 
+class UserDirectory(models.Model):
+    """
+    Global directory of the users when AccountsUser is partitioned across
+    databases (see django_accounts.partitions). The id of an entry is the
+    id of the user, so user ids are unique across partitions.
+    """
+    partition = models.CharField(_('partition'), max_length=100)
+    username = models.CharField(_('username'), max_length=255, unique=True)
+    email = models.CharField(_('email address'), max_length=254, db_index=True, blank=True)
+    token = models.CharField(_('token'), max_length=40, unique=True, null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('user directory entry')
+        verbose_name_plural = _('user directory')
+
+    def __unicode__(self):
+        return u'%s@%s' % (self.username, self.partition)
+
+
+class UserDirectoryEmail(models.Model):
+    """
+    Every EmailAddress of a partitioned user, so e-mail uniqueness and login
+    by a secondary address are checked in the directory too.
+    """
+    entry = models.ForeignKey(UserDirectory, related_name='emails')
+    address_id = models.IntegerField(_('e-mail address id'))
+    email = models.CharField(_('email address'), max_length=254, db_index=True)
+
+    class Meta:
+        unique_together = ('entry', 'address_id')
+        verbose_name = _('user directory e-mail address')
+        verbose_name_plural = _('user directory e-mail addresses')
+
+    def __unicode__(self):
+        return self.email
+
+
 
 from django.conf import settings
 from django.db.models.signals import post_save
@@ -80,8 +117,10 @@ def create_update_allauth_email(sender, instance=None, created=False, update_fie
     email_changed = instance._previous_email is not None and instance._previous_email != instance.email
     logger.error("email_changed, %s", email_changed)
     if (created or email_changed) and not instance.from_rest_api:
+        # Routed like the user (see django_accounts.partitions)
+        email_addresses = EmailAddress.objects.db_manager(hints={'instance': instance})
         try:
-            EmailAddress.objects.get_for_user(
+            email_addresses.get_for_user(
                 instance,
                 instance.email
             )
@@ -90,7 +129,7 @@ def create_update_allauth_email(sender, instance=None, created=False, update_fie
             # To keep with allauth we need to update rather than create a new
             # record if the email has changed
             try:
-                previous_emailaddress = EmailAddress.objects.get_for_user(
+                previous_emailaddress = email_addresses.get_for_user(
                     instance,
                     instance._previous_email
                 )
@@ -98,7 +137,7 @@ def create_update_allauth_email(sender, instance=None, created=False, update_fie
                 email.email = instance.email
                 email.save()
             except EmailAddress.DoesNotExist:
-                email = EmailAddress.objects.create(
+                email = email_addresses.create(
                             user=instance,
                             email=instance.email,
                             primary=True,
@@ -113,4 +152,21 @@ from rest_framework.authtoken.models import Token
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
-        Token.objects.create(user=instance)
+        Token.objects.db_manager(hints={'instance': instance}).create(user=instance)
+
+
+# Keep the user directory up to date when the users are partitioned
+from django_accounts import app_settings as accounts_settings  # noqa
+if accounts_settings.PARTITION_DATABASES:
+    from django_accounts import partitions
+    partitions.connect_receivers()
+
+# Tag the queries with the code path issuing them
+if accounts_settings.SQL_COMMENTS:
+    from django_accounts import sqlcomments
+    sqlcomments.install()
+
+
+# Keep the cached SocialApp credentials up to date (cleared on change)
+if 'allauth.socialaccount' in settings.INSTALLED_APPS:
+    from django_accounts.registration import socialapps  # noqa
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+    django_accounts.offload
+    =======================
+
+    Runs the blocking parts of the account adapter hooks in a thread pool
+
+    Python 2 and Django 1.8 have no coroutines, so the `a*` adapter methods
+    (asend_mail, aauthenticate, asave_user) hand their blocking part - the
+    mail backend, password hashing (hashlib releases the GIL) and the
+    queries around it - to a pool of ACCOUNTS_OFFLOAD_WORKERS threads and
+    return a Future right away. The caller overlaps its own work and
+    collects the outcome with `future.result()`:
+
+        sent = adapter.asend_mail('account/email/password_reset_key', email, context)
+        user = adapter.aauthenticate(request, username=username, password=password).result()
+        sent.result(timeout=10)
+
+    Steps that must stay in the calling thread (a write inside the request
+    transaction) are chained with `Future.then()` and run when the caller
+    collects the result. The pool threads use their own database
+    connections (closed after each call), they don't see rows the request
+    has not committed yet.
+
+    The replica pinning and the partition of the calling thread carry over
+    to the pool thread. With ACCOUNTS_OFFLOAD_WORKERS = 0 everything runs
+    inline and the returned futures are already done.
+
+"""
+import logging
+import sys
+import threading
+
+from django.db import connections
+from django.utils import six
+from django.utils.six.moves import queue
+
+from django_accounts import app_settings
+from django_accounts import partitions
+from django_accounts import routers
+
+logger = logging.getLogger(__name__)
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class Future(object):
+    """
+    Outcome of a call running in the pool
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._done.is_set()
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            logger.exception("Future callback %r failed", callback)
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(future) once done, in the thread finishing the call
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def result(self, timeout=None):
+        """
+        Waits for the call and returns its result or raises its exception
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError("The call did not finish within %s seconds" % timeout)
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return self._result
+
+    def then(self, func):
+        """
+        Returns a future of func(result), func runs in the thread collecting
+        the result
+        """
+        return ChainedFuture(self, func)
+
+
+class ChainedFuture(Future):
+
+    def __init__(self, parent, func):
+        super(ChainedFuture, self).__init__()
+        self._parent = parent
+        self._func = func
+        self._collect_lock = threading.Lock()
+
+    def done(self):
+        return self._done.is_set() or self._parent.done()
+
+    def result(self, timeout=None):
+        with self._collect_lock:
+            if not self._done.is_set():
+                try:
+                    self.set_result(self._func(self._parent.result(timeout)))
+                except TimeoutError:
+                    raise
+                except Exception:
+                    self.set_exception(sys.exc_info())
+        return super(ChainedFuture, self).result()
+
+
+class Pool(object):
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _ensure_workers(self, count):
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < count:
+                worker = threading.Thread(target=self._run, name='accounts-offload-%d' % len(self._workers))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            future, func, args, kwargs, pinned, partition = self._queue.get()
+            try:
+                _call(future, func, args, kwargs, pinned, partition)
+            finally:
+                self._queue.task_done()
+                # Calls may have used the database from this thread
+                connections.close_all()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the pool, returns its Future.
+        Runs inline if ACCOUNTS_OFFLOAD_WORKERS is 0.
+        """
+        future = Future()
+        pinned, partition = routers.is_pinned(), partitions.current_partition()
+        if not app_settings.OFFLOAD_WORKERS:
+            _call(future, func, args, kwargs, pinned, partition)
+            return future
+        self._ensure_workers(app_settings.OFFLOAD_WORKERS)
+        self._queue.put((future, func, args, kwargs, pinned, partition))
+        return future
+
+    def join(self):
+        """
+        Blocks until every submitted call has finished.
+        """
+        self._queue.join()
+
+
+def _call(future, func, args, kwargs, pinned, partition):
+    try:
+        with partitions.use_partition(partition):
+            if pinned:
+                with routers.use_primary():
+                    result = func(*args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+    except Exception:
+        future.set_exception(sys.exc_info())
+    else:
+        future.set_result(result)
+
+
+pool = Pool()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+    django_accounts.paginator
+    =========================
+
+    Paginator showing an estimated count for big unfiltered tables
+
+    An exact `COUNT(*)` has to scan the whole table on PostgreSQL (and InnoDB),
+    which takes seconds once there are millions of users. For an unfiltered
+    queryset the row estimate kept by the database statistics is used instead
+    when it is above ACCOUNTS_ADMIN_ESTIMATED_COUNT_THRESHOLD.
+
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+
+from django_accounts import app_settings
+
+
+def estimate_count(queryset):
+    """
+    Returns the number of rows of the queryset's table according to the
+    database statistics, or None if it can not be estimated (filtered
+    queryset or unsupported database).
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.low_mark or query.high_mark is not None:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == 'mysql':
+        sql = ("SELECT table_rows FROM information_schema.tables "
+               "WHERE table_schema = DATABASE() AND table_name = %s")
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses estimate_count() above the threshold and an exact
+    count otherwise.
+    """
+
+    def _get_count(self):
+        if self._count is None:
+            estimate = None
+            if hasattr(self.object_list, 'query'):
+                estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= app_settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                self._count = estimate
+            else:
+                self._count = super(EstimatedCountPaginator, self)._get_count()
+        return self._count
+    count = property(_get_count)
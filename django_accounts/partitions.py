@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+    django_accounts.partitions
+    ==========================
+
+    Partitioning of the users across several databases
+
+    DATABASE_ROUTERS = ['django_accounts.partitions.PartitionRouter']
+    AUTHENTICATION_BACKENDS = ['django_accounts.partitions.PartitionedAuthenticationBackend']
+    REST_FRAMEWORK = {'DEFAULT_AUTHENTICATION_CLASSES': (
+        'django_accounts.partitions.PartitionedTokenAuthentication', ...)}
+    ACCOUNTS_PARTITION_DATABASES = ['users1', 'users2', 'users3']
+
+    A new user is placed on a partition by a stable hash of its (normalized)
+    username, its Token and EmailAddress rows live on the same partition.
+    The UserDirectory table (on ACCOUNTS_DIRECTORY_DATABASE) hands out the
+    user ids and maps username, e-mail and token to the partition, so a
+    login, a signup uniqueness check or a token authentication is one
+    directory lookup plus queries on exactly one partition. Every
+    EmailAddress row (not only the e-mail of the user) is recorded in
+    UserDirectoryEmail, secondary addresses are unique across partitions.
+
+    Other models (e-mail confirmations, social accounts ...) are not
+    partitioned. Relations from them to a user are resolved through the
+    directory as user ids are global.
+
+    Adding partitions doesn't move existing users: the hash only places new
+    users, the directory stays the source of truth.
+
+"""
+import threading
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.translation import ugettext_lazy as _
+
+from allauth.account.auth_backends import AuthenticationBackend
+from allauth.account.models import EmailAddress
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from django_accounts import app_settings
+from django_accounts.models import UserDirectory, UserDirectoryEmail
+
+PARTITIONED_MODELS = ('django_accounts.accountsuser', 'authtoken.token', 'account.emailaddress')
+DIRECTORY_MODELS = ('django_accounts.userdirectory', 'django_accounts.userdirectoryemail')
+
+_local = threading.local()
+
+
+def is_enabled():
+    return bool(app_settings.PARTITION_DATABASES)
+
+
+def normalize(value):
+    return (value or '').strip().lower()
+
+
+def get_partition_for_username(username):
+    """
+    Returns the partition a new user with this username is placed on
+    """
+    partitions = app_settings.PARTITION_DATABASES
+    key = zlib.crc32(normalize(username).encode('utf8')) & 0xffffffff
+    return partitions[key % len(partitions)]
+
+
+def get_directory():
+    return UserDirectory.objects.using(app_settings.DIRECTORY_DATABASE)
+
+
+def _lookup(*args, **kwargs):
+    return get_directory().filter(*args, **kwargs).values_list('partition', flat=True).first()
+
+
+def partition_for_user_id(user_id):
+    return _lookup(pk=user_id)
+
+
+def partition_for_login(login):
+    """
+    Returns the partition of the user with this username or e-mail address
+    """
+    login = normalize(login)
+    return _lookup(Q(username=login) | Q(email=login) | Q(emails__email=login))
+
+
+def partition_for_token(key):
+    return _lookup(token=key)
+
+
+def username_exists(username):
+    return get_directory().filter(username=normalize(username)).exists()
+
+
+def email_exists(email, exclude_user=None):
+    email = normalize(email)
+    entries = get_directory().filter(Q(email=email) | Q(emails__email=email))
+    if exclude_user is not None:
+        entries = entries.exclude(pk=exclude_user.pk)
+    return entries.exists()
+
+
+def current_partition():
+    return getattr(_local, 'partition', None)
+
+
+@contextmanager
+def use_partition(partition):
+    """
+    Queries on the partitioned models made by the current thread inside
+    the block go to the partition
+    """
+    previous = current_partition()
+    _local.partition = partition
+    try:
+        yield
+    finally:
+        _local.partition = previous
+
+
+@contextmanager
+def use_signup_partition(username):
+    """
+    Places the user signing up (and everything written with it) on the
+    partition of the username. Does nothing when not partitioned.
+    """
+    if not is_enabled():
+        yield
+        return
+    with use_partition(get_partition_for_username(username)):
+        yield
+
+
+def _get_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+
+def _is_partitioned(model):
+    return _get_label(model) in PARTITIONED_MODELS
+
+
+class PartitionRouter(object):
+
+    def _get_partition(self, model, instance, write):
+        partition = current_partition()
+        if partition is not None:
+            return partition
+        if instance is None:
+            return None
+        if instance._state.db is not None and _is_partitioned(type(instance)):
+            return instance._state.db
+        if isinstance(instance, get_user_model()):
+            # New user: allocated by the pre_save receiver below
+            return get_partition_for_username(instance.get_username()) if write else None
+        user_id = getattr(instance, 'user_id', None)
+        if user_id is not None:
+            return partition_for_user_id(user_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if _get_label(model) in DIRECTORY_MODELS:
+            return app_settings.DIRECTORY_DATABASE
+        if not is_enabled() or not _is_partitioned(model):
+            return None
+        return self._get_partition(model, hints.get('instance'), write=False)
+
+    def db_for_write(self, model, **hints):
+        if _get_label(model) in DIRECTORY_MODELS:
+            return app_settings.DIRECTORY_DATABASE
+        if not is_enabled() or not _is_partitioned(model):
+            return None
+        return self._get_partition(model, hints.get('instance'), write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if _is_partitioned(type(obj1)) and _is_partitioned(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not is_enabled() or model_name is None:
+            return None
+        if '%s.%s' % (app_label, model_name) in PARTITIONED_MODELS:
+            return db in app_settings.PARTITION_DATABASES
+        if '%s.%s' % (app_label, model_name) in DIRECTORY_MODELS:
+            return db == app_settings.DIRECTORY_DATABASE
+        return None
+
+
+class PartitionedAuthenticationBackend(AuthenticationBackend):
+    """
+    allauth's backend, looking the user up on its partition only
+    """
+
+    def authenticate(self, **credentials):
+        if not is_enabled():
+            return super(PartitionedAuthenticationBackend, self).authenticate(**credentials)
+        partition = partition_for_login(credentials.get('email') or credentials.get('username'))
+        if partition is None:
+            return None
+        with use_partition(partition):
+            return super(PartitionedAuthenticationBackend, self).authenticate(**credentials)
+
+    def get_user(self, user_id):
+        if not is_enabled():
+            return super(PartitionedAuthenticationBackend, self).get_user(user_id)
+        partition = partition_for_user_id(user_id)
+        if partition is None:
+            return None
+        with use_partition(partition):
+            return super(PartitionedAuthenticationBackend, self).get_user(user_id)
+
+
+class PartitionedTokenAuthentication(TokenAuthentication):
+    """
+    DRF token authentication, looking the token up on its partition only
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_enabled():
+            return super(PartitionedTokenAuthentication, self).authenticate_credentials(key)
+        partition = partition_for_token(key)
+        if partition is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        with use_partition(partition):
+            return super(PartitionedTokenAuthentication, self).authenticate_credentials(key)
+
+
+def allocate_user_id(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.pk is not None:
+        return
+    entry = get_directory().create(
+        partition=using,
+        username=normalize(instance.get_username()),
+        email=normalize(instance.email)
+    )
+    instance.pk = entry.pk
+
+
+def update_user_directory(sender, instance, created=False, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & set([instance.USERNAME_FIELD, 'email']):
+        return
+    get_directory().filter(pk=instance.pk).update(
+        username=normalize(instance.get_username()),
+        email=normalize(instance.email)
+    )
+
+
+def delete_user_directory(sender, instance, **kwargs):
+    get_directory().filter(pk=instance.pk).delete()
+
+
+def update_token_directory(sender, instance, **kwargs):
+    get_directory().filter(pk=instance.user_id).update(token=instance.key)
+
+
+def delete_token_directory(sender, instance, **kwargs):
+    get_directory().filter(token=instance.key).update(token=None)
+
+
+def update_email_directory(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    UserDirectoryEmail.objects.using(app_settings.DIRECTORY_DATABASE).update_or_create(
+        entry_id=instance.user_id,
+        address_id=instance.pk,
+        defaults={'email': normalize(instance.email)}
+    )
+
+
+def delete_email_directory(sender, instance, **kwargs):
+    UserDirectoryEmail.objects.using(app_settings.DIRECTORY_DATABASE).filter(
+        entry_id=instance.user_id,
+        address_id=instance.pk
+    ).delete()
+
+
+def get_receivers():
+    # The lazy reference, connect_receivers runs while the models load
+    user_model = settings.AUTH_USER_MODEL
+    return (
+        (pre_save, user_model, allocate_user_id),
+        (post_save, user_model, update_user_directory),
+        (post_delete, user_model, delete_user_directory),
+        (post_save, Token, update_token_directory),
+        (post_delete, Token, delete_token_directory),
+        (post_save, EmailAddress, update_email_directory),
+        (post_delete, EmailAddress, delete_email_directory),
+    )
+
+
+def connect_receivers():
+    """
+    Keeps the directory in sync with the partitions. Connected on startup
+    when ACCOUNTS_PARTITION_DATABASES is set only, a post_delete receiver
+    on Token or EmailAddress would otherwise prevent fast (single
+    statement) deletes.
+    """
+    for signal, sender, receiver in get_receivers():
+        signal.connect(receiver, sender=sender, dispatch_uid='accounts_partitions_%s' % receiver.__name__)
+
+
+def disconnect_receivers():
+    for signal, sender, receiver in get_receivers():
+        if sender == settings.AUTH_USER_MODEL:
+            # Signal.disconnect doesn't resolve lazy references
+            sender = get_user_model()
+        signal.disconnect(sender=sender, dispatch_uid='accounts_partitions_%s' % receiver.__name__)
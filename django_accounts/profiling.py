@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""
+    django_accounts.profiling
+    =========================
+
+    On demand profiling of single accounts API requests
+
+    ACCOUNTS_PROFILE_DIR = '/var/tmp/accounts-profiles'
+    MIDDLEWARE_CLASSES = [..., 'django.contrib.auth.middleware.AuthenticationMiddleware',
+                          'django_accounts.middleware.ProfilingMiddleware']
+
+    A request to an accounts endpoint is run under cProfile when it asks for
+    it and is allowed to:
+
+    - a staff user (session) adding ?profile=1 or the X-Accounts-Profile header
+    - anyone sending a token from `./manage.py profile_token` in the
+      X-Accounts-Profile header (valid ACCOUNTS_PROFILE_TOKEN_MAX_AGE seconds)
+
+    The profile (pstats file) and the queries of the request are stored in
+    ACCOUNTS_PROFILE_DIR, the response carries the X-Accounts-Profile-Id
+    header. The queries are stored normalised, their parameters and
+    literals replaced by ?, so no password hash, token key or e-mail
+    address ends up in the files. Staff users (or token holders) read them from
+    /accounts/profiles/<id>/ and download the pstats file from
+    /accounts/profiles/<id>/download/ (for snakeviz, pstats ...). Only the
+    last ACCOUNTS_PROFILE_KEEP profiles are kept.
+
+"""
+import ast
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.core import signing
+
+from django_accounts import app_settings
+from django_accounts.instrumentation import Span
+
+HEADER = 'HTTP_X_ACCOUNTS_PROFILE'
+RESPONSE_HEADER = 'X-Accounts-Profile-Id'
+TOKEN_SALT = 'django_accounts.profiling'
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+# Django 1.8 on Python 2 reports SQLite queries as "QUERY = u'...' - PARAMS = (...)"
+SQLITE_QUERY = re.compile(r"^QUERY = (u?'.*') - PARAMS = \(.*\)$", re.S)
+NORMALIZERS = (
+    (re.compile(r'%s'), '?'),  # placeholders
+    (re.compile(r'"s\d+_x\d+"'), '"s?_x?"'),  # savepoint names
+    (re.compile(r"'(?:[^']|'')*'"), '?'),  # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),  # numbers
+)
+
+
+def make_token():
+    """
+    Returns a token allowing to profile requests
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def has_valid_token(request):
+    token = request.META.get(HEADER, '')
+    if not token or token == '1':
+        return False
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=app_settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated() and user.is_staff)
+
+
+def is_requested(request):
+    value = request.META.get(HEADER, request.GET.get('profile', ''))
+    return value.lower() not in FALSE_VALUES
+
+
+def normalize_sql(sql):
+    """
+    Returns the query with its parameters and literals replaced by ?
+    """
+    match = SQLITE_QUERY.match(sql)
+    if match:
+        sql = ast.literal_eval(match.group(1))
+    for regex, replacement in NORMALIZERS:
+        sql = regex.sub(replacement, sql)
+    return sql
+
+
+def is_allowed(request):
+    return is_staff(request) or has_valid_token(request)
+
+
+class Profile(object):
+    """
+    cProfile run and queries of one request
+    """
+
+    def __init__(self, request, view_name):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.view_name = view_name
+        self.profiler = cProfile.Profile()
+        self.span = Span(view_name)
+
+    def start(self):
+        self.created = time.time()
+        self.span.start()
+        self.profiler.enable()
+
+    def stop(self, response):
+        self.profiler.disable()
+        self.span.stop()
+        self.status = response.status_code
+
+    def get_summary(self, limit=40):
+        out = io.BytesIO() if str is bytes else io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def save(self):
+        directory = app_settings.PROFILE_DIR
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.profiler.dump_stats(os.path.join(directory, '%s.prof' % self.id))
+        data = {
+            'id': self.id,
+            'created': self.created,
+            'method': self.request.method,
+            'path': self.request.path,
+            'view': self.view_name,
+            'status': self.status,
+            'duration': self.span.duration,
+            'query_count': self.span.queries,
+            'query_time': self.span.query_time,
+            'queries': [dict(query, sql=normalize_sql(query['sql'])) for query in self.span.captured_queries],
+            'summary': self.get_summary(),
+        }
+        with open(os.path.join(directory, '%s.json' % self.id), 'w') as data_file:
+            json.dump(data, data_file)
+        prune()
+
+
+def get_path(profile_id, extension):
+    """
+    Returns the path of a stored profile file, None for an invalid id
+    """
+    if not app_settings.PROFILE_DIR or not PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(app_settings.PROFILE_DIR, '%s.%s' % (profile_id, extension))
+
+
+def load(profile_id):
+    path = get_path(profile_id, 'json')
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as data_file:
+        return json.load(data_file)
+
+
+def list_profiles():
+    """
+    Returns the stored profiles (without queries and summary), newest first
+    """
+    directory = app_settings.PROFILE_DIR
+    if not directory or not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            data = load(name[:-len('.json')])
+            if data is not None:
+                data.pop('queries', None)
+                data.pop('summary', None)
+                profiles.append(data)
+    profiles.sort(key=lambda data: data['created'], reverse=True)
+    return profiles
+
+
+def prune():
+    """
+    Deletes the oldest profiles above ACCOUNTS_PROFILE_KEEP
+    """
+    directory = app_settings.PROFILE_DIR
+    names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    for name in names[app_settings.PROFILE_KEEP:]:
+        for extension in ('json', 'prof'):
+            path = os.path.join(directory, '%s.%s' % (name[:-len('.json')], extension))
+            if os.path.exists(path):
+                os.remove(path)
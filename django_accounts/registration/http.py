@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+    django_accounts.registration.http
+    =================================
+
+    Pooled HTTP sessions for social login provider calls
+
+    allauth talks to the providers through the module level `requests`
+    functions, which open a new connection (and TLS handshake) for every
+    call and have no timeout. Inside `provider_session()` those calls are
+    routed through a long lived session per provider with keep-alive
+    connection pooling, connect/read timeouts and jittered retries.
+
+    `requests` is only patched while a thread is inside `provider_session()`,
+    outside of it requests behaves as usual.
+
+    Each provider has a circuit breaker (`provider:<id>`, see
+    django_accounts.breakers): connection errors, timeouts and 5xx
+    responses count as failures, and while the breaker is open the calls
+    fail right away with ProviderUnavailable (a ConnectionError).
+
+    The calls block the current thread (or greenlet when served by gevent
+    workers). With ACCOUNTS_SOCIAL_RELEASE_DB_CONNECTION the database
+    connection is handed back before waiting so many concurrent social
+    logins don't pin as many database connections.
+
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+import requests.api
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import NewConnectionError
+
+from django.db import connections
+from django.utils.six.moves import http_cookiejar
+
+from django_accounts import app_settings
+from django_accounts import breakers
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class BlockAllCookies(http_cookiejar.DefaultCookiePolicy):
+    """
+    Sessions are shared between users so they must never keep cookies.
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def is_not_sent(error):
+    """
+    Returns whether the request failed before anything was sent: the
+    connection could not be established (refused, DNS, connect timeout)
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or isinstance(error, ProviderUnavailable):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, NewConnectionError)
+
+
+class ProviderUnavailable(breakers.CircuitOpenError, requests.exceptions.ConnectionError):
+    pass
+
+
+class PooledSession(requests.Session):
+    """
+    requests Session with default timeouts and retries with jitter.
+
+    Connection errors are retried for any method only when the connection
+    could not be established (nothing was sent). Other errors and 502/503/504
+    responses are only retried for idempotent methods so an authorization
+    code is never exchanged twice.
+    """
+
+    def __init__(self, timeout=None, retries=0, backoff=0, pool_size=10, breaker=None):
+        super(PooledSession, self).__init__()
+        self.timeout = timeout
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff = backoff
+        self.cookies.set_policy(BlockAllCookies())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def get_retry_delay(self, attempt):
+        # "Full jitter": random delay up to the exponential backoff
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def request(self, method, url, **kwargs):
+        if self.breaker is None:
+            return self._request(method, url, **kwargs)
+        if not self.breaker.allow():
+            raise ProviderUnavailable("Circuit breaker %s is open" % self.breaker.name)
+        try:
+            response = self._request(method, url, **kwargs)
+        except Exception:
+            self.breaker.failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
+
+    def _request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = super(PooledSession, self).request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if (not idempotent and not is_not_sent(e)) or attempt >= self.retries:
+                    raise
+            else:
+                if (not idempotent or response.status_code not in RETRY_STATUS_CODES or
+                        attempt >= self.retries):
+                    return response
+                response.close()
+            logger.warning("Retrying %s %s (attempt %s)", method, url, attempt + 1)
+            time.sleep(self.get_retry_delay(attempt))
+            attempt += 1
+
+
+_local = threading.local()
+_sessions = {}
+_sessions_lock = threading.Lock()
+_original_request = requests.api.request
+
+
+def _request(method, url, **kwargs):
+    session = getattr(_local, 'session', None)
+    if session is None:
+        return _original_request(method, url, **kwargs)
+    return session.request(method=method, url=url, **kwargs)
+
+
+_installed = [0]
+_install_lock = threading.Lock()
+
+
+def _install():
+    # requests.get/post/... look up `request` in requests.api at call time.
+    # Only patched while some thread is inside provider_session(), calls of
+    # the other threads go to the original function meanwhile.
+    with _install_lock:
+        if not _installed[0]:
+            requests.api.request = _request
+            requests.request = _request
+        _installed[0] += 1
+
+
+def _uninstall():
+    with _install_lock:
+        _installed[0] -= 1
+        if not _installed[0]:
+            requests.api.request = _original_request
+            requests.request = _original_request
+
+
+def get_session(provider_id):
+    """
+    Returns the shared PooledSession of the provider
+    """
+    session = _sessions.get(provider_id)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(provider_id)
+            if session is None:
+                session = PooledSession(
+                    timeout=app_settings.SOCIAL_HTTP_TIMEOUT,
+                    retries=app_settings.SOCIAL_HTTP_RETRIES,
+                    backoff=app_settings.SOCIAL_HTTP_BACKOFF,
+                    pool_size=app_settings.SOCIAL_HTTP_POOL_SIZE,
+                    breaker=breakers.get_breaker('provider:%s' % provider_id),
+                )
+                _sessions[provider_id] = session
+    return session
+
+
+def clear_sessions():
+    """
+    Closes and forgets every provider session (e.g. after changing settings)
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def release_db_connections():
+    """
+    Closes the database connections of the current thread unless they are
+    inside a transaction. Django reconnects on the next query.
+    """
+    for conn in connections.all():
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+@contextmanager
+def provider_session(provider_id):
+    """
+    Routes the `requests` calls made by the current thread inside the
+    block through the shared session of the provider.
+    """
+    if app_settings.SOCIAL_RELEASE_DB_CONNECTION:
+        release_db_connections()
+    previous = getattr(_local, 'session', None)
+    _local.session = get_session(provider_id)
+    _install()
+    try:
+        yield _local.session
+    finally:
+        _uninstall()
+        _local.session = previous
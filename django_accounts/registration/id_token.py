@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+    django_accounts.registration.id_token
+    =====================================
+
+    Offline verification of provider ID tokens (OpenID Connect JWTs)
+
+    The signature, audience, issuer and expiry of an ID token are checked
+    locally against the provider's signing keys (JWKS). The keys are cached
+    in memory and refreshed periodically, so verifying a token normally needs
+    no call to the provider at all.
+
+    Requires PyJWT and cryptography.
+
+"""
+import json
+import logging
+import threading
+import time
+
+import requests
+
+from django.core.exceptions import ImproperlyConfigured
+
+from django_accounts import app_settings
+
+from .http import provider_session
+
+try:
+    import jwt
+    from jwt.algorithms import RSAAlgorithm
+except ImportError:
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidIdToken(Exception):
+    pass
+
+
+class KeySet(object):
+    """
+    Signing keys of a provider, fetched from its JWKS url.
+
+    Keys are refreshed every ACCOUNTS_SOCIAL_JWKS_REFRESH seconds. A token
+    signed with an unknown key id triggers an early refresh (at most once
+    every ACCOUNTS_SOCIAL_JWKS_MIN_REFRESH seconds) so key rotation is picked
+    up without letting bogus tokens hammer the provider.
+    """
+
+    def __init__(self, provider_id, url):
+        self.provider_id = provider_id
+        self.url = url
+        self.keys = {}
+        self.fetched = None
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with provider_session(self.provider_id):
+            response = requests.get(self.url)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get('keys', []):
+            if jwk.get('kty') != 'RSA':
+                continue
+            keys[jwk.get('kid')] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+        return keys
+
+    def refresh(self, min_age):
+        """
+        Fetches the keys unless they were fetched less than min_age seconds ago
+        """
+        with self.lock:
+            if self.fetched is not None and time.time() - self.fetched < min_age:
+                return
+            self.keys = self.fetch()
+            self.fetched = time.time()
+
+    def get_key(self, kid):
+        refresh = app_settings.SOCIAL_JWKS_REFRESH
+        if self.fetched is None or time.time() - self.fetched >= refresh:
+            try:
+                self.refresh(refresh)
+            except (requests.RequestException, ValueError):
+                # Keep using the keys we have if the provider is unavailable
+                # or returns garbage (response.json() raises ValueError)
+                if not self.keys:
+                    raise
+                logger.warning("Could not refresh the signing keys from: %s", self.url)
+        key = self.keys.get(kid)
+        if key is None:
+            self.refresh(app_settings.SOCIAL_JWKS_MIN_REFRESH)
+            key = self.keys.get(kid)
+        if key is None:
+            raise InvalidIdToken('Unknown signing key.')
+        return key
+
+
+_key_sets = {}
+_key_sets_lock = threading.Lock()
+
+
+def get_key_set(provider_id, url):
+    key = (provider_id, url)
+    key_set = _key_sets.get(key)
+    if key_set is None:
+        with _key_sets_lock:
+            key_set = _key_sets.setdefault(key, KeySet(provider_id, url))
+    return key_set
+
+
+def clear_key_sets():
+    with _key_sets_lock:
+        _key_sets.clear()
+
+
+def verify_id_token(provider_id, id_token, jwks_url, audience, issuer=None):
+    """
+    Verifies the ID token and returns its claims.
+    Raises InvalidIdToken if the token can not be trusted.
+    """
+    if jwt is None:
+        raise ImproperlyConfigured(
+            'PyJWT and cryptography need to be installed to verify ID tokens.'
+        )
+    algorithms = app_settings.SOCIAL_ID_TOKEN_ALGORITHMS
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.InvalidTokenError:
+        raise InvalidIdToken('Malformed ID token.')
+    if header.get('alg') not in algorithms:
+        raise InvalidIdToken('Unsupported signing algorithm.')
+    key = get_key_set(provider_id, jwks_url).get_key(header.get('kid'))
+    kwargs = {
+        'algorithms': algorithms,
+        'audience': audience,
+        'leeway': app_settings.SOCIAL_ID_TOKEN_LEEWAY,
+        # require_exp for PyJWT 1, require for PyJWT 2 (each ignores the other)
+        'options': {'require_exp': True, 'require': ['exp']},
+    }
+    if issuer:
+        kwargs['issuer'] = issuer
+    try:
+        return jwt.decode(id_token, key, **kwargs)
+    except jwt.InvalidTokenError as e:
+        raise InvalidIdToken(str(e))
@@ -6,11 +6,15 @@
     Social registration serializers for django_accounts App
 
 """
+import hashlib
+
 from django.http import HttpRequest
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 
 from rest_framework import serializers
-from requests.exceptions import HTTPError
+from requests.exceptions import HTTPError, ConnectionError, Timeout
 # Import is needed only if we are using social login, in which
 # case the allauth.socialaccount will be declared
 try:
@@ -21,10 +25,17 @@ except ImportError:
 if 'allauth.socialaccount' not in settings.INSTALLED_APPS:
     raise ImportError('allauth.socialaccount needs to be added to INSTALLED_APPS.')
 
+from django_accounts import app_settings as accounts_settings
+
+from .http import provider_session
+from .id_token import InvalidIdToken, verify_id_token
+from .socialapps import get_social_app
+
 
 class SocialLoginSerializer(serializers.Serializer):
     access_token = serializers.CharField(required=False, allow_blank=True)
     code = serializers.CharField(required=False, allow_blank=True)
+    id_token = serializers.CharField(required=False, allow_blank=True)
 
     def _get_request(self):
         request = self.context.get('request')
@@ -46,6 +57,87 @@ class SocialLoginSerializer(serializers.Serializer):
         social_login.token = token
         return social_login
 
+    def get_id_token_response(self, claims):
+        """
+        Maps the ID token claims to the provider's profile response, as
+        expected by `provider.sociallogin_from_response`. Override for
+        providers whose profile response looks different.
+        """
+        response = dict(claims)
+        response['id'] = claims['sub']
+        response.setdefault('verified_email', claims.get('email_verified', False))
+        return response
+
+    def get_id_token_social_login(self, adapter, app, view, attrs):
+        """
+        Verifies the ID token locally and builds the social login from its
+        claims, without calling the provider.
+        """
+        request = self._get_request()
+        provider = adapter.get_provider()
+        try:
+            claims = verify_id_token(
+                provider.id,
+                attrs['id_token'],
+                view.id_token_jwks_url,
+                audience=app.client_id,
+                issuer=getattr(view, 'id_token_issuer', None)
+            )
+        except InvalidIdToken:
+            raise serializers.ValidationError('Invalid id_token')
+        except (ConnectionError, Timeout, HTTPError, ValueError):
+            # ValueError: the key set is not valid JSON
+            raise serializers.ValidationError('Could not reach the provider. Please try again.')
+        social_login = provider.sociallogin_from_response(request, self.get_id_token_response(claims))
+        token = adapter.parse_token({'access_token': attrs.get('access_token') or attrs['id_token']})
+        token.app = app
+        social_login.token = token
+        return social_login
+
+    def _get_access_token_cache_key(self, provider_id, access_token):
+        # Only a digest of the token is ever stored
+        value = '{provider}:{token}'.format(provider=provider_id, token=access_token)
+        token_digest = hashlib.sha256(value.encode('utf8')).hexdigest()
+        return 'accounts/social_login@{token}'.format(token=token_digest)
+
+    def get_cached_user(self, provider_id, access_token):
+        """
+        Returns the user of the social account recently resolved for this
+        access token, or None (the provider has to be asked).
+        """
+        from allauth.socialaccount.models import SocialAccount
+
+        if not accounts_settings.SOCIAL_LOGIN_CACHE_TIMEOUT:
+            return None
+        uid = cache.get(self._get_access_token_cache_key(provider_id, access_token))
+        if uid is None:
+            return None
+        try:
+            account = SocialAccount.objects.select_related('user').get(provider=provider_id, uid=uid)
+        except SocialAccount.DoesNotExist:
+            return None
+        user = account.user
+        if not user.is_active:
+            return None
+        # complete_social_login is skipped, so tag the backend like allauth would
+        backends = settings.AUTHENTICATION_BACKENDS
+        allauth_backend = 'allauth.account.auth_backends.AuthenticationBackend'
+        user.backend = allauth_backend if allauth_backend in backends else backends[0]
+        return user
+
+    def cache_login(self, provider_id, access_token, login):
+        if accounts_settings.SOCIAL_LOGIN_CACHE_TIMEOUT:
+            cache.set(self._get_access_token_cache_key(provider_id, access_token),
+                      login.account.uid,
+                      accounts_settings.SOCIAL_LOGIN_CACHE_TIMEOUT)
+
+    def get_user(self, login):
+        request = self._get_request()
+        if not login.is_existing:
+            login.lookup()
+            login.save(request, connect=True)
+        return login.account.user
+
     def validate(self, attrs):
         view = self.context.get('view')
         request = self._get_request()
@@ -60,7 +152,15 @@ class SocialLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Define adapter_class in view')
 
         adapter = adapter_class(request)
-        app = adapter.get_provider().get_app(request)
+        app = get_social_app(adapter.get_provider(), request)
+
+        # Case 0: We received an ID token that the view can verify locally
+        if attrs.get('id_token') and getattr(view, 'id_token_jwks_url', None):
+            login = self.get_id_token_social_login(adapter, app, view, attrs)
+            with transaction.atomic():
+                complete_social_login(request, login)
+                attrs['user'] = self.get_user(login)
+            return attrs
 
         # More info on code vs access_token
         # http://stackoverflow.com/questions/8666316/facebook-oauth-2-0-code-and-token
@@ -68,6 +168,11 @@ class SocialLoginSerializer(serializers.Serializer):
         # Case 1: We received the access_token
         if('access_token' in attrs):
             access_token = attrs.get('access_token')
+            # Same token seen a moment ago: skip the provider
+            user = self.get_cached_user(adapter.get_provider().id, access_token)
+            if user is not None:
+                attrs['user'] = user
+                return attrs
 
         # Case 2: We received the authorization code
         elif('code' in attrs):
@@ -96,7 +201,11 @@ class SocialLoginSerializer(serializers.Serializer):
                 self.callback_url,
                 scope
             )
-            token = client.get_access_token(code)
+            try:
+                with provider_session(provider.id):
+                    token = client.get_access_token(code)
+            except (ConnectionError, Timeout):
+                raise serializers.ValidationError('Could not reach the provider. Please try again.')
             access_token = token['access_token']
 
         else:
@@ -106,14 +215,17 @@ class SocialLoginSerializer(serializers.Serializer):
         token.app = app
 
         try:
-            login = self.get_social_login(adapter, app, token, access_token)
-            complete_social_login(request, login)
+            with provider_session(adapter.get_provider().id):
+                login = self.get_social_login(adapter, app, token, access_token)
         except HTTPError:
             raise serializers.ValidationError('Incorrect value')
+        except (ConnectionError, Timeout):
+            raise serializers.ValidationError('Could not reach the provider. Please try again.')
 
-        if not login.is_existing:
-            login.lookup()
-            login.save(request, connect=True)
-        attrs['user'] = login.account.user
+        # All provider calls are done, the database work is kept short
+        with transaction.atomic():
+            complete_social_login(request, login)
+            attrs['user'] = self.get_user(login)
+        self.cache_login(adapter.get_provider().id, access_token, login)
 
         return attrs
\ No newline at end of file
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+    django_accounts.registration.socialapps
+    =======================================
+
+    Cached SocialApp lookups
+
+    `provider.get_app(request)` queries SocialApp (joined with its sites) on
+    every social login. The apps are cached here under one key per provider
+    and site. The keys carry a version that is bumped whenever a SocialApp
+    or its sites change, so a lookup that started before the change can only
+    write its stale app under the old version, which is never read again.
+
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from allauth.socialaccount.models import SocialApp
+from allauth.utils import get_current_site
+
+from django_accounts import app_settings
+
+VERSION_KEY = 'accounts/socialapps/version'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted version never reuses old keys
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_cache_key(provider_id, site_id):
+    return 'accounts/socialapp@{version}:{provider}:{site_id}'.format(
+        version=get_version(), provider=provider_id, site_id=site_id)
+
+
+def get_social_app(provider, request=None):
+    """
+    Same as `provider.get_app(request)` but served from the cache.
+    Raises SocialApp.DoesNotExist if the provider is not configured for the site.
+    """
+    site = get_current_site(request)
+    cache_key = get_cache_key(provider.id, site.id)
+    app = cache.get(cache_key)
+    if app is None:
+        app = SocialApp.objects.get(sites__id=site.id, provider=provider.id)
+        cache.set(cache_key, app, app_settings.SOCIAL_APP_CACHE_TIMEOUT)
+    if request is not None:
+        # Share it with allauth's own per request cache (SocialAppManager.get_current)
+        socialapp_cache = getattr(request, '_socialapp_cache', {})
+        socialapp_cache[provider.id] = app
+        request._socialapp_cache = socialapp_cache
+    return app
+
+
+def clear_social_app_cache():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # No version yet (or evicted), the next lookup starts a new one
+        pass
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+def invalidate_social_app_cache(sender, **kwargs):
+    clear_social_app_cache()
+
+
+@receiver(m2m_changed, sender=SocialApp.sites.through)
+def invalidate_social_app_sites_cache(sender, **kwargs):
+    clear_social_app_cache()
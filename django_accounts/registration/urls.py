@@ -9,6 +9,7 @@
 from django.conf.urls import patterns, url
 from django.views.generic import TemplateView
 
+from django_accounts.views import SendConfirmationEmailView
 from .views import RegisterView, VerifyEmailView
 
 
@@ -16,6 +17,7 @@ urlpatterns = patterns(
     '',
     url(r'^$', RegisterView.as_view(), name='rest_register'),
     url(r'^verify-email/$', VerifyEmailView.as_view(), name='rest_verify_email'),
+    url(r'^verify-email/resend/$', SendConfirmationEmailView.as_view(), name='rest_resend_verify_email'),
 
 
     # We dont currently use this but:
@@ -6,9 +6,17 @@
     Registration Views
 
 """
+import hashlib
 import logging
-from django.http import HttpRequest
+import re
+
+from django.http import HttpRequest, Http404
 from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.utils.encoding import force_text
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -19,18 +27,21 @@ from rest_framework.authtoken.models import Token
 from allauth.account.views import SignupView, ConfirmEmailView
 from allauth.account.utils import complete_signup
 from allauth.account import app_settings
-from allauth.account.models import EmailConfirmation
+from allauth.account.models import EmailAddress, EmailConfirmation, EmailConfirmationHMAC
 
 from .serializers import SocialLoginSerializer
 from django_accounts.serializers import TokenSerializer
 from django_accounts.views import LoginView
 from django_accounts import app_settings as accounts_settings
+from django_accounts import partitions
+from django_accounts.admission import AdmissionMixin
+from django_accounts.metrics import MetricsMixin
 
 
 logger = logging.getLogger(__name__)
 
 
-class RegisterView(APIView, SignupView):
+class RegisterView(MetricsMixin, AdmissionMixin, APIView, SignupView):
     """
     Accepts the credentials and creates a new user
     if user does not exist already
@@ -41,6 +52,8 @@ class RegisterView(APIView, SignupView):
     Return the REST Framework Token Object's key.
     """
 
+    metrics_name = 'register'
+    admission_class = 'register'
     permission_classes = (AllowAny,)
     allowed_methods = ('POST', 'OPTIONS', 'HEAD')
     token_model = Token
@@ -59,8 +72,12 @@ class RegisterView(APIView, SignupView):
 
     def form_valid(self, form):
         logger.info("%s" % app_settings.EMAIL_VERIFICATION)
-        self.user = form.save(self.request)
-        self.token, created = self.token_model.objects.get_or_create(
+        # allauth's signup writes (user, e-mail address) go to the new user's partition
+        with partitions.use_signup_partition(form.cleaned_data.get('username') or form.cleaned_data.get('email')):
+            self.user = form.save(self.request)
+        # The token lives with its user (see django_accounts.partitions)
+        tokens = self.token_model.objects.db_manager(hints={'instance': self.user})
+        self.token, created = tokens.get_or_create(
             user=self.user
         )
         if isinstance(self.request, HttpRequest):
@@ -99,26 +116,75 @@ class RegisterView(APIView, SignupView):
         return Response(self.form.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class VerifyEmailView(APIView, ConfirmEmailView):
-    """ Verify registration via e-mail. """
+class VerifyEmailView(MetricsMixin, APIView, ConfirmEmailView):
+    """
+    Verify registration via e-mail.
 
+    HMAC keys have their signature and expiry checked before any db
+    access and keys that can never be valid are rejected straight away.
+    Keys that were recently confirmed are answered from the cache.
+    """
+
+    metrics_name = 'verify_email'
     permission_classes = (AllowAny,)
     allowed_methods = ('POST', 'GET', 'OPTIONS', 'HEAD')
-
-    def get(self, *args, **kwargs):
-        self.kwargs['key'] = self.request.GET.get('key', '')
+    # Keys stored in the db by EmailConfirmation.create
+    stored_key_regex = re.compile(r'^[a-zA-Z0-9]{64}$')
+
+    def _get_confirmed_cache_key(self, key):
+        key_digest = hashlib.sha256(key.encode('utf8')).hexdigest()
+        return 'accounts/email_confirmed@{key}'.format(key=key_digest)
+
+    def load_hmac_key(self, key):
+        """
+        Returns the EmailAddress pk signed in the HMAC key
+        Raises Http404 if the signature is bad or has expired.
+        """
+        max_age = 60 * 60 * 24 * app_settings.EMAIL_CONFIRMATION_EXPIRE_DAYS
+        try:
+            return signing.loads(key, max_age=max_age, salt=app_settings.SALT)
+        except signing.BadSignature:
+            # Also catches SignatureExpired
+            raise Http404()
+
+    def check_key(self, key):
+        """
+        Rejects keys that can never be valid without touching the db.
+        Returns the EmailAddress pk for HMAC keys, None for stored keys.
+        """
+        if ':' in key:
+            return self.load_hmac_key(key)
+        if not self.stored_key_regex.match(key):
+            raise Http404()
+        return None
+
+    def get_object(self, queryset=None):
+        pk = self.check_key(self.kwargs['key'])
+        if pk is not None:
+            try:
+                email_address = EmailAddress.objects.select_related('user').get(pk=pk)
+            except EmailAddress.DoesNotExist:
+                raise Http404()
+            return EmailConfirmationHMAC(email_address)
+        return super(VerifyEmailView, self).get_object(queryset)
+
+    def verify(self, key):
+        self.kwargs['key'] = force_text(key)
+        self.check_key(self.kwargs['key'])
+        cache_key = self._get_confirmed_cache_key(self.kwargs['key'])
+        if cache.get(cache_key):
+            return Response({'message': 'ok'}, status=status.HTTP_200_OK)
         confirmation = self.get_object()
         logger.info("%s" % confirmation)
         confirmation.confirm(self.request)
+        cache.set(cache_key, True, accounts_settings.EMAIL_CONFIRMED_CACHE_TIMEOUT)
         return Response({'message': 'ok'}, status=status.HTTP_200_OK)
 
+    def get(self, *args, **kwargs):
+        return self.verify(self.request.GET.get('key', ''))
+
     def post(self, request, *args, **kwargs):
-        self.kwargs['key'] = self.request.data.get('key', '')
-        logger.info('hello: %s' % self.kwargs['key'])
-        #logger.info("%s" % EmailConfirmation.objects.all_valid()[0].key)
-        confirmation = self.get_object()
-        confirmation.confirm(self.request)
-        return Response({'message': 'ok'}, status=status.HTTP_200_OK)
+        return self.verify(self.request.data.get('key', ''))
 
 
 class SocialLoginView(LoginView):
@@ -143,6 +209,29 @@ class SocialLoginView(LoginView):
          client_class = OAuth2Client
          callback_url = 'localhost:8000'
     -------------
+
+    example usage for google with a signed id_token (verified locally, no
+    call to google is made apart from fetching the signing keys now and then)
+
+    -------------
+    from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
+
+    class GoogleLogin(SocialLoginView):
+        adapter_class = GoogleOAuth2Adapter
+        id_token_jwks_url = 'https://www.googleapis.com/oauth2/v3/certs'
+        id_token_issuer = 'https://accounts.google.com'
+    -------------
+
+    Provider calls are made before any database work and the view is
+    excluded from ATOMIC_REQUESTS, so no transaction is held open while
+    waiting on the provider. Serve it with gevent workers to handle many
+    social logins per worker (see ACCOUNTS_SOCIAL_RELEASE_DB_CONNECTION).
     """
 
     serializer_class = SocialLoginSerializer
+    metrics_name = 'social_login'
+    admission_class = 'social_login'
+
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, *args, **kwargs):
+        return super(SocialLoginView, self).dispatch(*args, **kwargs)
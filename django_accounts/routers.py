@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+    django_accounts.routers
+    =======================
+
+    Read replica database router for the accounts models
+
+    DATABASE_ROUTERS = ['django_accounts.routers.ReplicaRouter']
+    ACCOUNTS_REPLICA_DATABASES = ['replica1', 'replica2']
+
+    Reads of the accounts apps (ACCOUNTS_REPLICA_APPS) go to a random replica
+    and writes to the primary. Once the current thread wrote, its reads are
+    pinned to the primary so it reads its own writes. Use it with
+    `django_accounts.middleware.ReplicaPinningMiddleware` which resets the
+    pin per request, pins unsafe (POST, PUT ...) and admin requests and keeps
+    a client on the primary for ACCOUNTS_REPLICA_PIN_SECONDS after a write.
+
+    Models read right after being written by another request (tokens,
+    e-mail addresses and confirmations - ACCOUNTS_PRIMARY_ONLY_MODELS) are
+    always read from the primary.
+
+    DRF's TokenAuthentication loads the user along with the token
+    (select_related), so a token authenticated request reads its user from
+    the primary as well. Only session authenticated reads of the user reach
+    the replicas.
+
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django_accounts import app_settings
+
+_local = threading.local()
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def has_written():
+    return getattr(_local, 'written', False)
+
+
+def pin_primary():
+    _local.pinned = True
+
+
+def reset():
+    _local.pinned = False
+    _local.written = False
+
+
+@contextmanager
+def use_primary():
+    """
+    Reads made by the current thread inside the block go to the primary
+    """
+    previous = is_pinned()
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = previous
+
+
+class ReplicaRouter(object):
+
+    def _is_routed(self, app_label):
+        return app_label in app_settings.REPLICA_APPS
+
+    def _is_primary_only(self, model):
+        label = '%s.%s' % (model._meta.app_label, model._meta.model_name)
+        return label in app_settings.PRIMARY_ONLY_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not self._is_routed(model._meta.app_label):
+            return None
+        replicas = app_settings.REPLICA_DATABASES
+        if not replicas or is_pinned() or self._is_primary_only(model):
+            return app_settings.PRIMARY_DATABASE
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not self._is_routed(model._meta.app_label):
+            return None
+        # Read your writes: the rest of the request stays on the primary
+        _local.written = True
+        pin_primary()
+        return app_settings.PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = [app_settings.PRIMARY_DATABASE] + list(app_settings.REPLICA_DATABASES)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary
+        if self._is_routed(app_label) and db in app_settings.REPLICA_DATABASES:
+            return False
+        return None
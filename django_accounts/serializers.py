@@ -6,23 +6,34 @@
     Serializers file for a basic Blog App
 
 """
+import hashlib
+
 from django.contrib.auth import get_user_model, authenticate
 from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.utils import timezone
 
 try:
     from django.utils.http import urlsafe_base64_decode as uid_decoder
 except:
     # make compatible with django 1.5
     from django.utils.http import base36_to_int as uid_decoder
-from django.contrib.auth.tokens import default_token_generator
 from django.utils.translation import ugettext_lazy as _
 
+from allauth.account import app_settings as account_settings
+from allauth.account import signals
+from allauth.account.adapter import get_adapter
 from allauth.account.forms import ResetPasswordForm, SetPasswordForm
+from allauth.account.models import EmailAddress, EmailConfirmation, EmailConfirmationHMAC
 
 from rest_framework import serializers, exceptions
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import ValidationError
 
+from django_accounts import app_settings as accounts_settings
+from django_accounts.tokens import get_token_generator
+
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField(required=False, allow_blank=True)
@@ -133,7 +144,72 @@ class PasswordResetSerializer(serializers.Serializer):
 
     def save(self):
         request = self.context.get('request')
-        self.reset_form.save(request)
+        self.reset_form.save(request, token_generator=get_token_generator())
+
+
+def get_resend_cache_key(email):
+    email_key = hashlib.sha256(email.lower().encode('utf8')).hexdigest()
+    return 'accounts/confirmation_resend@{email}'.format(email=email_key)
+
+
+class SendConfirmationEmailSerializer(serializers.Serializer):
+
+    """
+    Serializer for (re)sending the e-mail confirmation.
+
+    Resends for the same address are coalesced: only the first request in
+    ACCOUNTS_EMAIL_CONFIRMATION_RESEND_WINDOW seconds sends an e-mail. A
+    still valid EmailConfirmation is reused rather than creating a new one
+    and the e-mail is queued rather than sent inline.
+    """
+
+    email = serializers.EmailField()
+
+    def validate_email(self, value):
+        self.email_address = EmailAddress.objects.filter(
+            email__iexact=value
+        ).select_related('user').first()
+        if self.email_address is None:
+            raise serializers.ValidationError('The e-mail address is not assigned to any user account')
+        if self.email_address.verified:
+            raise serializers.ValidationError('E-mail is already verified.')
+        return value
+
+    def _get_request(self):
+        request = self.context.get('request')
+        if request is not None and not isinstance(request, HttpRequest):
+            request = request._request
+        return request
+
+    def get_confirmation(self):
+        """
+        Returns a confirmation for the address, reusing a still valid one
+        """
+        if account_settings.EMAIL_CONFIRMATION_HMAC:
+            return EmailConfirmationHMAC(self.email_address)
+        confirmation = EmailConfirmation.objects.all_valid().filter(
+            email_address=self.email_address
+        ).order_by('-created').first()
+        if confirmation is None:
+            confirmation = EmailConfirmation.create(self.email_address)
+        return confirmation
+
+    def save(self):
+        request = self._get_request()
+        cache_key = get_resend_cache_key(self.email_address.email)
+        # cache.add is atomic: only the first request of the window sends
+        if not cache.add(cache_key, True, accounts_settings.EMAIL_CONFIRMATION_RESEND_WINDOW):
+            return None
+        confirmation = self.get_confirmation()
+        get_adapter(request).send_confirmation_mail(request, confirmation, signup=False, queue=True)
+        if isinstance(confirmation, EmailConfirmation):
+            confirmation.sent = timezone.now()
+            EmailConfirmation.objects.filter(pk=confirmation.pk).update(sent=confirmation.sent)
+        signals.email_confirmation_sent.send(sender=confirmation.__class__,
+                                             request=request,
+                                             confirmation=confirmation,
+                                             signup=False)
+        return confirmation
 
 
 class PasswordResetConfirmSerializer(serializers.Serializer):
@@ -170,12 +246,18 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         )
         if not self.set_password_form.is_valid():
             raise serializers.ValidationError(self.set_password_form.errors)
-        if not default_token_generator.check_token(self.user, attrs['token']):
+        self.token_generator = get_token_generator()
+        if not self.token_generator.check_token(self.user, attrs['token']):
             raise ValidationError({'token': ['Invalid value']})
 
         return attrs
 
     def save(self):
+        # Consumed before the password is set, so a token used twice at the
+        # same time only resets the password once
+        if (hasattr(self.token_generator, 'consume_token') and
+                not self.token_generator.consume_token(self.user, self.validated_data['token'])):
+            raise ValidationError({'token': ['Invalid value']})
         self.set_password_form.save()
 
 
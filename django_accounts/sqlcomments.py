@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+    django_accounts.sqlcomments
+    ===========================
+
+    Tags the SQL queries with the code path that issued them
+
+    ACCOUNTS_SQL_COMMENTS = True
+    MIDDLEWARE_CLASSES = ['django_accounts.middleware.SQLCommentMiddleware', ...]
+
+    appends a comment naming the view and the adapter hook (or other tagged
+    function, e.g. email_address_exists) to every query run inside them,
+    nested hooks are chained outermost first (hook='validate_unique_email>email_address_exists'):
+
+    SELECT ... WHERE UPPER("account_emailaddress"."email") = UPPER(%s)
+        /*hook='email_address_exists',view='accounts:rest_register'*/
+
+    so the database slow query log (or pg_stat_statements, which keeps the
+    text of the first query of each kind) tells where a query came from.
+
+    Django 1.8 has no hook around query execution, so the cursor wrappers
+    are patched on startup when ACCOUNTS_SQL_COMMENTS is set.
+
+"""
+import functools
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db.backends import utils
+
+from django_accounts import app_settings
+
+_local = threading.local()
+
+# Anything else could end the comment or be read as a query placeholder
+UNSAFE_CHARACTERS = re.compile(r'[^\w.:>-]')
+
+HOOK_SEPARATOR = '>'
+
+
+def get_tags():
+    return getattr(_local, 'tags', None)
+
+
+def set_tags(**tags):
+    """
+    Replaces the tags of the current thread
+    """
+    _local.tags = tags or None
+
+
+@contextmanager
+def tag(**tags):
+    """
+    Tags the queries run by the current thread inside the block, on top of
+    the tags already set. A hook inside another hook is appended to it, an
+    override calling super() (same hook name) is not repeated.
+    """
+    previous = get_tags()
+    outer = (previous or {}).get('hook')
+    if outer and tags.get('hook'):
+        if outer.rsplit(HOOK_SEPARATOR, 1)[-1] == tags['hook']:
+            tags['hook'] = outer
+        else:
+            tags['hook'] = '%s%s%s' % (outer, HOOK_SEPARATOR, tags['hook'])
+    _local.tags = dict(previous or {}, **tags)
+    try:
+        yield
+    finally:
+        _local.tags = previous
+
+
+def tagged(name):
+    """
+    Decorator tagging the queries of the function with hook=name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not app_settings.SQL_COMMENTS:
+                return func(*args, **kwargs)
+            with tag(hook=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_comment(tags):
+    return '/*%s*/' % ','.join(
+        "%s='%s'" % (key, UNSAFE_CHARACTERS.sub('_', '%s' % value)) for key, value in sorted(tags.items())
+    )
+
+
+def add_comment(sql):
+    tags = get_tags()
+    if not tags or not app_settings.SQL_COMMENTS:
+        return sql
+    comment = get_comment(tags)
+    if sql.endswith(comment):
+        # Already tagged by the debug cursor
+        return sql
+    return '%s %s' % (sql, comment)
+
+
+def _patch(cls):
+    execute = cls.__dict__['execute']
+    executemany = cls.__dict__['executemany']
+
+    def patched_execute(self, sql, params=None):
+        return execute(self, add_comment(sql), params)
+
+    def patched_executemany(self, sql, param_list):
+        return executemany(self, add_comment(sql), param_list)
+
+    patched_execute.original = execute
+    patched_executemany.original = executemany
+    cls.execute = patched_execute
+    cls.executemany = patched_executemany
+
+
+def install():
+    """
+    Patches the cursor wrappers to add the comments, once
+    """
+    if hasattr(utils.CursorWrapper.execute, 'original'):
+        return
+    _patch(utils.CursorWrapper)
+    _patch(utils.CursorDebugWrapper)
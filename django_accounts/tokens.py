@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+    django_accounts.tokens
+    ======================
+
+    Password reset token generators
+
+    The stock `default_token_generator` tokens stay valid until the
+    password or last_login of the user changes. The `StoredPasswordResetTokenGenerator`
+    additionally keeps the digest of the latest token for each user in the
+    cache so that a token can only be used once and a new reset request
+    revokes every older token.
+
+    Only PasswordResetConfirmView (rest_password_reset_confirm) enforces it.
+    allauth's own reset page (account_reset_password_from_key, the link in
+    the stock reset e-mail) checks tokens with default_token_generator and
+    still accepts superseded or used tokens: point the e-mail at a front end
+    using the REST endpoint when the store is on.
+
+"""
+import hashlib
+
+from django.contrib.auth.tokens import PasswordResetTokenGenerator, default_token_generator
+from django.core.cache import cache
+
+from django_accounts import app_settings
+
+
+class StoredPasswordResetTokenGenerator(PasswordResetTokenGenerator):
+    """
+    Token generator backed by a server side store.
+
+    Only one entry is kept per user: the digest of the latest issued token.
+    Issuing a new token overwrites it (revoking older tokens) and using a
+    token deletes it, so both checks are a single cache lookup. A token is
+    consumed by adding a "used" marker (cache.add is atomic), so of two
+    concurrent uses of a token only one succeeds.
+    """
+
+    def _get_cache_key(self, user):
+        return self._get_pk_cache_key(user.pk)
+
+    def _get_pk_cache_key(self, user_pk):
+        return 'accounts/password_reset@{user_pk}'.format(user_pk=user_pk)
+
+    def _get_used_cache_key(self, digest):
+        return 'accounts/password_reset_used@{digest}'.format(digest=digest)
+
+    def _get_token_digest(self, token):
+        return hashlib.sha256(token.encode('utf8')).hexdigest()
+
+    def make_token(self, user):
+        token = super(StoredPasswordResetTokenGenerator, self).make_token(user)
+        cache.set(self._get_cache_key(user),
+                  self._get_token_digest(token),
+                  app_settings.PASSWORD_RESET_TOKEN_TIMEOUT)
+        return token
+
+    def check_token(self, user, token):
+        if not token:
+            return False
+        # Cheap check first: used, superseded or expired tokens are rejected
+        # without computing the HMAC
+        digest = cache.get(self._get_cache_key(user))
+        if digest is None or digest != self._get_token_digest(token):
+            return False
+        return super(StoredPasswordResetTokenGenerator, self).check_token(user, token)
+
+    def consume_token(self, user, token):
+        """
+        Marks the token as used. Returns True if the token was the
+        current one for the user and nobody used it before.
+        """
+        cache_key = self._get_cache_key(user)
+        digest = self._get_token_digest(token)
+        if cache.get(cache_key) != digest:
+            return False
+        if not cache.add(self._get_used_cache_key(digest), True, app_settings.PASSWORD_RESET_TOKEN_TIMEOUT):
+            return False
+        cache.delete(cache_key)
+        return True
+
+    def revoke_tokens(self, user):
+        """
+        Revokes every outstanding password reset token of the user.
+        """
+        cache.delete(self._get_cache_key(user))
+
+    def revoke_tokens_many(self, user_pks):
+        """
+        Revokes every outstanding password reset token of the given users.
+        """
+        cache.delete_many([self._get_pk_cache_key(user_pk) for user_pk in user_pks])
+
+
+stored_token_generator = StoredPasswordResetTokenGenerator()
+
+
+def get_token_generator():
+    """
+    Returns the password reset token generator to use depending on
+    ACCOUNTS_PASSWORD_RESET_TOKEN_STORE
+    """
+    if app_settings.PASSWORD_RESET_TOKEN_STORE:
+        return stored_token_generator
+    return default_token_generator
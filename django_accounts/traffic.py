@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""
+    django_accounts.traffic
+    =======================
+
+    Capture and replay of the accounts API traffic
+
+    TrafficCaptureMiddleware (django_accounts.middleware) appends one JSON
+    line per request to an accounts endpoint to ACCOUNTS_TRAFFIC_CAPTURE_FILE:
+
+    {"ts": 1476871200.25, "endpoint": "rest_login", "method": "POST",
+     "path": "/accounts/login/", "status": 200, "duration": 0.0123,
+     "client": "5f1c0e9a2b7d4c31", "user": "9d2e47a1c0b3f856"}
+
+    Nothing sent by the client is recorded: client and user are keyed
+    hashes (with SECRET_KEY) of the client address / user agent and of the
+    user id, only good to tell clients and users apart.
+
+    The replay_traffic command sends the captured sequences to a server
+    again, mapping each captured user onto one of the users created by
+    `./manage.py generate_users` and rebuilding the request data.
+
+"""
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.utils.encoding import force_bytes
+
+from django_accounts import app_settings
+from django_accounts.utils import get_api_url_names
+
+# Password of the users created by generate_users
+PASSWORD = 'password12'
+
+# Endpoints needing a logged in client
+AUTHENTICATED_ENDPOINTS = ('rest_logout', 'rest_user_details', 'rest_password_change')
+
+_capture_lock = threading.Lock()
+
+
+def pseudonymize(value):
+    digest = hmac.new(force_bytes(settings.SECRET_KEY), force_bytes(value), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+
+def get_record(request, response, start, duration):
+    """
+    Returns what is captured of the request, None if it isn't captured
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.url_name not in get_api_url_names() or match.kwargs:
+        return None
+    user = getattr(request, 'user', None)
+    client = '%s|%s' % (request.META.get('REMOTE_ADDR', ''), request.META.get('HTTP_USER_AGENT', ''))
+    return {
+        'ts': round(start, 6),
+        'endpoint': match.url_name,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration': round(duration, 6),
+        'client': pseudonymize(client),
+        'user': pseudonymize(user.pk) if user is not None and user.is_authenticated() else None,
+    }
+
+
+def capture(record):
+    line = json.dumps(record, sort_keys=True) + '\n'
+    with _capture_lock:
+        with open(app_settings.TRAFFIC_CAPTURE_FILE, 'a') as capture_file:
+            capture_file.write(line)
+
+
+def load(lines):
+    """
+    Returns the records of a capture, oldest first
+    """
+    records = [json.loads(line) for line in lines if line.strip()]
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of sorted values
+    """
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'p50': percentile(latencies, 0.5) if latencies else 0,
+        'p99': percentile(latencies, 0.99) if latencies else 0,
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+    }
+
+
+class Replayer(object):
+    """
+    Sends captured records to base_url, keeping their (scaled) timing.
+
+    Each captured user is mapped onto one of `users` users named
+    <prefix><n>. The replay must run where the target's database and
+    SECRET_KEY are available: prepare() looks up the mapped users and
+    builds the e-mail confirmation keys, and a password reset token is
+    minted right before each replayed confirmation (after the reset that
+    preceded it). With ACCOUNTS_PASSWORD_RESET_TOKEN_STORE the tokens are
+    kept in the cache, which must then be shared with the target.
+
+    The records of a client are always sent by the same worker, in order.
+    """
+
+    def __init__(self, records, base_url, users, prefix='user', concurrency=4, speed=1.0, timeout=30,
+                 login_path=None):
+        self.records = records
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.prefix = prefix
+        self.concurrency = concurrency
+        self.speed = speed
+        self.timeout = timeout
+        self.run_id = '%x' % int(time.time() * 1000)
+        # Where clients log in before calling an endpoint needing a login
+        self.login_path = login_path or next(
+            (record['path'] for record in records if record['endpoint'] == 'rest_login'), '/accounts/login/'
+        )
+
+    def get_username(self, record):
+        key = record.get('user') or record['client']
+        return '%s%d' % (self.prefix, int(key, 16) % self.users)
+
+    def prepare(self):
+        from allauth.account.models import EmailAddress, EmailConfirmationHMAC
+        from django.contrib.auth import get_user_model
+
+        self.secrets = {}
+        usernames = set(self.get_username(record) for record in self.records
+                        if record['endpoint'] in ('rest_password_reset_confirm', 'rest_verify_email'))
+        users = get_user_model().objects.filter(username__in=usernames)
+        email_addresses = dict((email_address.user_id, email_address)
+                               for email_address in EmailAddress.objects.filter(user__in=users, primary=True))
+        for user in users:
+            email_address = email_addresses.get(user.pk)
+            self.secrets[user.username] = {
+                'uid': user.pk,
+                'key': EmailConfirmationHMAC(email_address).key if email_address else '',
+            }
+
+    def get_data(self, index, record, username):
+        endpoint = record['endpoint']
+        email = '%s@example.com' % username
+        secrets = self.secrets.get(username, {})
+        if endpoint == 'rest_login':
+            return {'username': username, 'password': PASSWORD if record['status'] < 400 else 'wrong'}
+        if endpoint == 'rest_register':
+            new_username = 'replay%s_%d' % (self.run_id, index)
+            return {'username': new_username, 'email': '%s@example.com' % new_username,
+                    'password1': PASSWORD, 'password2': PASSWORD}
+        if endpoint in ('rest_password_reset', 'rest_resend_verify_email'):
+            return {'email': email}
+        # Passwords are left unchanged so the user can still log in
+        if endpoint == 'rest_password_change':
+            return {'password1': PASSWORD, 'password2': PASSWORD}
+        if endpoint == 'rest_password_reset_confirm':
+            return {'uid': secrets.get('uid'), 'token': self.make_token(secrets.get('uid')),
+                    'password1': PASSWORD, 'password2': PASSWORD}
+        if endpoint == 'rest_verify_email':
+            return {'key': secrets.get('key')}
+        if endpoint == 'rest_user_details' and record['method'] != 'GET':
+            return {'first_name': 'Replay'}
+        return None
+
+    def make_token(self, uid):
+        """
+        Returns a password reset token for the user as it is now: a replayed
+        login changes last_login, a replayed reset supersedes older tokens
+        """
+        from django.contrib.auth import get_user_model
+        from django_accounts.tokens import get_token_generator
+
+        user = get_user_model().objects.filter(pk=uid).first()
+        return get_token_generator().make_token(user) if user is not None else ''
+
+    def get_worker(self, record):
+        return int(record['client'], 16) % self.concurrency
+
+    def login(self, session, username):
+        response = session.post(self.base_url + self.login_path, timeout=self.timeout,
+                                json={'username': username, 'password': PASSWORD})
+        session.username = username if response.status_code == 200 else None
+
+    def send(self, session, index, record):
+        username = self.get_username(record)
+        if record['endpoint'] in AUTHENTICATED_ENDPOINTS and record.get('user') and session.username != username:
+            # Not timed: the capture may have started after this client logged in
+            self.login(session, username)
+        headers = {}
+        if 'csrftoken' in session.cookies:
+            headers['X-CSRFToken'] = session.cookies['csrftoken']
+        start = time.time()
+        response = session.request(record['method'], self.base_url + record['path'], timeout=self.timeout,
+                                   json=self.get_data(index, record, username), headers=headers)
+        duration = time.time() - start
+        if record['endpoint'] == 'rest_login':
+            session.username = username if response.status_code == 200 else None
+        elif record['endpoint'] == 'rest_logout':
+            session.username = None
+        return response.status_code, duration
+
+    def run(self):
+        """
+        Returns the results per endpoint and over all the requests
+        """
+        import requests
+        from django.utils.six.moves import queue
+
+        sessions = {}
+        for record in self.records:
+            if record['client'] not in sessions:
+                session = sessions[record['client']] = requests.Session()
+                session.username = None
+
+        # One queue per worker, a client always goes to the same one so its
+        # requests are sent in the captured order
+        queues = [queue.Queue() for i in range(self.concurrency)]
+        results = []
+        results_lock = threading.Lock()
+
+        def worker(work):
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                index, record = item
+                try:
+                    status_code, duration = self.send(sessions[record['client']], index, record)
+                except Exception:
+                    status_code, duration = None, 0
+                with results_lock:
+                    results.append((record, status_code, duration))
+
+        threads = [threading.Thread(target=worker, args=(work,)) for work in queues]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        first = self.records[0]['ts'] if self.records else 0
+        start = time.time()
+        for index, record in enumerate(self.records):
+            delay = start + (record['ts'] - first) / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            queues[self.get_worker(record)].put((index, record))
+        for work in queues:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        latencies = {}
+        errors = {}
+        for record, status_code, duration in results:
+            endpoint = record['endpoint']
+            if status_code != record['status']:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+                continue
+            latencies.setdefault(endpoint, []).append(duration)
+        summary = {'endpoints': {}, 'errors': errors}
+        for endpoint, values in latencies.items():
+            summary['endpoints'][endpoint] = summarize(values, elapsed)
+        summary['all'] = summarize([value for values in latencies.values() for value in values], elapsed)
+        return summary
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions: (endpoint, statistic, baseline, now)
+    """
+    regressions = []
+    current = dict(results['endpoints'], all=results['all'])
+    previous = dict(baseline.get('endpoints', {}), all=baseline.get('all'))
+    for name, result in sorted(current.items()):
+        if not previous.get(name) or not result['requests']:
+            continue
+        for statistic in ('p50', 'p99'):
+            if result[statistic] > previous[name][statistic] * (1 + tolerance / 100.0):
+                regressions.append((name, statistic, previous[name][statistic], result[statistic]))
+    return regressions
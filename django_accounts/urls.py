@@ -9,7 +9,8 @@ from django.conf.urls import patterns, url, include
 from django_accounts.registration import urls as urls_registration
 from django_accounts.views import (
     LoginView, LogoutView, UserDetailsView, PasswordChangeView,
-    PasswordResetView, PasswordResetConfirmView
+    PasswordResetView, PasswordResetConfirmView, MetricsView,
+    ProfileListView, ProfileView, ProfileDownloadView
 )
 
 
@@ -29,6 +30,12 @@ urlpatterns = patterns(
     url(r'^user/$', UserDetailsView.as_view(), name='rest_user_details'),
     url(r'^password/change/$', PasswordChangeView.as_view(), name='rest_password_change'),
 
+    url(r'^metrics/$', MetricsView.as_view(), name='accounts_metrics'),
+    url(r'^profiles/$', ProfileListView.as_view(), name='accounts_profiles'),
+    url(r'^profiles/(?P<profile_id>[0-9a-f]{32})/$', ProfileView.as_view(), name='accounts_profile'),
+    url(r'^profiles/(?P<profile_id>[0-9a-f]{32})/download/$', ProfileDownloadView.as_view(),
+        name='accounts_profile_download'),
+
     # URLS that allow a user to register/signup
     url(r'^registration/', include(urls_registration)),
 )
@@ -15,6 +15,9 @@ else:
 
 from django.contrib.auth import get_user_model
 
+from django_accounts import lookups  # noqa, registers the ciexact lookup
+from django_accounts.sqlcomments import tagged
+
 
 def import_callable(path_or_callable):
     if hasattr(path_or_callable, '__call__'):
@@ -25,19 +28,46 @@ def import_callable(path_or_callable):
         return getattr(import_module(package), attr)
 
 
+# Not API endpoints: allauth's confirmation link and the diagnostics
+NON_API_URL_NAMES = ('account_confirm_email', 'accounts_metrics', 'accounts_profiles',
+                     'accounts_profile', 'accounts_profile_download')
+
+_api_url_names = []
+
+
+def get_api_url_names():
+    """
+    Returns the url names of the accounts API endpoints
+    """
+    if not _api_url_names:
+        from django_accounts import urls
+        from django_accounts.registration import urls as urls_registration
+        for pattern in list(urls.urlpatterns) + list(urls_registration.urlpatterns):
+            name = getattr(pattern, 'name', None)
+            if name and name not in NON_API_URL_NAMES:
+                _api_url_names.append(name)
+    return _api_url_names
+
+
+@tagged('email_address_exists')
 def email_address_exists(email, exclude_user=None):
     from allauth.account import app_settings as account_settings
     from allauth.account.models import EmailAddress
+    from django_accounts import partitions
+
+    if partitions.is_enabled():
+        # One lookup in the directory rather than one per partition
+        return partitions.email_exists(email, exclude_user=exclude_user)
 
     emailaddresses = EmailAddress.objects
     if exclude_user:
         emailaddresses = emailaddresses.exclude(user=exclude_user)
-    ret = emailaddresses.filter(email__iexact=email).exists()
+    ret = emailaddresses.filter(email__ciexact=email).exists()
     if not ret:
         email_field = account_settings.USER_MODEL_EMAIL_FIELD
         if email_field:
             users = get_user_model().objects
             if exclude_user:
                 users = users.exclude(pk=exclude_user.pk)
-            ret = users.filter(**{email_field+'__iexact': email}).exists()
+            ret = users.filter(**{email_field+'__ciexact': email}).exists()
     return ret
@@ -6,30 +6,38 @@
            returning json objects of models.
 '''
 import logging
+import os
 
 from django.contrib.auth import login, logout, get_user_model
 from django.conf import settings
+from django.http import FileResponse, Http404
+from django.utils.crypto import constant_time_compare
 
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.generics import GenericAPIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
+from rest_framework.renderers import BaseRenderer
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import RetrieveUpdateAPIView
 
 from .serializers import (
     TokenSerializer, UserDetailsSerializer, LoginSerializer,
     PasswordResetSerializer, PasswordResetConfirmSerializer,
-    PasswordChangeSerializer
+    PasswordChangeSerializer, SendConfirmationEmailSerializer
 )
 
 from . import app_settings
+from . import metrics
+from . import profiling
+from .metrics import MetricsMixin
+from .admission import AdmissionMixin
 
 logger = logging.getLogger(__name__)
 
 
-class LoginView(GenericAPIView):
+class LoginView(MetricsMixin, AdmissionMixin, GenericAPIView):
 
     """
     Check the credentials and return the REST Token
@@ -40,6 +48,8 @@ class LoginView(GenericAPIView):
     Accept the following POST parameters: username, password
     Return the REST Framework Token Object's key.
     """
+    metrics_name = 'login'
+    admission_class = 'login'
     permission_classes = (AllowAny,)
     serializer_class = LoginSerializer
     token_model = Token
@@ -47,7 +57,9 @@ class LoginView(GenericAPIView):
 
     def login(self):
         self.user = self.serializer.validated_data['user']
-        self.token, created = self.token_model.objects.get_or_create(
+        # The token lives with its user (see django_accounts.partitions)
+        tokens = self.token_model.objects.db_manager(hints={'instance': self.user})
+        self.token, created = tokens.get_or_create(
             user=self.user)
         if getattr(settings, 'REST_SESSION_LOGIN', True):
             login(self.request, self.user)
@@ -113,33 +125,32 @@ class UserDetailsView(RetrieveUpdateAPIView):
 class SendConfirmationEmailView(GenericAPIView):
 
     """
-    Calls Django Auth PasswordResetForm save method.
-
+    Resends the e-mail confirmation (activation) link.
+    Repeated requests for the same address within
+    ACCOUNTS_EMAIL_CONFIRMATION_RESEND_WINDOW only send one e-mail.
 
-    Accepts the following POST parameters: key
+    Accepts the following POST parameters: email
     Returns the success/fail message.
     """
 
-    serializer_class = TokenSerializer
+    serializer_class = SendConfirmationEmailSerializer
     permission_classes = (AllowAny,)
 
     def post(self, request, *args, **kwargs):
-        logger.info("sdfljsdlfjlsjldfjkl")
         # Create a serializer with request.data
         serializer = self.get_serializer(data=request.data)
-        print "jdskfkjsdkjfjdskfjksjkfjkdsjfkjdskfjs"
         if not serializer.is_valid():
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
-        #serializer.save()
+        serializer.save()
         # Return the success message with OK HTTP status
         return Response(
-            {"success": "Password reset e-mail has been sent."},
+            {"success": "Confirmation e-mail has been sent."},
             status=status.HTTP_200_OK
         )
 
 
-class PasswordResetView(GenericAPIView):
+class PasswordResetView(MetricsMixin, AdmissionMixin, GenericAPIView):
     """
     Resets password reset link via e-mail.
     Calls Django Auth PasswordResetForm save method.
@@ -149,6 +160,8 @@ class PasswordResetView(GenericAPIView):
     """
 
     serializer_class = PasswordResetSerializer
+    metrics_name = 'password_reset'
+    admission_class = 'password_reset'
     permission_classes = (AllowAny,)
 
     def post(self, request, *args, **kwargs):
@@ -164,7 +177,7 @@ class PasswordResetView(GenericAPIView):
         )
 
 
-class PasswordResetConfirmView(GenericAPIView):
+class PasswordResetConfirmView(MetricsMixin, GenericAPIView):
 
     """
     Password reset e-mail link is confirmed, therefore this resets the user's password.
@@ -175,6 +188,7 @@ class PasswordResetConfirmView(GenericAPIView):
     """
 
     serializer_class = PasswordResetConfirmSerializer
+    metrics_name = 'password_reset_confirm'
     permission_classes = (AllowAny,)
 
     def post(self, request):
@@ -206,3 +220,88 @@ class PasswordChangeView(GenericAPIView):
             )
         serializer.save()
         return Response({"success": "New password has been saved."})
+
+
+class HasMetricsAccess(BasePermission):
+    """
+    Staff users, or a scraper sending ACCOUNTS_METRICS_TOKEN as a bearer token
+    """
+
+    def has_permission(self, request, view):
+        token = app_settings.METRICS_TOKEN
+        if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer %s' % token):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class PlainTextRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Errors (permission denied ...)
+            data = '%s\n' % data.get('detail', '')
+        return data.encode(self.charset)
+
+
+class MetricsView(APIView):
+    """
+    Exposes the counters and latencies of the accounts endpoints, for all
+    the processes sharing the cache, in the Prometheus text format.
+    """
+    permission_classes = (HasMetricsAccess,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(metrics.render(metrics.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class HasProfileAccess(BasePermission):
+    """
+    Staff users, or the holder of a token from the profile_token command
+    """
+
+    def has_permission(self, request, view):
+        return profiling.is_staff(request) or profiling.has_valid_token(request)
+
+
+class ProfileListView(APIView):
+    """
+    Lists the stored profiles of accounts requests, newest first.
+    """
+    permission_classes = (HasProfileAccess,)
+
+    def get(self, request):
+        return Response(profiling.list_profiles())
+
+
+class ProfileView(APIView):
+    """
+    Returns a stored profile: the request, its queries and the functions
+    it spent the most time in.
+    """
+    permission_classes = (HasProfileAccess,)
+
+    def get(self, request, profile_id):
+        data = profiling.load(profile_id)
+        if data is None:
+            raise Http404
+        return Response(data)
+
+
+class ProfileDownloadView(APIView):
+    """
+    Downloads the pstats file of a stored profile.
+    """
+    permission_classes = (HasProfileAccess,)
+
+    def get(self, request, profile_id):
+        path = profiling.get_path(profile_id, 'prof')
+        if path is None or not os.path.exists(path):
+            raise Http404
+        response = FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+        response['Content-Disposition'] = 'attachment; filename="%s.prof"' % profile_id
+        return response
@@ -12,7 +12,8 @@ setup(
     author_email="james.tarball@gmail.com",
     url="https://github.com/JTarball/django-accounts",
     license="MIT license",
-    packages=["django_accounts", "django_accounts.registration"],
+    packages=["django_accounts", "django_accounts.registration",
+              "django_accounts.management", "django_accounts.management.commands"],
     zip_safe=False,
     include_package_data=True,
     classifiers=[
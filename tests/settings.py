@@ -7,6 +7,7 @@
 
 """
 import os
+import tempfile
 
 from django.conf.global_settings import *
 
@@ -45,7 +46,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
-    }
+        # A file, so the offload pool threads see what the tests commit
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'django_accounts_tests.sqlite3')},
+    },
+    # Read replica for the router tests (a separate, empty database)
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
 }
 
 MIDDLEWARE_CLASSES = [
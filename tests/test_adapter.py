@@ -0,0 +1,76 @@
+"""
+    tests.test_adapter
+    ==================
+
+    Tests for django_accounts.adapter
+
+"""
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from allauth.account.models import EmailAddress
+
+from django_accounts.adapter import get_adapter
+
+
+class ConfirmEmailTests(TestCase):
+    """ Tests DefaultAccountAdapter.confirm_email """
+
+    def setUp(self):
+        self.adapter = get_adapter()
+        self.user = get_user_model().objects.create_user(
+            'jtarball',
+            'jtarball@example.com',
+            'password12'
+        )
+        # EmailAddress is created by the post_save signal
+        self.email = EmailAddress.objects.get(user=self.user)
+
+    def _add_emails(self, count, primary=False):
+        return [
+            EmailAddress.objects.create(
+                user=self.user,
+                email='jtarball%s@example.com' % num,
+                primary=primary and num == 0
+            )
+            for num in range(count)
+        ]
+
+    def test_confirm_email_verifies(self):
+        """ Tests the address is verified and stays primary. """
+        self.adapter.confirm_email(None, self.email)
+        email = EmailAddress.objects.get(pk=self.email.pk)
+        self.assertTrue(email.verified)
+        self.assertTrue(email.primary)
+
+    def test_confirm_email_becomes_primary(self):
+        """ Tests the address becomes primary and syncs the user email if there is no primary. """
+        EmailAddress.objects.filter(pk=self.email.pk).update(primary=False)
+        email = self._add_emails(1)[0]
+        self.adapter.confirm_email(None, email)
+        email = EmailAddress.objects.get(pk=email.pk)
+        self.assertTrue(email.verified)
+        self.assertTrue(email.primary)
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).email, email.email)
+
+    def test_confirm_email_keeps_existing_primary(self):
+        """ Tests the address does not steal primary from an existing primary address. """
+        email = self._add_emails(1)[0]
+        self.adapter.confirm_email(None, email)
+        email = EmailAddress.objects.get(pk=email.pk)
+        self.assertTrue(email.verified)
+        self.assertFalse(email.primary)
+        self.assertTrue(EmailAddress.objects.get(pk=self.email.pk).primary)
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).email, 'jtarball@example.com')
+
+    def test_confirm_email_fixed_query_count(self):
+        """ Tests the number of queries does not depend on the number of addresses. """
+        EmailAddress.objects.filter(pk=self.email.pk).update(primary=False)
+        # savepoint + exists + 2 updates + release savepoint
+        with self.assertNumQueries(5):
+            self.adapter.confirm_email(None, self.email)
+
+        EmailAddress.objects.filter(user=self.user).update(primary=False, verified=False)
+        self._add_emails(10)
+        with self.assertNumQueries(5):
+            self.adapter.confirm_email(None, self.email)
@@ -0,0 +1,155 @@
+"""
+    tests.test_admin
+    ================
+
+    Tests the user admin search, pagination and bulk actions
+
+"""
+import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from allauth.account.models import EmailAddress
+from rest_framework.authtoken.models import Token
+
+from django_accounts.admin import AccountsUserAdmin
+from django_accounts.paginator import EstimatedCountPaginator, estimate_count
+from django_accounts.tokens import stored_token_generator
+
+
+class AccountsUserAdminSearchTests(TestCase):
+
+    def setUp(self):
+        self.model_admin = AccountsUserAdmin(get_user_model(), AdminSite())
+        self.user = get_user_model().objects.create_user('john.smith', 'John.Smith@example.com', 'password12')
+
+    def _search(self, term):
+        request = RequestFactory().get('/admin/django_accounts/accountsuser/', {'q': term})
+        queryset, use_distinct = self.model_admin.get_search_results(
+            request, get_user_model().objects.all(), term
+        )
+        return list(queryset)
+
+    def test_prefix_search(self):
+        """ Tests the start of the e-mail / username matches, case insensitive. """
+        self.assertEqual(self._search('john.smith'), [self.user])
+        self.assertEqual(self._search('JOHN'), [self.user])
+        self.assertEqual(self._search('smith'), [])
+
+    def test_exact_search(self):
+        """ Tests a search containing an @ matches the whole e-mail address, case insensitive. """
+        self.assertEqual(self._search('john.smith@EXAMPLE.com'), [self.user])
+        self.assertEqual(self._search('john.smith@example'), [])
+
+    @override_settings(ACCOUNTS_ADMIN_PREFIX_SEARCH=False)
+    def test_substring_search(self):
+        """ Tests any substring matches when prefix search is disabled. """
+        self.assertEqual(self._search('smith'), [self.user])
+
+    def test_email_index(self):
+        """ Tests the migration indexes the e-mail column. """
+        table = get_user_model()._meta.db_table
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_indexes(cursor, table)
+        self.assertIn('email', indexes)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            get_user_model().objects.create_user('user%s' % i, 'user%s@example.com' % i, 'password12')
+
+    @override_settings(ACCOUNTS_ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_estimated_count(self):
+        """ Tests the estimate is used above the threshold. """
+        with mock.patch('django_accounts.paginator.estimate_count', return_value=5000000):
+            paginator = EstimatedCountPaginator(get_user_model().objects.all(), 100)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 5000000)
+
+    @override_settings(ACCOUNTS_ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_exact_count_below_threshold(self):
+        """ Tests small tables are counted exactly. """
+        with mock.patch('django_accounts.paginator.estimate_count', return_value=10):
+            paginator = EstimatedCountPaginator(get_user_model().objects.all(), 100)
+            self.assertEqual(paginator.count, 3)
+
+    def test_filtered_not_estimated(self):
+        """ Tests filtered querysets are never estimated. """
+        self.assertIsNone(estimate_count(get_user_model().objects.filter(is_active=True)))
+        paginator = EstimatedCountPaginator(get_user_model().objects.filter(username='user1'), 100)
+        self.assertEqual(paginator.count, 1)
+
+
+class AccountsUserAdminActionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.model_admin = AccountsUserAdmin(get_user_model(), AdminSite())
+        self.users = [
+            get_user_model().objects.create_user('user%s' % i, 'user%s@example.com' % i, 'password12')
+            for i in range(20)
+        ]
+        self.other = get_user_model().objects.create_user('other', 'other@example.com', 'password12')
+        mail.outbox = []
+
+    def _run(self, action, users):
+        request = RequestFactory().post('/admin/django_accounts/accountsuser/')
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        queryset = get_user_model().objects.filter(pk__in=[user.pk for user in users])
+        getattr(self.model_admin, action)(request, queryset)
+
+    def _assert_set_based(self, action):
+        """ The number of queries doesn't depend on the number of selected users. """
+        with self.assertNumQueries(1) as small:
+            self._run(action, self.users[:2])
+        with self.assertNumQueries(len(small.captured_queries)):
+            self._run(action, self.users[2:])
+
+    def test_deactivate_activate(self):
+        """ Tests users are (de)activated with a single UPDATE. """
+        self._assert_set_based('deactivate_users')
+        self.assertFalse(get_user_model().objects.filter(pk__in=[u.pk for u in self.users], is_active=True).exists())
+        self.assertTrue(get_user_model().objects.get(pk=self.other.pk).is_active)
+        self._assert_set_based('activate_users')
+        self.assertEqual(get_user_model().objects.filter(is_active=True).count(), 21)
+
+    def test_mark_verified(self):
+        """ Tests the e-mail addresses are verified with a single UPDATE. """
+        self._assert_set_based('mark_verified')
+        self.assertEqual(EmailAddress.objects.filter(verified=True).count(), 20)
+        self.assertFalse(EmailAddress.objects.get(user=self.other).verified)
+
+    def test_revoke_tokens(self):
+        """ Tests the auth tokens are deleted with a single DELETE. """
+        self._assert_set_based('revoke_tokens')
+        self.assertEqual(list(Token.objects.values_list('user', flat=True)), [self.other.pk])
+
+    @override_settings(ACCOUNTS_PASSWORD_RESET_TOKEN_STORE=True)
+    def test_revoke_password_reset_tokens(self):
+        """ Tests outstanding password reset tokens are revoked too. """
+        token = stored_token_generator.make_token(self.users[0])
+        other_token = stored_token_generator.make_token(self.other)
+        self._run('revoke_tokens', self.users)
+        self.assertFalse(stored_token_generator.check_token(self.users[0], token))
+        self.assertTrue(stored_token_generator.check_token(self.other, other_token))
+
+    @override_settings(ACCOUNTS_MAIL_QUEUE_ENABLED=False)
+    def test_resend_confirmation(self):
+        """ Tests confirmations are sent once per window to unverified addresses only. """
+        EmailAddress.objects.filter(user=self.users[0]).update(verified=True)
+        self._run('resend_confirmation', self.users)
+        self.assertEqual(len(mail.outbox), 19)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         sorted('user%s@example.com' % i for i in range(1, 20)))
+        self._run('resend_confirmation', self.users)
+        self.assertEqual(len(mail.outbox), 19)
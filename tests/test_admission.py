@@ -0,0 +1,80 @@
+"""
+    tests.test_admission
+    ====================
+
+    Tests the admission control of the unauthenticated endpoints
+
+"""
+import mock
+
+from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from django_accounts import admission, metrics
+
+
+@override_settings(ACCOUNTS_ADMISSION_CONTROL=True)
+class AdmissionTests(TestCase):
+
+    def setUp(self):
+        admission.reset()
+        metrics.reset()
+        self.login_data = {'username': 'john.smith', 'password': 'password12'}
+
+    def tearDown(self):
+        admission.reset()
+        metrics.reset()
+
+    def _rejected(self, **labels):
+        key = (admission.REJECTED, tuple(sorted(labels.items())))
+        return metrics.snapshot()['counters'].get(key, 0)
+
+    @override_settings(ACCOUNTS_ADMISSION_LIMITS={'login': 1})
+    def test_limit(self):
+        """ Tests a request over the in flight budget gets a 429 before touching the database. """
+        gate = admission.get_gate('login')
+        self.assertIsNone(gate.enter())
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('accounts:rest_login'), self.login_data)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(self._rejected(endpoint='login', reason='limit'), 1)
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters[(metrics.REQUESTS, (('outcome', 'shed'), ('view', 'login')))], 1)
+
+        # Other classes have their own budget
+        response = self.client.post(reverse('accounts:rest_password_reset'), {'email': 'x@example.com'})
+        self.assertNotEqual(response.status_code, 429)
+
+        gate.leave(0.1)
+        get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        response = self.client.post(reverse('accounts:rest_login'), self.login_data)
+        self.assertNotIn(response.status_code, (429, 503))
+        self.assertEqual(gate.in_flight, 0)
+
+    @override_settings(ACCOUNTS_ADMISSION_TARGET_LATENCY=1.0)
+    def test_shed(self):
+        """ Tests requests are shed with a 503 once the latency is above the target. """
+        gate = admission.get_gate('register')
+        gate.latency = 1.5
+        self.assertEqual(gate.get_shed_ratio(), 0.5)
+        with mock.patch.object(admission.random, 'random', return_value=0.4):
+            response = self.client.post(reverse('accounts:rest_register'), {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self._rejected(endpoint='register', reason='shed'), 1)
+        with mock.patch.object(admission.random, 'random', return_value=0.6):
+            response = self.client.post(reverse('accounts:rest_register'), {})
+        self.assertEqual(response.status_code, 400)
+        # The fast request pulled the average down
+        self.assertLess(gate.latency, 1.5)
+
+        gate.latency = 100.0
+        self.assertEqual(gate.get_shed_ratio(), admission.MAX_SHED_RATIO)
+
+    @override_settings(ACCOUNTS_ADMISSION_CONTROL=False, ACCOUNTS_ADMISSION_LIMITS={'login': 0})
+    def test_off(self):
+        """ Tests nothing is rejected when turned off (the default). """
+        response = self.client.post(reverse('accounts:rest_login'), self.login_data)
+        self.assertEqual(response.status_code, 400)
@@ -18,6 +18,7 @@ from django_dynamic_fixture import G
 
 from django.core.urlresolvers import reverse
 from django.core import mail
+from django.core.cache import cache
 from django.contrib.sites.models import Site
 from django.contrib.auth import get_user_model
 from django.test.utils import override_settings
@@ -31,6 +32,7 @@ from allauth.socialaccount.models import SocialApp
 from allauth.socialaccount.providers.facebook.provider import GRAPH_API_URL
 from allauth.account.models import EmailAddress, EmailConfirmation, EmailConfirmationHMAC
 
+from django_accounts.mail import mail_queue
 from django_accounts.models import AccountsUser
 from django_accounts.serializers import LoginSerializer
 
@@ -171,6 +173,59 @@ class EmailConfirmationTests(APITestCase):
         self.assertTrue(email.verified)
 
 
+class EmailConfirmationFastPathTests(APITestCase):
+    """
+    Tests Email Confirmation keys are checked before touching the db
+
+    Malformed / badly signed / expired HMAC keys are rejected with no queries
+    and recently confirmed keys are answered from the cache.
+    """
+    def setUp(self):
+        cache.clear()
+        self.verify_url = reverse('accounts:rest_verify_email')
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            'admin',
+            'admin@email.com',
+            'password12'
+        )
+        # EmailAddress is created by the post_save signal
+        self.email = EmailAddress.objects.get(user=user)
+
+    def test_malformed_key_no_queries(self):
+        """ Tests a key that can never be valid is rejected without a query. """
+        with self.assertNumQueries(0):
+            response = self.client.post(self.verify_url, {'key': 'not-a-key'}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bad_signature_no_queries(self):
+        """ Tests a tampered HMAC key is rejected without a query. """
+        key = EmailConfirmationHMAC(self.email).key + 'x'
+        with self.assertNumQueries(0):
+            response = self.client.post(self.verify_url, {'key': key}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS=0)
+    def test_expired_key_no_queries(self):
+        """ Tests an expired HMAC key is rejected without a query. """
+        key = EmailConfirmationHMAC(self.email).key
+        with self.assertNumQueries(0):
+            response = self.client.post(self.verify_url, {'key': key}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(EmailAddress.objects.get(pk=self.email.pk).verified)
+
+    def test_repeated_confirmation_from_cache(self):
+        """ Tests confirming the same key twice only hits the db once. """
+        key = EmailConfirmationHMAC(self.email).key
+        response = self.client.post(self.verify_url, {'key': key}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(EmailAddress.objects.get(pk=self.email.pk).verified)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.verify_url, {'key': key})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+
 class EmailVerificationTests(APITestCase):
     """
     Tests Email Verification
@@ -299,6 +354,70 @@ class EmailVerificationTests(APITestCase):
         )
 
 
+class TestSendConfirmationEmail(APITestCase):
+    """ Tests resending the e-mail confirmation. """
+    def setUp(self):
+        cache.clear()
+        self.resend_url = reverse('accounts:rest_resend_verify_email')
+        self.client = APIClient()
+        self.email = 'admin@email.com'
+        self.user = get_user_model().objects.create_user(
+            'admin',
+            self.email,
+            'password12'
+        )
+        # Confirmation mail from the post_save signal
+        mail.outbox = []
+
+    def _resend(self, email=None):
+        response = self.client.post(self.resend_url, {'email': email or self.email}, format='json')
+        mail_queue.join()
+        return response
+
+    def test_resend(self):
+        """ Tests the confirmation e-mail is resent. """
+        response = self._resend()
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.content, '{"success":"Confirmation e-mail has been sent."}')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.email])
+
+    def test_resend_coalesced(self):
+        """ Tests repeated resends within the window only send one e-mail. """
+        for _ in range(3):
+            response = self._resend()
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(ACCOUNT_EMAIL_CONFIRMATION_HMAC=False)
+    def test_resend_reuses_valid_confirmation(self):
+        """ Tests a still valid EmailConfirmation is reused instead of creating a new one. """
+        EmailConfirmation.objects.all().delete()
+        email_address = EmailAddress.objects.get(user=self.user)
+        confirmation = EmailConfirmation.create(email_address)
+        confirmation.sent = now()
+        confirmation.save()
+
+        self._resend()
+        self.assertEqual(EmailConfirmation.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(confirmation.key, mail.outbox[0].body)
+
+    def test_resend_unknown_email(self):
+        """ Tests resend fails for an e-mail that is not on record. """
+        response = self._resend('unknown@email.com')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_resend_already_verified(self):
+        """ Tests resend fails for an already verified e-mail. """
+        EmailAddress.objects.filter(user=self.user).update(verified=True)
+        response = self._resend()
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(response.content, '{"email":["E-mail is already verified."]}')
+        self.assertEqual(len(mail.outbox), 0)
+
+
 class TestRegistrations(APITestCase):
     """
     Tests Registration.
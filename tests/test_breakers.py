@@ -0,0 +1,150 @@
+"""
+    tests.test_breakers
+    ===================
+
+    Tests the circuit breakers of the mail backend and the social providers
+
+"""
+import mock
+import requests
+
+from django.core import mail
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from django_accounts import breakers, metrics
+from django_accounts.adapter import get_adapter
+from django_accounts.mail import deliver, mail_queue
+from django_accounts.registration.http import ProviderUnavailable, clear_sessions, provider_session
+
+# Nothing listens there, connections are refused right away
+UNREACHABLE_URL = 'http://127.0.0.1:9/'
+
+
+def fail():
+    raise IOError('down')
+
+
+@override_settings(ACCOUNTS_BREAKER_WINDOW=4, ACCOUNTS_BREAKER_MIN_CALLS=2, ACCOUNTS_BREAKER_FAILURE_RATE=0.5)
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        breakers.reset()
+        metrics.reset()
+        self.breaker = breakers.get_breaker('test')
+
+    def tearDown(self):
+        breakers.reset()
+        metrics.reset()
+
+    def _open(self):
+        for _ in range(2):
+            self.assertRaises(IOError, self.breaker.call, fail)
+        self.assertEqual(self.breaker.state, breakers.OPEN)
+
+    def test_opens_on_failure_rate(self):
+        """ Tests the breaker opens once the failure rate is reached and then refuses calls. """
+        self.breaker.call(int, '1')
+        self.assertRaises(IOError, self.breaker.call, fail)
+        self.assertEqual(self.breaker.state, breakers.OPEN)
+        self.assertRaises(breakers.CircuitOpenError, self.breaker.call, int, '1')
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters[(breakers.BREAKER_CALLS, (('breaker', 'test'), ('outcome', 'rejected')))], 1)
+        self.assertEqual(counters[(breakers.BREAKER_STATE, (('breaker', 'test'), ('state', 'open')))], 1)
+        self.assertEqual(counters[(breakers.BREAKER_STATE, (('breaker', 'test'), ('state', 'closed')))], 0)
+
+    def test_min_calls(self):
+        """ Tests a single failure doesn't open the breaker. """
+        self.assertRaises(IOError, self.breaker.call, fail)
+        self.assertEqual(self.breaker.state, breakers.CLOSED)
+
+    def test_half_open(self):
+        """ Tests a single probe goes through after the timeout and closes or reopens the breaker. """
+        self._open()
+        self.breaker.opened_at -= 60
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, breakers.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, breakers.OPEN)
+
+        self.breaker.opened_at -= 60
+        self.assertEqual(self.breaker.call(int, '1'), 1)
+        self.assertEqual(self.breaker.state, breakers.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(ACCOUNTS_BREAKER_MIN_CALLS=1, ACCOUNTS_BREAKER_FAILURE_RATE=1,
+                   ACCOUNT_EMAIL_SUBJECT_PREFIX='[example.com] ')
+class MailBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        breakers.reset()
+        self.breaker = breakers.get_breaker('mail')
+        self.assertRaises(IOError, self.breaker.call, fail)
+        self.context = {'password_reset_url': 'http://testserver/reset/', 'user': None}
+
+    def tearDown(self):
+        breakers.reset()
+
+    def test_send_mail_queued(self):
+        """ Tests send_mail queues the message while the mail breaker is open. """
+        with mock.patch('django_accounts.mail.mail_queue') as mail_queue:
+            get_adapter().send_mail('account/email/password_reset_key', 'john.smith@example.com', self.context)
+        msg = mail_queue.put.call_args[0][0]
+        self.assertEqual(msg.to, ['john.smith@example.com'])
+
+    @override_settings(ACCOUNTS_MAIL_QUEUE_ENABLED=False)
+    def test_send_mail_no_queue(self):
+        """ Tests send_mail fails fast when there is no queue to fall back to. """
+        self.assertRaises(breakers.CircuitOpenError, get_adapter().send_mail,
+                          'account/email/password_reset_key', 'john.smith@example.com', self.context)
+
+    def test_asend_mail_queued(self):
+        """ Tests asend_mail goes through the breaker too. """
+        with mock.patch('django_accounts.mail.mail_queue') as queue:
+            future = get_adapter().asend_mail('account/email/password_reset_key', 'john.smith@example.com',
+                                              self.context)
+            future.result(timeout=5)
+        self.assertEqual(queue.put.call_args[0][0].to, ['john.smith@example.com'])
+
+    @override_settings(ACCOUNTS_MAIL_QUEUE_ENABLED=False)
+    def test_put_inline(self):
+        """ Tests the mail queue sending inline goes through the breaker. """
+        msg = mail.EmailMessage('Subject', 'Body', to=['john.smith@example.com'])
+        self.assertRaises(breakers.CircuitOpenError, mail_queue.put, msg)
+
+    def test_deliver_waits(self):
+        """ Tests the queue worker waits for the breaker and delivers as the probe. """
+        msg = mail.EmailMessage('Subject', 'Body', to=['john.smith@example.com'])
+
+        def sleep(seconds):
+            self.breaker.opened_at -= seconds
+        with mock.patch('django_accounts.mail.time.sleep', side_effect=sleep) as slept:
+            deliver(msg)
+        self.assertTrue(slept.called)
+        self.assertEqual(mail.outbox[-1].to, ['john.smith@example.com'])
+        self.assertEqual(self.breaker.state, breakers.CLOSED)
+
+
+@override_settings(ACCOUNTS_BREAKER_MIN_CALLS=2, ACCOUNTS_SOCIAL_HTTP_RETRIES=0)
+class ProviderBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        breakers.reset()
+        clear_sessions()
+
+    def tearDown(self):
+        breakers.reset()
+        clear_sessions()
+
+    def test_fail_fast(self):
+        """ Tests provider calls fail fast once the provider breaker is open. """
+        with provider_session('fake'):
+            for _ in range(2):
+                self.assertRaises(requests.ConnectionError, requests.get, UNREACHABLE_URL)
+            with mock.patch('requests.adapters.HTTPAdapter.send') as send:
+                self.assertRaises(ProviderUnavailable, requests.get, UNREACHABLE_URL)
+            self.assertFalse(send.called)
+        self.assertEqual(breakers.get_breaker('provider:fake').state, breakers.OPEN)
+        self.assertEqual(breakers.get_breaker('provider:other').state, breakers.CLOSED)
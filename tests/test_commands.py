@@ -0,0 +1,117 @@
+"""
+    tests.test_commands
+    ===================
+
+    Tests the management commands of django_accounts
+
+"""
+from datetime import timedelta
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import now
+
+from allauth.account.models import EmailAddress, EmailConfirmation
+from rest_framework.authtoken.models import Token
+
+from django_accounts.management.commands import generate_users, purge_accounts
+
+
+class PurgeAccountsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'jtarball',
+            'jtarball@example.com',
+            'password12'
+        )
+        self.email_address = EmailAddress.objects.get(user=self.user)
+
+    def _create_confirmation(self, sent):
+        confirmation = EmailConfirmation.create(self.email_address)
+        confirmation.sent = sent
+        confirmation.save()
+        return confirmation
+
+    def _purge(self, *args):
+        out = StringIO()
+        call_command('purge_accounts', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_purge_expired_confirmations(self):
+        """ Tests only expired confirmations are deleted, in chunks. """
+        for _ in range(5):
+            self._create_confirmation(now() - timedelta(days=30))
+        valid = self._create_confirmation(now())
+
+        out = self._purge('--batch-size', '2', '--sleep', '0')
+        self.assertEqual(list(EmailConfirmation.objects.all()), [valid])
+        self.assertIn('Deleted 5 expired e-mail confirmations', out)
+
+    def test_purge_counts_deleted_rows(self):
+        """ Tests a confirmation sent again after its chunk was read is kept and not counted. """
+        expired = [self._create_confirmation(now() - timedelta(days=30)) for _ in range(3)]
+
+        def resend(model, **hints):
+            EmailConfirmation.objects.filter(pk=expired[1].pk).update(sent=now())
+            return 'default'
+
+        with mock.patch.object(purge_accounts, 'router') as router:
+            router.db_for_write.side_effect = resend
+            out = self._purge('--sleep', '0', '--skip-sessions', '--skip-tokens')
+        self.assertEqual(list(EmailConfirmation.objects.all()), [expired[1]])
+        self.assertIn('Deleted 2 expired e-mail confirmations', out)
+
+    def test_purge_inactive_tokens(self):
+        """ Tests tokens of inactive users are only deleted when asked. """
+        inactive = get_user_model().objects.create_user(
+            'inactive',
+            'inactive@example.com',
+            'password12'
+        )
+        get_user_model().objects.filter(pk=inactive.pk).update(is_active=False)
+
+        self._purge('--sleep', '0')
+        self.assertEqual(Token.objects.count(), 2)
+
+        out = self._purge('--sleep', '0', '--inactive-tokens')
+        self.assertEqual(list(Token.objects.values_list('user', flat=True)), [self.user.pk])
+        self.assertIn('Deleted 1 orphaned tokens', out)
+
+    def test_purge_expired_sessions(self):
+        """ Tests only expired sessions are deleted. """
+        Session.objects.create(session_key='expired', session_data='', expire_date=now() - timedelta(days=1))
+        Session.objects.create(session_key='valid', session_data='', expire_date=now() + timedelta(days=1))
+
+        out = self._purge('--sleep', '0')
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['valid'])
+        self.assertIn('Deleted 1 expired sessions', out)
+        self.assertIn('rows/s', out)
+
+
+class GenerateUsersTests(TestCase):
+
+    def test_generate_users(self):
+        """ Tests users are created with their e-mail address, token and usable password. """
+        out = StringIO()
+        call_command('generate_users', '25', '--prefix', 'bench', '--batch-size', '10', stdout=out)
+        users = get_user_model().objects.filter(username__startswith='bench')
+        self.assertEqual(users.count(), 25)
+        self.assertEqual(EmailAddress.objects.filter(user__in=users, verified=True, primary=True).count(), 25)
+        self.assertEqual(Token.objects.filter(user__in=users).count(), 25)
+        user = users.get(username='bench24')
+        self.assertEqual(user.email, 'bench24@example.com')
+        self.assertTrue(user.check_password('password12'))
+        self.assertIn('Created 25 users', out.getvalue())
+
+    def test_generate_users_lookup_chunks(self):
+        """ Tests the ids of a batch are looked up in chunks (SQLite allows 999 query parameters). """
+        with mock.patch.object(generate_users, 'LOOKUP_CHUNK_SIZE', 4):
+            call_command('generate_users', '10', '--prefix', 'bench', '--batch-size', '10', stdout=StringIO())
+        self.assertEqual(EmailAddress.objects.filter(user__username__startswith='bench').count(), 10)
+        self.assertEqual(Token.objects.filter(user__username__startswith='bench').count(), 10)
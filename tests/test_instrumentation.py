@@ -0,0 +1,87 @@
+"""
+    tests.test_instrumentation
+    ==========================
+
+    Tests the timing of the account adapter methods
+
+"""
+import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from django_accounts import instrumentation, metrics
+from django_accounts.adapter import DefaultAccountAdapter
+
+
+class CustomAdapter(DefaultAccountAdapter):
+
+    def clean_username(self, username, shallow=False):
+        return super(CustomAdapter, self).clean_username(username.strip(), shallow)
+
+
+def get_counter(name, method):
+    return metrics.snapshot()['counters'].get((name, (('method', method),)), 0)
+
+
+def get_count(method):
+    entry = metrics.snapshot()['histograms'].get((instrumentation.ADAPTER_DURATION, (('method', method),)))
+    return sum(entry[:-1]) if entry else 0
+
+
+class AdapterTimingTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        instrumentation.disable()
+        get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+
+    def tearDown(self):
+        metrics.reset()
+        instrumentation.disable()
+
+    def test_off_by_default(self):
+        """ Tests nothing is recorded when timing is off. """
+        DefaultAccountAdapter().clean_username('jane.doe')
+        self.assertEqual(get_count('clean_username'), 0)
+
+    @override_settings(ACCOUNTS_ADAPTER_TIMING=True)
+    def test_queries_attributed(self):
+        """ Tests a timed method records its duration and database queries. """
+        DefaultAccountAdapter().clean_username('jane.doe')
+        self.assertEqual(get_count('clean_username'), 1)
+        self.assertEqual(get_counter(instrumentation.ADAPTER_QUERIES, 'clean_username'), 1)
+
+    @override_settings(ACCOUNTS_ADAPTER_TIMING=True)
+    def test_subclass_timed_once(self):
+        """ Tests an override calling super() is timed once. """
+        CustomAdapter().clean_username(' jane.doe ')
+        self.assertEqual(get_count('clean_username'), 1)
+
+    @override_settings(ACCOUNTS_ADAPTER_TIMING=True, ACCOUNTS_ADAPTER_SLOW_THRESHOLDS={'clean_username': 0})
+    def test_slow_call_logged(self):
+        """ Tests a call above its threshold is logged. """
+        with mock.patch.object(instrumentation.logger, 'warning') as warning:
+            DefaultAccountAdapter().clean_username('jane.doe')
+            DefaultAccountAdapter().clean_email('jane.doe@example.com')
+        self.assertEqual(warning.call_count, 1)
+        self.assertEqual(warning.call_args[0][1], 'clean_username')
+
+    def test_runtime_switch(self):
+        """ Tests the management command turns timing on and off without a settings change. """
+        call_command('adapter_timing', 'on', stdout=StringIO())
+        DefaultAccountAdapter().clean_username('jane.doe')
+        call_command('adapter_timing', 'off', stdout=StringIO())
+        DefaultAccountAdapter().clean_username('jane.doe')
+        self.assertEqual(get_count('clean_username'), 1)
+
+    def test_span(self):
+        """ Tests a span counts the queries of its block. """
+        with instrumentation.span('test') as span:
+            get_user_model().objects.count()
+            get_user_model().objects.count()
+        self.assertEqual(span.queries, 2)
+        self.assertGreaterEqual(span.duration, span.query_time)
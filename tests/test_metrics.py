@@ -0,0 +1,140 @@
+"""
+    tests.test_metrics
+    ==================
+
+    Tests the counters and latency histograms of the accounts endpoints
+
+"""
+import os
+import threading
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from django_accounts import metrics
+
+REQUESTS = metrics.REQUESTS
+REQUEST_DURATION = metrics.REQUEST_DURATION
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_counters_merged_across_threads(self):
+        """ Tests each thread records in its own shard and snapshot() adds them up. """
+        def record():
+            for i in range(100):
+                metrics.inc('test_total', view='login')
+        threads = [threading.Thread(target=record) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics.inc('test_total', view='login')
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters[('test_total', (('view', 'login'),))], 401)
+
+    def test_histogram(self):
+        """ Tests observations land in their bucket and render cumulated. """
+        metrics.observe(REQUEST_DURATION, 0.003, view='login', outcome='success')
+        metrics.observe(REQUEST_DURATION, 0.2, view='login', outcome='success')
+        metrics.observe(REQUEST_DURATION, 30, view='login', outcome='success')
+        text = metrics.render(metrics.snapshot())
+        labels = 'outcome="success",view="login"'
+        self.assertIn('# TYPE %s histogram' % REQUEST_DURATION, text)
+        self.assertIn('%s_bucket{%s,le="0.005"} 1\n' % (REQUEST_DURATION, labels), text)
+        self.assertIn('%s_bucket{%s,le="0.25"} 2\n' % (REQUEST_DURATION, labels), text)
+        self.assertIn('%s_bucket{%s,le="+Inf"} 3\n' % (REQUEST_DURATION, labels), text)
+        self.assertIn('%s_count{%s} 3\n' % (REQUEST_DURATION, labels), text)
+
+    @override_settings(ACCOUNTS_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """ Tests nothing is recorded when disabled. """
+        metrics.inc(REQUESTS, view='login', outcome='success')
+        self.assertEqual(metrics.snapshot()['counters'], {})
+
+    def test_outcome(self):
+        """ Tests responses are classified by status and error message. """
+        self.assertEqual(metrics.get_outcome(Response(status=200)), 'success')
+        self.assertEqual(metrics.get_outcome(Response(status=429)), 'throttled')
+        self.assertEqual(metrics.get_outcome(Response(status=503)), 'error')
+        self.assertEqual(metrics.get_outcome(Response({'email': ['This field is required.']}, status=400)),
+                         'invalid')
+        self.assertEqual(metrics.get_outcome(
+            Response({'non_field_errors': ['E-mail is not verified.']}, status=400)), 'unverified')
+
+    def test_collect_from_cache(self):
+        """ Tests the processes publishing to the cache are added up. """
+        metrics.inc(REQUESTS, view='login', outcome='success')
+        other = {'counters': {(REQUESTS, (('outcome', 'success'), ('view', 'login'))): 2}, 'histograms': {}}
+        cache.set('accounts/metrics@otherhost:1', other)
+        cache.set(metrics.INDEX_CACHE_KEY, ['otherhost:1', 'gone:2'])
+        counters = metrics.collect()['counters']
+        self.assertEqual(counters[(REQUESTS, (('outcome', 'success'), ('view', 'login')))], 3)
+        self.assertNotIn('gone:2', cache.get(metrics.INDEX_CACHE_KEY))
+        cache.delete('accounts/metrics@otherhost:1')
+
+    def test_forked_process(self):
+        """ Tests a process forked after recording publishes under its own id, without the parent's metrics. """
+        metrics.inc(REQUESTS, view='login', outcome='success')
+        parent = metrics.get_process_id()
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            child = metrics.get_process_id()
+            self.assertNotEqual(child, parent)
+            self.assertEqual(metrics.snapshot()['counters'], {})
+            metrics.inc(REQUESTS, view='login', outcome='success')
+            metrics.flush()
+            self.assertIn(child, cache.get(metrics.INDEX_CACHE_KEY))
+            self.assertEqual(len(cache.get('accounts/metrics@%s' % child)['counters']), 1)
+        cache.delete('accounts/metrics@%s' % child)
+
+
+@override_settings(ACCOUNTS_METRICS_TOKEN='s3cret')
+class MetricsViewTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_login_recorded(self):
+        """ Tests a failed login is counted as bad credentials and timed. """
+        self.client.post(reverse('accounts:rest_login'), {'username': 'john.smith', 'password': 'wrong'})
+        text = metrics.render(metrics.snapshot())
+        self.assertIn('%s{outcome="bad_credentials",view="login"} 1\n' % REQUESTS, text)
+        self.assertIn('%s_count{outcome="bad_credentials",view="login"} 1\n' % REQUEST_DURATION, text)
+
+    def test_endpoint(self):
+        """ Tests the endpoint needs the token or a staff user. """
+        url = reverse('accounts:accounts_metrics')
+        metrics.inc(REQUESTS, view='login', outcome='success')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'%s{outcome="success",view="login"} 1\n' % REQUESTS.encode('utf8'), response.content)
+
+    def test_command(self):
+        """ Tests the management command prints the metrics. """
+        metrics.inc(REQUESTS, view='register', outcome='success')
+        out = StringIO()
+        call_command('accounts_metrics', stdout=out)
+        self.assertIn('%s{outcome="success",view="register"} 1\n' % REQUESTS, out.getvalue())
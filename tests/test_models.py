@@ -0,0 +1,91 @@
+"""
+    tests.test_models
+    =================
+
+    Tests the hot AccountsUser queries are served by the indexes of the
+    django_accounts migrations
+
+"""
+from datetime import timedelta
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.sql.compiler import SQLCompiler
+from django.test import TestCase
+from django.utils.timezone import now
+
+from django_accounts.utils import email_address_exists
+
+
+class AccountsUserIndexTests(TestCase):
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('Query plans are only checked on SQLite and PostgreSQL')
+        self.users = get_user_model().objects.all()
+
+    def explain(self, queryset):
+        return self.explain_sql(*queryset.query.sql_with_params())
+
+    def explain_sql(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            # The test table is tiny, make the planner prove it can use an index
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.explain(queryset)
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_email_address_exists(self):
+        """ Tests the case insensitive queries of email_address_exists use an index. """
+        executed = []
+        as_sql = SQLCompiler.as_sql
+
+        def record(compiler, *args, **kwargs):
+            sql, params = as_sql(compiler, *args, **kwargs)
+            executed.append((sql, params))
+            return sql, params
+        with mock.patch.object(SQLCompiler, 'as_sql', record):
+            self.assertFalse(email_address_exists('John.Smith@example.com'))
+        if connection.vendor == 'postgresql':
+            indexes = ('account_emailaddress_email_upper', 'django_accounts_accountsuser_email_upper_like')
+        else:
+            indexes = ('account_emailaddress_email_nocase', 'django_accounts_accountsuser_email_nocase')
+        # EmailAddress then AccountsUser
+        self.assertEqual(len(executed), 2)
+        for (sql, params), index in zip(executed, indexes):
+            self.assertIn(index, self.explain_sql(sql, params))
+
+    def test_admin_ordering(self):
+        """ Tests the admin changelist ordering. """
+        self.assertUsesIndex(self.users.order_by('email')[:100],
+                             'django_accounts_accountsuser_email_idx')
+
+    def test_newest_signups(self):
+        """ Tests listing the newest signups. """
+        self.assertUsesIndex(self.users.order_by('-date_joined')[:100],
+                             'django_accounts_accountsuser_date_joined_idx')
+
+    def test_dormant_accounts(self):
+        """ Tests finding active users that have not logged in for a year. """
+        dormant = self.users.filter(is_active=True, last_login__lt=now() - timedelta(days=365))
+        if connection.vendor == 'postgresql':
+            self.assertUsesIndex(dormant, 'django_accounts_accountsuser_last_login_active')
+        else:
+            self.assertUsesIndex(dormant, 'django_accounts_accountsuser_active_last_login')
+
+    def test_inactive_accounts(self):
+        """ Tests listing the inactive users. """
+        inactive = self.users.filter(is_active=False)
+        if connection.vendor == 'postgresql':
+            self.assertUsesIndex(inactive, 'django_accounts_accountsuser_inactive')
+        else:
+            self.assertUsesIndex(inactive, 'django_accounts_accountsuser_active_last_login')
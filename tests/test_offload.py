@@ -0,0 +1,121 @@
+"""
+    tests.test_offload
+    ==================
+
+    Tests the adapter hooks running their blocking part in the offload pool
+
+"""
+import threading
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from django_accounts import offload, routers
+from django_accounts.adapter import DefaultAccountAdapter, get_adapter
+
+
+class SignupForm(forms.Form):
+    username = forms.CharField()
+    email = forms.EmailField()
+    password1 = forms.CharField()
+
+
+class FutureTests(SimpleTestCase):
+
+    def test_result(self):
+        """ Tests the call runs in a pool thread and its result comes back. """
+        future = offload.pool.submit(lambda: threading.current_thread().name)
+        self.assertTrue(future.result(timeout=5).startswith('accounts-offload-'))
+        self.assertTrue(future.done())
+
+    def test_exception(self):
+        """ Tests the exception of the call is raised by result(). """
+        future = offload.pool.submit(int, 'x')
+        self.assertRaises(ValueError, future.result, 5)
+
+    def test_then(self):
+        """ Tests a chained function runs in the thread collecting the result. """
+        future = offload.pool.submit(lambda: 1).then(lambda value: (value + 1, threading.current_thread().name))
+        self.assertEqual(future.result(timeout=5), (2, threading.current_thread().name))
+
+    def test_timeout(self):
+        """ Tests result() gives up after the timeout. """
+        event = threading.Event()
+        future = offload.pool.submit(event.wait)
+        self.assertRaises(offload.TimeoutError, future.result, 0.01)
+        event.set()
+        future.result(timeout=5)
+
+    def test_pinning(self):
+        """ Tests the replica pinning of the caller carries over to the pool. """
+        with routers.use_primary():
+            future = offload.pool.submit(routers.is_pinned)
+        self.assertTrue(future.result(timeout=5))
+        self.assertFalse(offload.pool.submit(routers.is_pinned).result(timeout=5))
+
+    @override_settings(ACCOUNTS_OFFLOAD_WORKERS=0)
+    def test_inline(self):
+        """ Tests the call runs inline without workers. """
+        future = offload.pool.submit(threading.current_thread)
+        self.assertTrue(future.done())
+        self.assertIs(future.result(), threading.current_thread())
+
+
+class AuditedAdapter(DefaultAccountAdapter):
+
+    def authenticate(self, request, **credentials):
+        user = super(AuditedAdapter, self).authenticate(request, **credentials)
+        self.audited = (credentials['username'], threading.current_thread().name)
+        return user
+
+
+# The pool threads have their own connections, the users they look up must be
+# committed (the test database is a file, see tests.settings)
+class AdapterOffloadTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.adapter = get_adapter()
+        self.request = RequestFactory().post('/')
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+
+    def test_aauthenticate(self):
+        """ Tests aauthenticate checks the credentials in the pool. """
+        future = self.adapter.aauthenticate(self.request, username='john.smith', password='password12')
+        self.assertEqual(future.result(timeout=5), self.user)
+        future = self.adapter.aauthenticate(self.request, username='john.smith', password='wrong')
+        self.assertIsNone(future.result(timeout=5))
+
+    @override_settings(ACCOUNT_LOGIN_ATTEMPTS_LIMIT=1)
+    def test_aauthenticate_attempts(self):
+        """ Tests failed attempts are recorded and checked as with authenticate. """
+        self.adapter.aauthenticate(self.request, username='john.smith', password='wrong').result(timeout=5)
+        self.assertRaises(forms.ValidationError, self.adapter.aauthenticate, self.request,
+                          username='john.smith', password='password12')
+
+    def test_aauthenticate_override(self):
+        """ Tests aauthenticate goes through the authenticate method of the adapter. """
+        adapter = AuditedAdapter()
+        self.assertEqual(adapter.aauthenticate(self.request, username='john.smith', password='password12')
+                         .result(timeout=5), self.user)
+        self.assertEqual(adapter.audited[0], 'john.smith')
+        self.assertTrue(adapter.audited[1].startswith('accounts-offload-'))
+
+    def test_asave_user(self):
+        """ Tests asave_user hashes the password in the pool and saves the user. """
+        form = SignupForm({'username': 'jane.doe', 'email': 'jane.doe@example.com', 'password1': 'password12'})
+        self.assertTrue(form.is_valid())
+        future = self.adapter.asave_user(self.request, get_user_model()(), form)
+        user = future.result(timeout=5)
+        self.assertTrue(get_user_model().objects.get(pk=user.pk).check_password('password12'))
+
+    def test_asend_mail(self):
+        """ Tests asend_mail delivers the rendered message from the pool. """
+        context = {'user': self.user, 'password_reset_url': 'http://testserver/reset/', 'request': self.request}
+        future = self.adapter.asend_mail('account/email/password_reset_key', 'john.smith@example.com', context)
+        self.assertEqual(future.result(timeout=5), 1)
+        self.assertEqual(mail.outbox[-1].to, ['john.smith@example.com'])
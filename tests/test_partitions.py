@@ -0,0 +1,169 @@
+"""
+    tests.test_partitions
+    =====================
+
+    Tests the users partitioned across two SQLite databases
+
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from allauth.account.models import EmailAddress
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from django_accounts import partitions
+from django_accounts.adapter import DefaultAccountAdapter
+from django_accounts.models import UserDirectory, UserDirectoryEmail
+from django_accounts.utils import email_address_exists
+
+PARTITIONS = ['default', 'replica']
+
+# Boots a project with the partitions in its settings and migrates the users
+# partition then the directory, both SQLite files in the directory argv[1]
+SETUP_SCRIPT = """
+import os, sys
+from django.conf import settings
+from tests import settings as test_settings
+settings.configure(
+    default_settings=test_settings,
+    DATABASES=dict((alias, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(sys.argv[1], alias)})
+                   for alias in ('default', 'users1')),
+    DATABASE_ROUTERS=['django_accounts.partitions.PartitionRouter'],
+    ACCOUNTS_PARTITION_DATABASES=['users1'],
+)
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connections
+for alias in ('users1', 'default'):
+    call_command('migrate', database=alias, verbosity=0)
+    cursor = connections[alias].cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'django_accounts_accountsuser'")
+    print('%s %d' % (alias, len(cursor.fetchall())))
+"""
+
+
+def get_username(partition, prefix='user'):
+    """ Returns a username placed on the partition. """
+    for i in range(100):
+        username = '%s%s' % (prefix, i)
+        if partitions.get_partition_for_username(username) == partition:
+            return username
+
+
+@override_settings(DATABASE_ROUTERS=['django_accounts.partitions.PartitionRouter'],
+                   ACCOUNTS_PARTITION_DATABASES=PARTITIONS)
+class PartitionTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        partitions.connect_receivers()
+        self.users = {}
+        for partition in PARTITIONS:
+            username = get_username(partition)
+            self.users[partition] = get_user_model().objects.create_user(
+                username, '%s@example.com' % username, 'password12'
+            )
+        self.user = self.users['replica']
+
+    def tearDown(self):
+        partitions.disconnect_receivers()
+
+    def test_users_placed_by_hash(self):
+        """ Tests each user and its token and e-mail address live on its partition only. """
+        for partition, user in self.users.items():
+            other = [p for p in PARTITIONS if p != partition][0]
+            self.assertEqual(user._state.db, partition)
+            for model in (get_user_model(), Token, EmailAddress):
+                lookup = {'pk': user.pk} if model is get_user_model() else {'user_id': user.pk}
+                self.assertTrue(model.objects.using(partition).filter(**lookup).exists())
+                self.assertFalse(model.objects.using(other).filter(**lookup).exists())
+
+    def test_directory(self):
+        """ Tests the directory hands out unique user ids and maps username, e-mail and token. """
+        self.assertNotEqual(self.users['default'].pk, self.users['replica'].pk)
+        entry = UserDirectory.objects.get(pk=self.user.pk)
+        self.assertEqual(entry.partition, 'replica')
+        self.assertEqual(entry.username, self.user.username)
+        self.assertEqual(entry.email, self.user.email)
+        self.assertEqual(entry.token, Token.objects.using('replica').get(user_id=self.user.pk).key)
+
+    def test_login_one_partition(self):
+        """ Tests login only touches the directory and the user's partition. """
+        backend = partitions.PartitionedAuthenticationBackend()
+        for login in (self.user.username.upper(), self.user.email):
+            with self.assertNumQueries(1, using='default'):
+                user = backend.authenticate(username=login, password='password12')
+            self.assertEqual(user, self.user)
+        self.assertIsNone(backend.authenticate(username='nobody', password='password12'))
+        with self.assertNumQueries(1, using='default'):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+    def test_token_auth_one_partition(self):
+        """ Tests token authentication only touches the directory and the user's partition. """
+        token = Token.objects.using('replica').get(user_id=self.user.pk)
+        authentication = partitions.PartitionedTokenAuthentication()
+        with self.assertNumQueries(1, using='default'):
+            with self.assertNumQueries(1, using='replica'):
+                user, auth_token = authentication.authenticate_credentials(token.key)
+        self.assertEqual(user, self.user)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            authentication.authenticate_credentials('nope')
+
+    def test_signup_uniqueness_in_directory(self):
+        """ Tests username and e-mail uniqueness are checked in the directory only. """
+        adapter = DefaultAccountAdapter()
+        with self.assertNumQueries(0, using='replica'):
+            with self.assertNumQueries(2, using='default'):
+                with self.assertRaises(forms.ValidationError):
+                    adapter.clean_username(self.user.username.upper())
+                self.assertTrue(email_address_exists(self.user.email.upper()))
+        self.assertEqual(adapter.clean_username('someone'), 'someone')
+        self.assertFalse(email_address_exists('someone@example.com'))
+        self.assertFalse(email_address_exists(self.user.email, exclude_user=self.user))
+
+    def test_secondary_email_in_directory(self):
+        """ Tests the other e-mail addresses of a user are unique across partitions too. """
+        address = EmailAddress.objects.create(user=self.users['default'], email='Second@example.com')
+        self.assertEqual(address._state.db, 'default')
+        with self.assertNumQueries(0, using='replica'):
+            self.assertTrue(email_address_exists('second@example.com'))
+        self.assertFalse(email_address_exists('second@example.com', exclude_user=self.users['default']))
+        self.assertEqual(partitions.partition_for_login('SECOND@example.com'), 'default')
+        address.delete()
+        self.assertFalse(email_address_exists('second@example.com'))
+
+    def test_directory_kept_in_sync(self):
+        """ Tests token and user deletes are reflected in the directory. """
+        Token.objects.using('replica').filter(user_id=self.user.pk).delete()
+        self.assertIsNone(UserDirectory.objects.get(pk=self.user.pk).token)
+        self.user.delete()
+        self.assertFalse(UserDirectory.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(UserDirectoryEmail.objects.filter(entry_id=self.user.pk).exists())
+
+
+class PartitionSetupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_partitions_in_settings(self):
+        """ Tests a project with the partitions in its settings starts and migrates each database. """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, '-c', SETUP_SCRIPT, self.directory], cwd=root)
+        counts = dict(line.split() for line in output.decode('utf8').splitlines())
+        # The user table and its indexes live on the partition only
+        self.assertEqual(counts['default'], '0')
+        self.assertNotEqual(counts['users1'], '0')
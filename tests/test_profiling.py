@@ -0,0 +1,105 @@
+"""
+    tests.test_profiling
+    ====================
+
+    Tests the on demand profiling of the accounts requests
+
+"""
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from allauth.account.models import EmailAddress
+
+from django_accounts import profiling
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + ['django_accounts.middleware.ProfilingMiddleware'],
+            ACCOUNTS_PROFILE_DIR=self.directory,
+        )
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        self.staff = get_user_model().objects.create_user('jane.doe', 'jane.doe@example.com', 'password12')
+        self.staff.is_staff = True
+        self.staff.save()
+        EmailAddress.objects.update(verified=True)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_staff(self):
+        """ Tests a staff user gets the request profiled with its queries. """
+        self.client.login(username='jane.doe', password='password12')
+        response = self.client.get(reverse('accounts:rest_user_details'), {'profile': 1})
+        profile_id = response[profiling.RESPONSE_HEADER]
+        data = self.client.get(reverse('accounts:accounts_profile', args=[profile_id])).data
+        self.assertEqual((data['view'], data['method'], data['status']), ('accounts:rest_user_details', 'GET', 200))
+        self.assertEqual(data['query_count'], len(data['queries']))
+        self.assertIn('rest_framework', data['summary'])
+        profiles = self.client.get(reverse('accounts:accounts_profiles')).data
+        self.assertEqual([p['id'] for p in profiles], [profile_id])
+
+        response = self.client.get(reverse('accounts:accounts_profile_download', args=[profile_id]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="%s.prof"' % profile_id)
+        pstats.Stats(os.path.join(self.directory, '%s.prof' % profile_id))
+
+        response = self.client.get(reverse('accounts:rest_user_details'), {'profile': 0})
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+
+    def test_not_allowed(self):
+        """ Tests other users can't profile or read the profiles. """
+        self.client.login(username='john.smith', password='password12')
+        response = self.client.get(reverse('accounts:rest_user_details'), HTTP_X_ACCOUNTS_PROFILE='1')
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        response = self.client.get(reverse('accounts:rest_user_details'), HTTP_X_ACCOUNTS_PROFILE='profile:bad')
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.client.get(reverse('accounts:accounts_profiles')).status_code, 403)
+
+    def test_token(self):
+        """ Tests a token from the profile_token command allows profiling. """
+        out = StringIO()
+        call_command('profile_token', stdout=out)
+        token = out.getvalue().strip()
+        response = self.client.post(reverse('accounts:rest_login'),
+                                    {'username': 'john.smith', 'password': 'password12'},
+                                    HTTP_X_ACCOUNTS_PROFILE=token)
+        profile_id = response[profiling.RESPONSE_HEADER]
+        self.client.logout()
+        response = self.client.get(reverse('accounts:accounts_profile', args=[profile_id]),
+                                   HTTP_X_ACCOUNTS_PROFILE=token)
+        self.assertEqual(response.data['view'], 'accounts:rest_login')
+        queries = ' '.join(query['sql'] for query in response.data['queries'])
+        self.assertIn('WHERE', queries)
+        self.assertNotIn('john.smith', queries)
+        self.assertNotIn(get_user_model().objects.get(username='john.smith').password, queries)
+
+        with override_settings(ACCOUNTS_PROFILE_TOKEN_MAX_AGE=-1):
+            response = self.client.post(reverse('accounts:rest_login'),
+                                        {'username': 'john.smith', 'password': 'password12'},
+                                        HTTP_X_ACCOUNTS_PROFILE=token)
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+
+    @override_settings(ACCOUNTS_PROFILE_KEEP=2)
+    def test_prune(self):
+        """ Tests only the last ACCOUNTS_PROFILE_KEEP profiles are kept. """
+        self.client.login(username='jane.doe', password='password12')
+        for _ in range(3):
+            self.client.get(reverse('accounts:rest_user_details'), {'profile': 1})
+        self.assertEqual(len(profiling.list_profiles()), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
@@ -0,0 +1,142 @@
+"""
+    tests.test_query_budgets
+    ========================
+
+    Records the queries made by each accounts endpoint and fails when they
+    change. The budgets live in tests/query_budgets.json, after an
+    intentional change update them with
+
+    ACCOUNTS_UPDATE_QUERY_BUDGETS=1 py.test tests/test_query_budgets.py
+
+    and review the diff of the file.
+
+"""
+import difflib
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from allauth.account.models import EmailAddress, EmailConfirmationHMAC
+from rest_framework.test import APIClient
+
+from django_accounts import profiling
+from django_accounts.tokens import get_token_generator
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+UPDATE_BUDGETS = bool(os.environ.get('ACCOUNTS_UPDATE_QUERY_BUDGETS'))
+
+normalize = profiling.normalize_sql
+
+
+def load_budgets():
+    if not os.path.exists(BUDGETS_FILE):
+        return {}
+    with open(BUDGETS_FILE) as budgets_file:
+        return json.load(budgets_file)
+
+
+@override_settings(ACCOUNTS_MAIL_QUEUE_ENABLED=False)
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(QueryBudgetTests, cls).setUpClass()
+        cls.budgets = load_budgets()
+        cls.recorded = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if UPDATE_BUDGETS:
+            budgets = load_budgets()
+            budgets.update(cls.recorded)
+            with open(BUDGETS_FILE, 'w') as budgets_file:
+                json.dump(budgets, budgets_file, indent=2, sort_keys=True, separators=(',', ': '))
+                budgets_file.write('\n')
+        super(QueryBudgetTests, cls).tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        EmailAddress.objects.filter(user=self.user).update(verified=True)
+
+    def authenticate(self):
+        self.client.login(username='john.smith', password='password12')
+
+    def assertQueryBudget(self, name, method, url, data=None, status_code=200):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status_code, response.content)
+        queries = [normalize(query['sql']) for query in context.captured_queries]
+        self.recorded[name] = {'count': len(queries), 'queries': queries}
+        if UPDATE_BUDGETS:
+            return
+        budget = self.budgets.get(name)
+        self.assertIsNotNone(budget, "No query budget for %s, record it with ACCOUNTS_UPDATE_QUERY_BUDGETS=1" % name)
+        if queries != budget['queries']:
+            diff = '\n'.join(difflib.unified_diff(budget['queries'], queries, 'budget', 'now', lineterm=''))
+            self.fail("%s made %d queries, its budget is %d. If intentional update the budgets with "
+                      "ACCOUNTS_UPDATE_QUERY_BUDGETS=1.\n%s" % (name, len(queries), budget['count'], diff))
+
+    def test_login(self):
+        self.assertQueryBudget('login', 'post', reverse('accounts:rest_login'),
+                               {'username': 'john.smith', 'password': 'password12'})
+
+    def test_login_bad_credentials(self):
+        self.assertQueryBudget('login_bad_credentials', 'post', reverse('accounts:rest_login'),
+                               {'username': 'john.smith', 'password': 'wrong'}, status_code=400)
+
+    def test_logout(self):
+        self.authenticate()
+        self.assertQueryBudget('logout', 'post', reverse('accounts:rest_logout'))
+
+    def test_user_details(self):
+        self.authenticate()
+        self.assertQueryBudget('user_details', 'get', reverse('accounts:rest_user_details'))
+
+    def test_user_details_update(self):
+        self.authenticate()
+        self.assertQueryBudget('user_details_update', 'patch', reverse('accounts:rest_user_details'),
+                               {'first_name': 'John'})
+
+    def test_password_change(self):
+        self.authenticate()
+        self.assertQueryBudget('password_change', 'post', reverse('accounts:rest_password_change'),
+                               {'password1': 'password34', 'password2': 'password34'})
+
+    def test_password_reset(self):
+        self.assertQueryBudget('password_reset', 'post', reverse('accounts:rest_password_reset'),
+                               {'email': 'john.smith@example.com'})
+
+    def test_password_reset_confirm(self):
+        self.assertQueryBudget('password_reset_confirm', 'post', reverse('accounts:rest_password_reset_confirm'), {
+            'uid': self.user.pk,
+            'token': get_token_generator().make_token(self.user),
+            'password1': 'password34',
+            'password2': 'password34',
+        })
+
+    def test_register(self):
+        self.assertQueryBudget('register', 'post', reverse('accounts:rest_register'), {
+            'username': 'jane.doe',
+            'email': 'jane.doe@example.com',
+            'password1': 'password12',
+            'password2': 'password12',
+        }, status_code=201)
+
+    def test_verify_email(self):
+        email_address = EmailAddress.objects.get(user=self.user)
+        EmailAddress.objects.filter(pk=email_address.pk).update(verified=False)
+        key = EmailConfirmationHMAC(email_address).key
+        self.assertQueryBudget('verify_email', 'post', reverse('accounts:rest_verify_email'), {'key': key})
+
+    def test_resend_verify_email(self):
+        EmailAddress.objects.filter(user=self.user).update(verified=False)
+        self.assertQueryBudget('resend_verify_email', 'post', reverse('accounts:rest_resend_verify_email'),
+                               {'email': 'john.smith@example.com'})
@@ -0,0 +1,131 @@
+"""
+    tests.test_routers
+    ==================
+
+    Tests the read replica router and its middleware
+
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from allauth.account.models import EmailAddress, EmailConfirmation
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from django_accounts import routers
+from django_accounts.middleware import ReplicaPinningMiddleware
+
+
+@override_settings(DATABASE_ROUTERS=['django_accounts.routers.ReplicaRouter'],
+                   ACCOUNTS_REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        routers.reset()
+        self.users = get_user_model().objects.all()
+
+    def tearDown(self):
+        routers.reset()
+
+    def test_reads_go_to_replica(self):
+        """ Tests reads of the accounts models are sent to the replica. """
+        self.assertEqual(self.users.db, 'replica')
+        with self.assertNumQueries(1, using='replica'):
+            self.assertFalse(self.users.filter(username='nobody').exists())
+
+    def test_primary_only_models(self):
+        """ Tests tokens, e-mail addresses and confirmations are read from the primary. """
+        self.assertEqual(Token.objects.all().db, 'default')
+        self.assertEqual(EmailAddress.objects.all().db, 'default')
+        self.assertEqual(EmailConfirmation.objects.all().db, 'default')
+
+    def test_token_authentication_primary(self):
+        """ Tests token authentication reads the token and its user from the primary (documented limitation). """
+        user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        key = Token.objects.get(user=user).key
+        routers.reset()
+        with self.assertNumQueries(0, using='replica'):
+            with self.assertNumQueries(1, using='default'):
+                authenticated, token = TokenAuthentication().authenticate_credentials(key)
+        self.assertEqual(authenticated, user)
+
+    def test_other_apps_not_routed(self):
+        """ Tests models of other apps are left to the default routing. """
+        self.assertEqual(Site.objects.all().db, 'default')
+
+    def test_read_your_writes(self):
+        """ Tests reads go to the primary once the thread wrote. """
+        get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        self.assertTrue(routers.has_written())
+        self.assertEqual(self.users.db, 'default')
+        self.assertTrue(self.users.filter(username='john.smith').exists())
+
+    def test_use_primary(self):
+        """ Tests use_primary() pins the reads of the block. """
+        with routers.use_primary():
+            self.assertEqual(self.users.db, 'default')
+        self.assertEqual(self.users.db, 'replica')
+
+    @override_settings(ACCOUNTS_REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        """ Tests everything goes to the primary without replicas. """
+        self.assertEqual(self.users.db, 'default')
+
+    def test_allow_migrate(self):
+        """ Tests the accounts apps are not migrated on the replicas. """
+        router = routers.ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'django_accounts'))
+        self.assertIsNone(router.allow_migrate('default', 'django_accounts'))
+        self.assertIsNone(router.allow_migrate('replica', 'sites'))
+
+
+@override_settings(DATABASE_ROUTERS=['django_accounts.routers.ReplicaRouter'],
+                   ACCOUNTS_REPLICA_DATABASES=['replica'])
+class ReplicaPinningMiddlewareTests(TestCase):
+
+    def setUp(self):
+        routers.reset()
+        self.middleware = ReplicaPinningMiddleware()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        routers.reset()
+
+    def _process(self, request, view=lambda: None):
+        self.middleware.process_request(request)
+        pinned = routers.is_pinned()
+        view()
+        response = self.middleware.process_response(request, HttpResponse())
+        return pinned, response
+
+    def test_safe_request_reads_replica(self):
+        """ Tests a GET may read from the replicas. """
+        pinned, response = self._process(self.factory.get('/accounts/user/'))
+        self.assertFalse(pinned)
+        self.assertNotIn('accounts_primary', response.cookies)
+
+    def test_unsafe_request_pinned(self):
+        """ Tests a POST reads from the primary. """
+        pinned, response = self._process(self.factory.post('/accounts/login/'))
+        self.assertTrue(pinned)
+
+    def test_admin_pinned(self):
+        """ Tests admin requests read from the primary. """
+        pinned, response = self._process(self.factory.get('/admin/django_accounts/accountsuser/'))
+        self.assertTrue(pinned)
+
+    def test_write_pins_client(self):
+        """ Tests the client stays on the primary after a write. """
+        def view():
+            get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        pinned, response = self._process(self.factory.post('/accounts/registration/'), view)
+        self.assertEqual(response.cookies['accounts_primary']['max-age'], 5)
+        self.assertFalse(routers.is_pinned())
+
+        request = self.factory.get('/accounts/user/')
+        request.COOKIES['accounts_primary'] = '1'
+        pinned, response = self._process(request)
+        self.assertTrue(pinned)
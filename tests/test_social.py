@@ -0,0 +1,465 @@
+"""
+    tests.test_social
+    =================
+
+    Tests the social login plumbing against a local fake provider
+
+"""
+import json
+import threading
+import time
+
+import jwt
+import mock
+import requests
+import responses
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+from allauth.account.models import EmailAddress
+from allauth.socialaccount.models import SocialAccount, SocialApp
+from allauth.socialaccount.providers.facebook.provider import GRAPH_API_URL
+from allauth.socialaccount.providers.google.provider import GoogleProvider
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from django_accounts import breakers
+from django_accounts.registration.http import clear_sessions, get_session, provider_session
+from django_accounts.registration.id_token import clear_key_sets
+from django_accounts.registration.serializers import SocialLoginSerializer
+from django_accounts.registration.views import SocialLoginView
+from django_accounts.registration.socialapps import get_social_app
+
+
+class FakeProviderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        self.server.connections += 1
+        BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+
+    def _respond(self, status_code, body='{"id": "1"}', headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body.encode('utf8'))
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.path == '/slow':
+            time.sleep(0.5)
+            self._respond(200)
+        elif self.path == '/flaky' and self.server.requests == 1:
+            self._respond(503, '{}')
+        elif self.path == '/cookie':
+            self._respond(200, headers={'Set-Cookie': 'sessionid=secret; Path=/'})
+        else:
+            self._respond(200, '{"cookie": "%s"}' % self.headers.get('Cookie', ''))
+
+    def do_POST(self):
+        self.server.requests += 1
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self.path == '/slow':
+            time.sleep(0.5)
+        self._respond(200, '{"access_token": "token"}')
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeProvider(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), FakeProviderHandler)
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self.server_address[1]
+
+
+@override_settings(ACCOUNTS_SOCIAL_HTTP_TIMEOUT=(1, 0.2), ACCOUNTS_SOCIAL_HTTP_BACKOFF=0)
+class ProviderSessionTests(SimpleTestCase):
+
+    def setUp(self):
+        clear_sessions()
+        breakers.reset()
+        self.provider = FakeProvider()
+        self.thread = threading.Thread(target=self.provider.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        clear_sessions()
+        self.provider.shutdown()
+        self.provider.server_close()
+
+    def test_connection_reused(self):
+        """ Tests calls to the same provider share one keep-alive connection. """
+        with provider_session('fake'):
+            for _ in range(3):
+                self.assertEqual(requests.get(self.provider.url + '/me').status_code, 200)
+            requests.post(self.provider.url + '/token', data={'code': 'code'})
+        self.assertEqual(self.provider.requests, 4)
+        self.assertEqual(self.provider.connections, 1)
+
+    def test_outside_provider_session_not_pooled(self):
+        """ Tests requests behaves as usual outside of provider_session. """
+        for _ in range(2):
+            requests.get(self.provider.url + '/me')
+        self.assertEqual(self.provider.connections, 2)
+
+    def test_session_per_provider(self):
+        """ Tests each provider has its own shared session. """
+        self.assertIs(get_session('fake'), get_session('fake'))
+        self.assertIsNot(get_session('fake'), get_session('other'))
+
+    def test_read_timeout(self):
+        """ Tests a slow provider times out and a POST is not retried. """
+        with provider_session('fake'):
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                requests.post(self.provider.url + '/slow', data={'code': 'code'})
+        self.assertEqual(self.provider.requests, 1)
+
+    def test_retry_not_sent(self):
+        """ Tests a POST is retried when the connection could not be established. """
+        url = 'http://127.0.0.1:9/token'
+        with mock.patch('time.sleep') as sleep:
+            with provider_session('fake'):
+                self.assertRaises(requests.exceptions.ConnectionError, requests.post, url, data={'code': 'code'})
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_requests_patched_inside_only(self):
+        """ Tests requests is only patched inside provider_session. """
+        original = requests.api.request
+        with provider_session('fake'):
+            self.assertIsNot(requests.api.request, original)
+            with provider_session('other'):
+                pass
+            self.assertIsNot(requests.api.request, original)
+        self.assertIs(requests.api.request, original)
+        self.assertIs(requests.request, original)
+
+    def test_retry_idempotent(self):
+        """ Tests a GET is retried after a 503. """
+        with provider_session('fake'):
+            response = requests.get(self.provider.url + '/flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.provider.requests, 2)
+
+    @override_settings(ACCOUNTS_SOCIAL_RELEASE_DB_CONNECTION=True)
+    def test_db_connection_released(self):
+        """ Tests the database connection is handed back before waiting on the provider. """
+        with mock.patch.object(connection, 'close') as close:
+            with provider_session('fake'):
+                requests.get(self.provider.url + '/me')
+        self.assertEqual(close.call_count, 1)
+
+    def test_db_connection_kept_by_default(self):
+        """ Tests the database connection is left alone by default. """
+        with mock.patch.object(connection, 'close') as close:
+            with provider_session('fake'):
+                requests.get(self.provider.url + '/me')
+        self.assertEqual(close.call_count, 0)
+
+    def test_social_login_not_atomic_request(self):
+        """ Tests no ATOMIC_REQUESTS transaction is held while waiting on the provider. """
+        self.assertTrue(getattr(SocialLoginView.as_view(), '_non_atomic_requests', None))
+
+    def test_cookies_not_shared(self):
+        """ Tests cookies set by the provider are not sent with later calls. """
+        with provider_session('fake'):
+            requests.get(self.provider.url + '/cookie')
+            response = requests.get(self.provider.url + '/me')
+        self.assertEqual(response.json(), {'cookie': ''})
+
+
+class SocialAppCacheTests(TestCase):
+    """ Tests the cached SocialApp lookup. """
+
+    def setUp(self):
+        cache.clear()
+        self.provider = GoogleProvider(None)
+        self.site = Site.objects.get_current()
+        self.social_app = SocialApp.objects.create(
+            provider='google',
+            name='Google',
+            client_id='123123123',
+            secret='321321321',
+        )
+        self.social_app.sites.add(self.site)
+
+    def test_cached(self):
+        """ Tests the app is only queried once. """
+        self.assertEqual(get_social_app(self.provider), self.social_app)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_social_app(self.provider).client_id, '123123123')
+
+    def test_invalidated_on_save(self):
+        """ Tests the cache is cleared when the app is saved. """
+        get_social_app(self.provider)
+        self.social_app.client_id = '456456456'
+        self.social_app.save()
+        self.assertEqual(get_social_app(self.provider).client_id, '456456456')
+
+    def test_invalidated_on_delete(self):
+        """ Tests the cache is cleared when the app is deleted. """
+        get_social_app(self.provider)
+        self.social_app.delete()
+        with self.assertRaises(SocialApp.DoesNotExist):
+            get_social_app(self.provider)
+
+    def test_invalidated_on_sites_change(self):
+        """ Tests the cache is cleared when the app is removed from the site. """
+        get_social_app(self.provider)
+        self.social_app.sites.remove(self.site)
+        with self.assertRaises(SocialApp.DoesNotExist):
+            get_social_app(self.provider)
+
+    def test_invalidated_during_lookup(self):
+        """ Tests a lookup racing with a change doesn't cache the stale app. """
+        get = SocialApp.objects.get
+
+        def get_then_change(*args, **kwargs):
+            app = get(*args, **kwargs)
+            self.social_app.client_id = '456456456'
+            self.social_app.save()
+            return app
+
+        with mock.patch.object(SocialApp.objects, 'get', side_effect=get_then_change):
+            self.assertEqual(get_social_app(self.provider).client_id, '123123123')
+        self.assertEqual(get_social_app(self.provider).client_id, '456456456')
+
+
+class IdTokenSocialLoginTests(APITestCase):
+    """ Tests social login with an ID token verified locally. """
+
+    jwks_url = 'https://www.googleapis.com/oauth2/v3/certs'
+    issuer = 'https://accounts.google.com'
+    client_id = '123123123'
+
+    def setUp(self):
+        cache.clear()
+        clear_sessions()
+        clear_key_sets()
+        self.google_login_url = reverse('google_id_token_login')
+        self.client = APIClient()
+        social_app = SocialApp.objects.create(
+            provider='google',
+            name='Google',
+            client_id=self.client_id,
+            secret='321321321',
+        )
+        social_app.sites.add(Site.objects.get_current())
+        # Existing user connected to the google account
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        EmailAddress.objects.filter(user=self.user).update(verified=True)
+        SocialAccount.objects.create(user=self.user, provider='google', uid='110169484474386276334')
+        self.private_key = self._generate_key()
+        responses.add(
+            responses.GET,
+            self.jwks_url,
+            body=json.dumps({'keys': [self._get_jwk(self.private_key, 'key-1')]}),
+            status=200,
+            content_type='application/json'
+        )
+
+    def _generate_key(self):
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+
+    def _get_jwk(self, private_key, kid):
+        jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        jwk.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+        return jwk
+
+    def _make_id_token(self, private_key=None, kid='key-1', **claims):
+        payload = {
+            'iss': self.issuer,
+            'aud': self.client_id,
+            'sub': '110169484474386276334',
+            'email': 'john.smith@example.com',
+            'email_verified': True,
+            'given_name': 'John',
+            'family_name': 'Smith',
+            'exp': int(time.time()) + 3600,
+            'iat': int(time.time()),
+        }
+        payload.update(claims)
+        for claim in [claim for claim, value in payload.items() if value is None]:
+            del payload[claim]
+        token = jwt.encode(payload, private_key or self.private_key, algorithm='RS256', headers={'kid': kid})
+        # PyJWT 1 returns bytes, PyJWT 2 a str
+        return token.decode('utf8') if isinstance(token, bytes) else token
+
+    def _login(self, id_token):
+        return self.client.post(self.google_login_url, {'id_token': id_token}, format='json')
+
+    @responses.activate
+    def test_id_token_login(self):
+        """ Tests login with a valid ID token, the signing keys are only fetched once. """
+        for _ in range(2):
+            response = self._login(self._make_id_token())
+            self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+            self.assertEqual(response.data['key'], Token.objects.get(user=self.user).key)
+        # Only the key set was fetched, never the profile
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(responses.calls[0].request.url, self.jwks_url)
+
+    @responses.activate
+    @override_settings(ACCOUNTS_SOCIAL_JWKS_MIN_REFRESH=0)
+    def test_id_token_unknown_key_refetches(self):
+        """ Tests a token signed with an unknown key triggers a refresh of the key set. """
+        self._login(self._make_id_token())
+        response = self._login(self._make_id_token(kid='key-2'))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_id_token_unknown_key_refresh_rate_limited(self):
+        """ Tests unknown keys do not refresh the key set more than once per ACCOUNTS_SOCIAL_JWKS_MIN_REFRESH. """
+        self._login(self._make_id_token())
+        for _ in range(3):
+            response = self._login(self._make_id_token(kid='key-2'))
+            self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_id_token_wrong_audience(self):
+        """ Tests an ID token issued for another client is rejected. """
+        response = self._login(self._make_id_token(aud='someone-else'))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @responses.activate
+    def test_id_token_wrong_issuer(self):
+        """ Tests an ID token from another issuer is rejected. """
+        response = self._login(self._make_id_token(iss='https://evil.example.com'))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @responses.activate
+    def test_id_token_expired(self):
+        """ Tests an expired ID token is rejected. """
+        response = self._login(self._make_id_token(exp=int(time.time()) - 3600))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @responses.activate
+    def test_id_token_without_exp(self):
+        """ Tests an ID token that never expires is rejected. """
+        response = self._login(self._make_id_token(exp=None))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @responses.activate
+    def test_id_token_invalid_key_set(self):
+        """ Tests a key set that is not JSON fails the login cleanly, or keeps the known keys. """
+        responses.replace(responses.GET, self.jwks_url, body='<html>', status=200)
+        response = self._login(self._make_id_token())
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['non_field_errors'], ['Could not reach the provider. Please try again.'])
+
+        clear_key_sets()
+        responses.replace(responses.GET, self.jwks_url, json={'keys': [self._get_jwk(self.private_key, 'key-1')]})
+        self._login(self._make_id_token())
+        responses.replace(responses.GET, self.jwks_url, body='<html>', status=200)
+        with override_settings(ACCOUNTS_SOCIAL_JWKS_REFRESH=0):
+            response = self._login(self._make_id_token())
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+
+    @responses.activate
+    def test_id_token_bad_signature(self):
+        """ Tests an ID token signed by another key is rejected. """
+        response = self._login(self._make_id_token(private_key=self._generate_key()))
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @responses.activate
+    def test_id_token_malformed(self):
+        """ Tests garbage is rejected without calling the provider. """
+        response = self._login('not-a-token')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(responses.calls), 0)
+
+
+class AccessTokenCacheTests(APITestCase):
+    """ Tests repeated logins with the same access token skip the provider. """
+
+    graph_response = '{"id": "123123123123", "first_name": "John", "last_name": "Smith", "verified": true}'
+
+    def setUp(self):
+        cache.clear()
+        clear_sessions()
+        self.fb_login_url = reverse('fb_login')
+        self.client = APIClient()
+        social_app = SocialApp.objects.create(
+            provider='facebook',
+            name='Facebook',
+            client_id='123123123',
+            secret='321321321',
+        )
+        social_app.sites.add(Site.objects.get_current())
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        EmailAddress.objects.filter(user=self.user).update(verified=True)
+        self.account = SocialAccount.objects.create(user=self.user, provider='facebook', uid='123123123123')
+        responses.add(
+            responses.GET,
+            GRAPH_API_URL + '/me',
+            body=self.graph_response,
+            status=200,
+            content_type='application/json'
+        )
+
+    def _login(self, access_token='abc123'):
+        return self.client.post(self.fb_login_url, {'access_token': access_token}, format='json')
+
+    @responses.activate
+    def test_access_token_cached(self):
+        """ Tests the provider is only asked once for the same access token. """
+        for _ in range(2):
+            response = self._login()
+            self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+            self.assertEqual(response.data['key'], Token.objects.get(user=self.user).key)
+        self.assertEqual(len(responses.calls), 1)
+        self._login('def456')
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_raw_token_not_stored(self):
+        """ Tests only a digest of the access token is used as cache key. """
+        self._login()
+        serializer = SocialLoginSerializer()
+        cache_key = serializer._get_access_token_cache_key('facebook', 'abc123')
+        self.assertNotIn('abc123', cache_key)
+        self.assertEqual(cache.get(cache_key), '123123123123')
+
+    @responses.activate
+    def test_inactive_user_not_served_from_cache(self):
+        """ Tests a deactivated or disconnected user is not served from the cache. """
+        self._login()
+        serializer = SocialLoginSerializer()
+        self.assertEqual(serializer.get_cached_user('facebook', 'abc123'), self.user)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(serializer.get_cached_user('facebook', 'abc123'))
+        self.account.delete()
+        self.assertIsNone(serializer.get_cached_user('facebook', 'abc123'))
+
+    @responses.activate
+    @override_settings(ACCOUNTS_SOCIAL_LOGIN_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        """ Tests every login asks the provider when the cache is disabled. """
+        for _ in range(2):
+            self._login()
+        self.assertEqual(len(responses.calls), 2)
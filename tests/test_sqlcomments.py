@@ -0,0 +1,92 @@
+"""
+    tests.test_sqlcomments
+    ======================
+
+    Tests the tagging of the queries with the code path issuing them
+
+"""
+import ast
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from django_accounts import sqlcomments
+from django_accounts.adapter import DefaultAccountAdapter
+from django_accounts.utils import email_address_exists
+
+# Django 1.8 on Python 2 reports SQLite queries as "QUERY = u'...' - PARAMS = (...)"
+SQLITE_QUERY = re.compile(r"^QUERY = (u?'.*') - PARAMS = \(.*\)$", re.S)
+
+
+def get_sql(query):
+    match = SQLITE_QUERY.match(query['sql'])
+    return ast.literal_eval(match.group(1)) if match else query['sql']
+
+
+@override_settings(ACCOUNTS_SQL_COMMENTS=True)
+class SQLCommentTests(TestCase):
+
+    def setUp(self):
+        sqlcomments.install()
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+
+    def tearDown(self):
+        sqlcomments.set_tags()
+
+    def _queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        return [get_sql(query) for query in context.captured_queries]
+
+    def test_tag(self):
+        """ Tests the queries of a tagged block carry the comment. """
+        with sqlcomments.tag(view='accounts:rest_login'):
+            with sqlcomments.tag(hook='clean_username'):
+                queries = self._queries(get_user_model().objects.count)
+        self.assertTrue(queries[0].endswith("/*hook='clean_username',view='accounts:rest_login'*/"))
+        self.assertNotIn('/*', self._queries(get_user_model().objects.count)[0])
+
+    def test_nested_hooks(self):
+        """ Tests a hook inside another hook is chained to it, not repeated. """
+        queries = self._queries(DefaultAccountAdapter().validate_unique_email, 'jane.doe@example.com')
+        self.assertIn("/*hook='validate_unique_email>email_address_exists'*/", queries[0])
+        with sqlcomments.tag(hook='clean_email'):
+            with sqlcomments.tag(hook='clean_email'):
+                queries = self._queries(get_user_model().objects.count)
+        self.assertTrue(queries[0].endswith("/*hook='clean_email'*/"))
+
+    def test_unsafe_characters(self):
+        """ Tests tag values can't close the comment. """
+        with sqlcomments.tag(view="x*/ DROP TABLE y; /*"):
+            queries = self._queries(get_user_model().objects.count)
+        self.assertTrue(queries[0].endswith("/*view='x___DROP_TABLE_y____'*/"))
+
+    def test_hooks(self):
+        """ Tests email_address_exists and the adapter methods tag their queries. """
+        queries = self._queries(email_address_exists, 'john.smith@example.com')
+        self.assertIn("/*hook='email_address_exists'*/", queries[0])
+        queries = self._queries(DefaultAccountAdapter().clean_username, 'jane.doe')
+        self.assertIn("/*hook='clean_username'*/", queries[0])
+
+    def test_view(self):
+        """ Tests the middleware tags the queries with the view name. """
+        middleware = ['django_accounts.middleware.SQLCommentMiddleware'] + settings.MIDDLEWARE_CLASSES
+        with override_settings(MIDDLEWARE_CLASSES=middleware):
+            queries = self._queries(self.client.post, reverse('accounts:rest_login'),
+                                    {'username': 'john.smith', 'password': 'wrong'})
+        self.assertTrue(queries)
+        for query in queries:
+            self.assertIn("view='accounts:rest_login'", query)
+        self.assertIsNone(sqlcomments.get_tags())
+
+    @override_settings(ACCOUNTS_SQL_COMMENTS=False)
+    def test_off(self):
+        """ Tests nothing is added when turned off. """
+        with sqlcomments.tag(view='accounts:rest_login'):
+            queries = self._queries(get_user_model().objects.count)
+        self.assertNotIn('/*', queries[0])
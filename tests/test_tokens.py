@@ -0,0 +1,114 @@
+"""
+    tests.test_tokens
+    =================
+
+    Tests the server side password reset token store
+
+"""
+import mock
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from allauth.account.utils import user_pk_to_url_str
+
+from django_accounts.tokens import (
+    StoredPasswordResetTokenGenerator, get_token_generator, stored_token_generator
+)
+
+
+class StoredPasswordResetTokenGeneratorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.generator = StoredPasswordResetTokenGenerator()
+        self.user = get_user_model().objects.create_user(
+            'jtarball',
+            'jtarball@example.com',
+            'password12'
+        )
+
+    def test_token_valid(self):
+        """ Tests a freshly issued token is valid. """
+        token = self.generator.make_token(self.user)
+        self.assertTrue(self.generator.check_token(self.user, token))
+
+    def test_token_single_use(self):
+        """ Tests a consumed token is rejected. """
+        token = self.generator.make_token(self.user)
+        self.assertTrue(self.generator.consume_token(self.user, token))
+        self.assertFalse(self.generator.check_token(self.user, token))
+
+    def test_token_consumed_once(self):
+        """ Tests a token checked by two requests at the same time can only be consumed once. """
+        token = self.generator.make_token(self.user)
+        self.assertTrue(self.generator.check_token(self.user, token))
+        self.assertTrue(self.generator.check_token(self.user, token))
+        # The second request read the digest before the first one deleted it
+        with mock.patch.object(cache, 'get', return_value=self.generator._get_token_digest(token)):
+            self.assertTrue(self.generator.consume_token(self.user, token))
+            self.assertFalse(self.generator.consume_token(self.user, token))
+
+    def test_new_token_revokes_previous(self):
+        """ Tests issuing a new token revokes the previous one. """
+        # Tokens are day based so force a different one by changing the password
+        old_token = self.generator.make_token(self.user)
+        self.user.set_password('password13')
+        new_token = self.generator.make_token(self.user)
+        self.assertFalse(self.generator.check_token(self.user, old_token))
+        self.assertTrue(self.generator.check_token(self.user, new_token))
+
+    def test_revoke_tokens(self):
+        """ Tests revoke_tokens invalidates the outstanding token. """
+        token = self.generator.make_token(self.user)
+        self.generator.revoke_tokens(self.user)
+        self.assertFalse(self.generator.check_token(self.user, token))
+
+    def test_token_not_issued_by_store(self):
+        """ Tests a valid HMAC token that was never stored is rejected. """
+        from django.contrib.auth.tokens import default_token_generator
+        token = default_token_generator.make_token(self.user)
+        self.assertFalse(self.generator.check_token(self.user, token))
+
+    def test_get_token_generator(self):
+        """ Tests the store is only used when enabled. """
+        self.assertIsNot(get_token_generator(), stored_token_generator)
+        with self.settings(ACCOUNTS_PASSWORD_RESET_TOKEN_STORE=True):
+            self.assertIs(get_token_generator(), stored_token_generator)
+
+
+@override_settings(ACCOUNTS_PASSWORD_RESET_TOKEN_STORE=True)
+class TestPasswordResetTokenStore(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.rest_password_reset_confirm_url = reverse('accounts:rest_password_reset_confirm')
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'jtarball',
+            'jtarball@example.com',
+            'password12'
+        )
+
+    def _get_data(self, token):
+        return {
+            'password1': 'new_password',
+            'password2': 'new_password',
+            'uid': user_pk_to_url_str(self.user),
+            'token': token
+        }
+
+    def test_password_reset_confirm_token_single_use(self):
+        """ Tests password reset confirm cannot be replayed with the same token. """
+        token = stored_token_generator.make_token(self.user)
+        response = self.client.post(self.rest_password_reset_confirm_url, self._get_data(token), format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+
+        response = self.client.post(self.rest_password_reset_confirm_url, self._get_data(token), format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(response.content, '{"token":["Invalid value"]}')
@@ -0,0 +1,142 @@
+"""
+    tests.test_traffic
+    ==================
+
+    Tests the capture and replay of the accounts traffic
+
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import LiveServerTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from allauth.account.models import EmailAddress
+
+from django_accounts import traffic
+
+
+class TrafficCaptureTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.capture_file = os.path.join(self.directory, 'capture.jsonl')
+        self.settings_override = override_settings(
+            MIDDLEWARE_CLASSES=['django_accounts.middleware.TrafficCaptureMiddleware'] + settings.MIDDLEWARE_CLASSES,
+            ACCOUNTS_TRAFFIC_CAPTURE_FILE=self.capture_file,
+        )
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user('john.smith', 'john.smith@example.com', 'password12')
+        EmailAddress.objects.filter(user=self.user).update(verified=True)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_capture_sanitized(self):
+        """ Tests accounts requests are captured without anything the client sent. """
+        self.client.post(reverse('accounts:rest_login'), {'username': 'john.smith', 'password': 'password12'})
+        self.client.get(reverse('accounts:rest_user_details'))
+        self.client.get('/account/login/')
+        with open(self.capture_file) as capture_file:
+            content = capture_file.read()
+        records = traffic.load(content.splitlines())
+        self.assertEqual([(r['endpoint'], r['method'], r['status']) for r in records],
+                         [('rest_login', 'POST', 200), ('rest_user_details', 'GET', 200)])
+        self.assertEqual(records[0]['user'], records[1]['user'])
+        self.assertEqual(records[0]['path'], reverse('accounts:rest_login'))
+        for secret in ('john.smith', 'password12', self.client.session.session_key):
+            self.assertNotIn(secret, content)
+
+    @override_settings(ACCOUNTS_TRAFFIC_CAPTURE_RATE=0)
+    def test_sampling(self):
+        """ Tests nothing is captured with a rate of 0. """
+        self.client.post(reverse('accounts:rest_login'), {'username': 'john.smith', 'password': 'wrong'})
+        self.assertFalse(os.path.exists(self.capture_file))
+
+
+class TrafficReplayTests(LiveServerTestCase):
+
+    def setUp(self):
+        for n in range(3):
+            get_user_model().objects.create_user('bench%d' % n, 'bench%d@example.com' % n, 'password12')
+        EmailAddress.objects.update(verified=True)
+        self.directory = tempfile.mkdtemp()
+        self.capture_file = os.path.join(self.directory, 'capture.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _replay(self, records, *args):
+        with open(self.capture_file, 'w') as capture_file:
+            for record in records:
+                capture_file.write(json.dumps(record) + '\n')
+        out = StringIO()
+        call_command('replay_traffic', self.capture_file, '--base-url', self.live_server_url,
+                     '--users', '3', '--prefix', 'bench', '--speed', '1000', *args, stdout=out)
+        return out.getvalue()
+
+    def _record(self, ts, endpoint, status=200, method='POST', client='aa', user=None):
+        return {'ts': ts, 'endpoint': endpoint, 'method': method, 'status': status, 'duration': 0.01,
+                'path': reverse('accounts:%s' % endpoint), 'client': client, 'user': user}
+
+    def test_replay(self):
+        """ Tests a capture is replayed with the captured outcomes and saved as a baseline. """
+        replay = traffic.Replayer([], self.live_server_url, 3, prefix='bench')
+        user = traffic.pseudonymize(1)
+        # An unverified user (can't log in) for the verification
+        unverified = next(key for key in (traffic.pseudonymize(n) for n in range(2, 20))
+                          if replay.get_username({'user': key}) != replay.get_username({'user': user}))
+        EmailAddress.objects.filter(user__username=replay.get_username({'user': unverified})).update(verified=False)
+        records = [
+            self._record(0.0, 'rest_login', user=user),
+            self._record(0.1, 'rest_user_details', method='GET', user=user),
+            self._record(0.2, 'rest_user_details', method='PATCH', user=user),
+            self._record(0.3, 'rest_login', status=400, client='bb'),
+            self._record(0.4, 'rest_password_reset', client='cc'),
+            self._record(0.5, 'rest_verify_email', client='dd', user=unverified),
+            self._record(0.6, 'rest_register', status=201, client='ee'),
+        ]
+        baseline = os.path.join(self.directory, 'baseline.json')
+        self._replay(records, '--save', baseline, '--concurrency', '2')
+        with open(baseline) as baseline_file:
+            results = json.load(baseline_file)
+        self.assertEqual(results['errors'], {})
+        self.assertEqual(results['all']['requests'], 7)
+        self.assertEqual(results['endpoints']['rest_user_details']['requests'], 2)
+        self.assertTrue(get_user_model().objects.filter(username__startswith='replay').exists())
+
+    @override_settings(ACCOUNTS_PASSWORD_RESET_TOKEN_STORE=True)
+    def test_replay_client_order(self):
+        """ Tests the requests of a client keep their order and reset tokens are minted after the reset. """
+        user = traffic.pseudonymize(1)
+        records = [
+            self._record(0.0, 'rest_login', client='aa', user=user),
+            self._record(0.0, 'rest_logout', client='aa', user=user),
+            self._record(0.0, 'rest_user_details', method='GET', status=403, client='aa'),
+            self._record(0.0, 'rest_password_reset', client='cc'),
+            self._record(0.0, 'rest_password_reset_confirm', client='cc'),
+        ]
+        baseline = os.path.join(self.directory, 'baseline.json')
+        for _ in range(3):
+            self._replay(records, '--save', baseline, '--concurrency', '4')
+        with open(baseline) as baseline_file:
+            self.assertEqual(json.load(baseline_file)['errors'], {})
+
+    def test_compare(self):
+        """ Tests a replay is compared with a baseline. """
+        records = [self._record(0.0, 'rest_login', status=400, client='bb')]
+        baseline = os.path.join(self.directory, 'baseline.json')
+        with open(baseline, 'w') as baseline_file:
+            json.dump({'endpoints': {'rest_login': {'p50': 1000, 'p99': 1000}},
+                       'all': {'p50': 1000, 'p99': 1000}, 'errors': {}}, baseline_file)
+        out = self._replay(records, '--compare', baseline)
+        self.assertIn('rest_login', out)
+        self.assertNotIn('REGRESSION', out)
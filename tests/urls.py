@@ -12,6 +12,7 @@
 """
 from django.conf.urls import patterns, url, include
 from allauth.socialaccount.providers.facebook.views import FacebookOAuth2Adapter
+from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 
 from django_accounts.registration.views import SocialLoginView
 from django_accounts import urls as urls_accounts
@@ -20,9 +21,16 @@ from django_accounts import urls as urls_accounts
 class FacebookLogin(SocialLoginView):
     adapter_class = FacebookOAuth2Adapter
 
+
+class GoogleLogin(SocialLoginView):
+    adapter_class = GoogleOAuth2Adapter
+    id_token_jwks_url = 'https://www.googleapis.com/oauth2/v3/certs'
+    id_token_issuer = 'https://accounts.google.com'
+
 urlpatterns = patterns(
     '',
     url(r'^social-login/facebook/$', FacebookLogin.as_view(), name='fb_login'),
+    url(r'^social-login/google/$', GoogleLogin.as_view(), name='google_id_token_login'),
     url(r'^accounts/', include(urls_accounts, namespace="accounts")),
     url(r'^account/', include('allauth.urls')),
 )